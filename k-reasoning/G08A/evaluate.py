@@ -1,13 +1,19 @@
 import re
 import json
 import os
-from glob import glob
+import numpy as np
 import matplotlib.pyplot as plt
 from openai import OpenAI
 
+import paths
+import metrics
+from catalogue import Catalogue
+
+INDEXED_FIELDS = ["winners", "biddings", "logs"] # per-game fields the metrics read, kept in the catalogue
+
 class G08AEvaluator():
 
-    def __init__(self, players, opponents, exp_rnd, exp_num, result_dir, output_dir) -> None:
+    def __init__(self, players, opponents, exp_rnd, exp_num, result_dir, output_dir, index_workers=None) -> None:
         self.players = players.split(",")
         self.opponents = opponents.split(",")
 
@@ -20,6 +26,52 @@ class G08AEvaluator():
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
 
+        # every metric reads the games through one scan of the result folder
+        self.catalogue = Catalogue(result_dir, INDEXED_FIELDS, index_workers)
+        self._stacked = None
+
+    def load_games(self, pattern, *fields):
+        """
+        (result file, records) of every game matching the glob `pattern` (e.g. "kr_VS_agent*") with
+        the requested fields, served by the catalogue of result_dir: indexed fields come from memory,
+        the others ("message", ...) are read from the game on demand.
+        """
+        for game in self.catalogue.match(pattern):
+            yield self.catalogue.path(game), self.catalogue.get(game, *fields)
+
+    def stacked(self):
+        """
+        Bid, winner and prediction tensors (games x players x rounds) of every game in the catalogue, built once.
+        """
+        if self._stacked is None:
+            games = self.catalogue.match()
+            records = [self.catalogue.get(game, *INDEXED_FIELDS) for game in games]
+            bids = metrics.stack(records, "biddings")
+            won, n_rounds = metrics.stack_winners(records, "winners")
+            self._stacked = {
+                "rows": {game: i for i, game in enumerate(games)},
+                "bids": bids,
+                "won": won,
+                "n_rounds": n_rounds,
+                "predictions": metrics.stack_predictions(records, bids.shape[2]),
+            }
+        return self._stacked
+
+    def rows(self, pattern):
+        """
+        Rows of the stacked tensors of the games matching the glob `pattern`.
+        """
+        index = self.stacked()["rows"]
+        return np.array([index[game] for game in self.catalogue.match(pattern)], dtype=int)
+
+    def game_win_rates(self, agent, computer):
+        t = self.stacked()
+        rows = self.rows(f"{agent}_VS_{computer}*")
+        return metrics.win_rate(t["won"][rows], t["n_rounds"][rows], max_round=self.exp_rnd)
+
+    def game_adaption_indices(self, agent, computer):
+        return metrics.target_deviation_ratio(self.stacked()["bids"][self.rows(f"{agent}_VS_{computer}*")])
+
     def win_rate(self):
         print("="*40+" Win Rate "+"="*40)
 
@@ -29,28 +81,13 @@ class G08AEvaluator():
         for agent in players:
             win_result.setdefault(agent, {})
             for computer in opponents:
-                exp = f"{self.result_dir}/{agent}_VS_{computer}*.json"
-                cots = glob(exp)
-
-                wins = {}
-                total_round = 0
-                for result in cots:
-                    with open(result) as fin:
-                        result = json.load(fin)["winners"]
-                        total_round = len(cots)*len(result)
-                        for rnd in result:
-                            if int(rnd)>self.exp_rnd: continue
-                            for player in result[rnd]:
-                                wins.setdefault(player, [0]*(len(result)))
-                                wins[player][int(rnd)-1]+=1
-
-                win_rate = sum(wins.get("Alex", [0]))/(total_round)
-                win_result[agent][computer] = win_rate
+                rates = self.game_win_rates(agent, computer)
+                win_result[agent][computer] = rates.mean() if len(rates) else np.nan
 
         average = {}
         for i, agent in enumerate(win_result):
-            average[agent] = list(win_result[agent].values())
-            average[agent] = sum(average[agent])/len(average[agent])
+            # pairs without games are NaN, left out of the average (NaN, printed blank, when no pair has games)
+            average[agent] = metrics.nanmean(list(win_result[agent].values()))
 
         print(f"{'':12s}\t"+"\t".join([f"{agent:7s}" for agent in players]))
         for computer in opponents:
@@ -71,19 +108,9 @@ class G08AEvaluator():
         for oppo in opponents:
             exp_result = {}
             for agent in players:
-                exps = glob(f"{self.result_dir}/{agent}_VS_{oppo}*.json")
-                for exp in exps:
-                    with open(exp) as fin:
-                        logs = json.load(fin)
-                        exp_ground = logs["biddings"]
-                    target_div = []
-                    for r in range(0, 10):
-                        bids = [exp_ground[p][r] for p in exp_ground]
-                        target = sum(bids)/len(bids)*0.8
-                        player_bid = exp_ground["Alex"][r]
-                        target_div.append(abs(player_bid-target))
-                    exp_result.setdefault(agent, [])
-                    exp_result[agent].append(sum(target_div[5:])/sum(target_div[:5])) # [Target Deviation @ (second half)] / [Target Deviation @ (first half)]
+                ratios = self.game_adaption_indices(agent, oppo) # [Target Deviation @ (second half)] / [Target Deviation @ (first half)]
+                if len(ratios):
+                    exp_result[agent] = ratios.tolist()
             learning_result[oppo]=exp_result
 
         print(f"{'':8s}\t"+"\t".join([f"{agent:2s}" for agent in players]))
@@ -159,26 +186,24 @@ class G08AEvaluator():
                         return {}
                     time.sleep(15)
 
-        pcot_exps = glob(f"{self.result_dir}/pcot_VS_*.json")
         error_r = []
         flag = False
 
         exps_result = {}
-        for exp in pcot_exps:
-            with open(exp) as fin:
-                messages=json.load(fin)["message"]["Alex"]
-                exps_result[exp]={}
-                for i in range(2, min(len(messages), 41), 4):
-                    message=messages[i]["content"]
-                    result = re_extract(message)
-                    if not result:
-                        result = gpt_extract(message)
-                    if not result:
-                        print(message)
-                        error_r.append(message)
-                        flag = True
-                        break
-                    exps_result[exp][(i-2)//4]=result
+        for exp, record in self.load_games("pcot_VS_*", "message"):
+            messages=record["message"]["Alex"]
+            exps_result[exp]={}
+            for i in range(2, min(len(messages), 41), 4):
+                message=messages[i]["content"]
+                result = re_extract(message)
+                if not result:
+                    result = gpt_extract(message)
+                if not result:
+                    print(message)
+                    error_r.append(message)
+                    flag = True
+                    break
+                exps_result[exp][(i-2)//4]=result
             if flag:
                 break
 
@@ -200,8 +225,7 @@ class G08AEvaluator():
                 m = re.match(f"pcot_VS_{oppo}_(\d)", exp)
                 if not m: continue
                 exp_num = m.groups()[0]
-                with open(f"{self.result_dir}/{exp}.json") as fin:
-                    exp_ground = json.load(fin)["biddings"]
+                exp_ground = next(self.load_games(exp, "biddings"))[1]["biddings"]
                 result = new_result[exp]
                 for r in result:
                     try:
@@ -214,26 +238,11 @@ class G08AEvaluator():
                     pcot_avg_div.setdefault(int(r), [])
                     pcot_avg_div[int(r)].append(abs(predict_avg-ground_avg))
 
-            kr_avg_div = {}
-            kr_exps = glob(f"{self.result_dir}/kr_VS_*.json")
-            for exp in kr_exps:
-                m = re.match(f"{self.result_dir}/kr_VS_{oppo}_(\d).json", exp)
-                if not m: continue
-                exp_num = m.groups()[0]
-                with open(exp) as fin:
-                    logs = json.load(fin)
-                    exp_ground = logs["biddings"]
-                    result = logs["logs"]["Alex"]
-                for r in range(0, 10):
-                    try:
-                        prediction = result[f'round{r+1}']["prediction"]
-                    except:
-                        continue
-                    round_ground = {p: exp_ground[p][r] for p in exp_ground if p!="Alex"}
-                    predict_avg = sum(prediction.values())/len(prediction)
-                    ground_avg = sum(round_ground.values())/len(round_ground)
-                    kr_avg_div.setdefault(r, [])
-                    kr_avg_div[r].append(abs(predict_avg-ground_avg))
+            t = self.stacked()
+            rows = [t["rows"][game] for game in self.catalogue.match(f"kr_VS_{oppo}_*")
+                    if re.match(f"{self.result_dir}/kr_VS_{oppo}_(\d).json", self.catalogue.path(game))]
+            errors = metrics.prediction_error(t["predictions"][rows], t["bids"][rows])[:, :10]
+            kr_avg_div = {r: errors[:, r][~np.isnan(errors[:, r])].tolist() for r in range(errors.shape[1]) if not np.isnan(errors[:, r]).all()}
 
 
             #Export the prediction accuracy chart.
@@ -267,13 +276,32 @@ class G08AEvaluator():
 
         print("="*20+f" Prediction Accuracy Metric has been exported to \"{self.output_dir}\" "+"="*20)
 
+    def confidence_intervals(self, n_boot=1000, alpha=0.05):
+        """
+        Mean and bootstrap confidence interval over games of the win rate and adaption index of every strategy pair.
+        """
+        print("="*40+f" {1-alpha:.0%} Bootstrap Confidence Intervals "+"="*40)
+        print(f"{'':12s}\t{'':12s}\t{'games':5s}\t{'Win Rate':24s}\t{'Adaption Index':24s}")
+        for agent in self.players:
+            for computer in self.opponents:
+                rates = self.game_win_rates(agent, computer)
+                if not len(rates): continue
+                cells = []
+                for values in [rates, self.game_adaption_indices(agent, computer)]:
+                    mean, low, high = metrics.bootstrap_ci(values, n_boot, alpha)
+                    cells.append(f"{mean:.2f} [{low:.2f}, {high:.2f}]")
+                print(f"{agent:12s}\t{computer:12s}\t{len(rates):<5d}\t{cells[0]:24s}\t{cells[1]:24s}")
+        print()
+
 
 def main(args):
 
-    evaluator = G08AEvaluator(args.players, args.opponents, args.exp_rnd, args.exp_num, args.result_dir, args.output_dir)
+    evaluator = G08AEvaluator(args.players, args.opponents, args.exp_rnd, args.exp_num, args.result_dir, args.output_dir, args.index_workers)
 
     evaluator.win_rate()
     evaluator.adaption_index()
+    if args.bootstrap:
+        evaluator.confidence_intervals(args.bootstrap, args.alpha)
 
     # the calculation of Prediction Accuracy is used only for pcot and kr.
     # evaluator.prediction_accuracy()
@@ -287,8 +315,11 @@ if __name__=="__main__":
     parser.add_argument("--opponents", type=str, default="agent")
     parser.add_argument("--result_dir", type=str, default="result")
     parser.add_argument("--output_dir", type=str, default="output")
+    parser.add_argument("--index_workers", type=int, default=None, help="processes parsing new or changed result files (default: all cores)")
     parser.add_argument('--exp_rnd', type=int, default=10)
     parser.add_argument('--exp_num', type=int, default=10)
+    parser.add_argument('--bootstrap', type=int, default=0, help="bootstrap resamples of the confidence intervals of every strategy pair, 0 to skip")
+    parser.add_argument('--alpha', type=float, default=0.05, help="1 - confidence level of the bootstrap intervals")
 
     args = parser.parse_args()
     main(args)
\ No newline at end of file
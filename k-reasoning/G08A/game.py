@@ -1,17 +1,31 @@
-from copy import deepcopy
+import paths
+from fan_out import fan_out
+from llm_backend import call_tags
 
 round_number = round
 
 class G08A():
-    def __init__(self, players) -> None:
+    def __init__(self, players, concurrent_prediction=False, headless=None) -> None:
         self.all_players = players[::]
         self.survival_players = players[::]
         self.round_winner = {}
+        # overlap the start_round (e.g. k-level prediction) of all players
+        self.concurrent_prediction = concurrent_prediction
+        # without LLM players nobody reads the round result texts, skip rendering them
+        self.headless = not any(player.is_agent for player in players) if headless is None else headless
+        self.log = None # GameLog of the game, see run_multi_round
 
     def daily_bidding(self, players):
-        Average = 0
         for player in players:
             player.act()
+        return self.round_target(players)
+
+    def round_target(self, players):
+        """
+        Average of the bids of `players` and the target number (0.8 * average).
+        """
+        Average = 0
+        for player in players:
             Average += player.last_bidding
         
         Average /= len(players) 
@@ -37,11 +51,27 @@ class G08A():
         if len(players)<2: return False
         return len(set([player.last_bidding for player in players]))==1
 
-    def run_single_round(self, round_id):
-        for player in self.survival_players:
-            player.start_round(round_id)
+    def start_round(self, round_id):
+        if self.concurrent_prediction:
+            # start_round only touches the player's own state and the public history
+            fan_out(lambda player: player.start_round(round_id), self.survival_players)
+        else:
+            for player in self.survival_players:
+                player.start_round(round_id)
 
+    def run_single_round(self, round_id):
+        self.start_round(round_id)
         Average, Target = self.daily_bidding(self.survival_players)
+        self.settle_round(round_id, Average, Target)
+
+    def settle_round(self, round_id, Average, Target):
+        """
+        Everything after the bids of round `round_id`: winners, HP deduction, the round result
+        sent to every player and eliminations.
+        """
+        if self.log:
+            for player in self.survival_players:
+                self.log.write({"event": "bid", "round": round_id, "player": player.name, "bid": player.last_bidding})
 
         Tie_status = self.check_tie(self.survival_players)
         if Tie_status: # If all players choose the same number, there is no winner.
@@ -54,8 +84,12 @@ class G08A():
         
         self.round_deduction(self.survival_players, WINNER)
 
+        if self.headless:
+            self.end_headless_round(round_id, Target, WINNER)
+            return
+
         bidding_numbers = [f"{player.last_bidding}" for player in self.survival_players]
-        history_biddings = {player.name: deepcopy(player.biddings) for player in self.survival_players} 
+        history_biddings = {player.name: player.biddings[::] for player in self.survival_players}
         bidding_details = [f"{player.name} chose {player.last_bidding}" for player in self.survival_players]
         diff_details = [
             f"{player.name}: |{player.last_bidding} - {Target}| = {round_number(abs(player.last_bidding - Target))}"
@@ -95,10 +129,33 @@ class G08A():
 
         print("Round ",round_id,": ",bidding_details)
 
-    def run_multi_round(self, max_round):
+    def end_headless_round(self, round_id, Target, WINNER):
+        """
+        The rest of `settle_round` for program players only: the same state changes, no texts.
+        """
+        survival_players = []
+        for player in self.survival_players:
+            player.notice_round_result(round_id, None, Target, player.name in WINNER, None, None)
+            if player.hp > 0:
+                survival_players.append(player)
+        self.survival_players = survival_players
+        for player in self.survival_players:
+            player.end_round()
 
+    def run_multi_round(self, max_round, log=None):
+        """
+        Play rounds 1..max_round. With a GameLog every round is logged as it completes, and a game
+        interrupted in an earlier run resumes after its last completed round.
+        """
         for player in self.all_players:
             player.ROUND_WINNER=self.round_winner
-        
-        for i in range(1, max_round+1):
-            self.run_single_round(i)
\ No newline at end of file
+
+        self.log = log
+        first_round = log.open(self, self.all_players, max_round) + 1 if log else 1
+        for i in range(first_round, max_round+1):
+            with call_tags(round=i):
+                self.run_single_round(i)
+            if log:
+                log.end_round(i, self, self.all_players)
+        if log:
+            log.close()
\ No newline at end of file
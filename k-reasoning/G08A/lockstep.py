@@ -0,0 +1,110 @@
+"""
+Play many G08A games in lock-step.
+
+`G08A.run_multi_round` plays one game at a time, every player waits for the one before, so a
+single game never has more than a couple of completions in flight. `LockstepGames` holds N games
+(different seeds and strategies) and advances them round by round together: the prediction phase
+of every game, then the bids of all LLM players of all games in one concurrent dispatch, then the
+settlement (round result, reflection) of every game. The API pipe stays full and the throughput
+grows with N until the rate limit (`--max_inflight`, ALYMPICS_RPM) is reached.
+
+Every game keeps its own event log, call tags and sample counters, so a game played in lock-step
+is logged, resumed and accounted for like one played on its own.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import paths
+from llm_backend import call_tags, set_event_sink, start_run
+
+
+class LockstepGames:
+    def __init__(self, max_workers=64):
+        self.max_workers = max_workers
+        self.games = [] # [{"name", "game", "max_round", "log", "context", "next_round"}]
+
+    def add(self, name, game, max_round, log=None, replicate=0):
+        """
+        Add `game`, logged to the GameLog `log`, to be played until `max_round` as run `replicate`
+        (see `response_cache.start_run`).
+        """
+        context = contextvars.copy_context()
+        context.run(start_run, replicate)
+        context.run(set_event_sink, log.write if log else None)
+        self.games.append({"name": name, "game": game, "max_round": max_round, "log": log, "context": context})
+
+    def _in_game(self, entry, round_id, fn):
+        with call_tags(game=entry["name"], round=round_id):
+            return fn()
+
+    def _dispatch(self, pool, tasks, failed):
+        """
+        Run the (entry, round_id, fn) tasks concurrently, each in the context of its game. A game
+        with a failed task is moved to `failed` and takes no further part.
+        """
+        futures = [(entry, pool.submit(entry["context"].copy().run, self._in_game, entry, round_id, fn))
+                   for entry, round_id, fn in tasks if entry["name"] not in failed]
+        for entry, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed.setdefault(entry["name"], e)
+
+    def run(self):
+        """
+        Play all games to their last round. Returns {name: exception} of the games that failed,
+        the others are finished and their logs closed.
+        """
+        failed = {}
+        for entry in self.games:
+            game, log = entry["game"], entry["log"]
+            for player in game.all_players:
+                player.ROUND_WINNER = game.round_winner
+            game.log = log
+            entry["next_round"] = log.open(game, game.all_players, entry["max_round"]) + 1 if log else 1
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            last_round = max([entry["max_round"] for entry in self.games], default=0)
+            first_round = min([entry["next_round"] for entry in self.games], default=1)
+            for round_id in range(first_round, last_round+1):
+                playing = [entry for entry in self.games
+                           if entry["next_round"] <= round_id <= entry["max_round"] and entry["name"] not in failed]
+                if not playing:
+                    continue
+
+                # prediction phase, within a game concurrently only if the game does it on its own
+                tasks = []
+                for entry in playing:
+                    game = entry["game"]
+                    if game.concurrent_prediction:
+                        tasks += [(entry, round_id, lambda player=player: player.start_round(round_id)) for player in game.survival_players]
+                    else:
+                        tasks.append((entry, round_id, lambda game=game: [player.start_round(round_id) for player in game.survival_players]))
+                self._dispatch(pool, tasks, failed)
+
+                # bids: program players in game order (they share the random generator), LLM players all at once
+                tasks = []
+                for entry in playing:
+                    for player in entry["game"].survival_players:
+                        if player.is_agent:
+                            tasks.append((entry, round_id, player.act))
+                        elif entry["name"] not in failed:
+                            try:
+                                entry["context"].run(self._in_game, entry, round_id, player.act)
+                            except Exception as e:
+                                failed[entry["name"]] = e
+                self._dispatch(pool, tasks, failed)
+
+                # settlement, which may ask for reflections
+                tasks = [(entry, round_id, lambda game=entry["game"]: game.settle_round(round_id, *game.round_target(game.survival_players)))
+                         for entry in playing]
+                self._dispatch(pool, tasks, failed)
+
+                for entry in playing:
+                    if entry["log"] and entry["name"] not in failed:
+                        entry["log"].end_round(round_id, entry["game"], entry["game"].all_players)
+
+        for entry in self.games:
+            if entry["log"]:
+                entry["log"].close(finished=entry["name"] not in failed)
+        return failed
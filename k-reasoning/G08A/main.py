@@ -1,17 +1,29 @@
 import os
 import json
-from openai import OpenAI
 
+import paths
 from player import *
+from llm_backend import (call_summary, call_tags, configure, default_cache, format_call_summary, set_event_sink,
+                         start_run, start_trace, write_chrome_trace)
+from player.reasoning_player import PARSE_STATS
 from game import G08A
+from game_log import GameLog
+from lockstep import LockstepGames
+from result_store import ResultStore
 
-# 创建 DeepSeek API 客户端
-client = OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
-    base_url="https://api.deepseek.com/v1",
-)
+# the players' completions go through the shared client of src/llm_backend.py
 ENGINE = "deepseek-chat"
 
+PLAYER_STRATEGIES = ["agent","cot","pcot","kr","reflect", "persona", "refine", "spp"]
+COMPUTER_STRATEGIES = ["agent", "fix", "last", "mono", "monorand","cot","pcot","kr","reflect", "persona", "refine", "spp"]
+
+#Predefined Persona information
+PERSONA_A = "You are Alex and involved in a survive challenge. "
+PERSONA_B = "You are Bob and involved in a survive challenge. "
+PERSONA_C = "You are Cindy and involved in a survive challenge. " 
+PERSONA_D = "You are David and involved in a survive challenge. "
+PERSONA_E = "You are Eric and involved in a survive challenge. "
+
 def build_player(strategy, name, persona, mean=50, std=0, player_names = []):
     """
     Player Factory
@@ -38,68 +50,186 @@ def build_player(strategy, name, persona, mean=50, std=0, player_names = []):
         raise NotImplementedError
 
 
-def main(args):
-    #Predefined Persona information
-    PERSONA_A = "You are Alex and involved in a survive challenge. "
-    PERSONA_B = "You are Bob and involved in a survive challenge. "
-    PERSONA_C = "You are Cindy and involved in a survive challenge. " 
-    PERSONA_D = "You are David and involved in a survive challenge. "
-    PERSONA_E = "You are Eric and involved in a survive challenge. "
-
-    for exp_no in range(args.start_exp, args.exp_num):
-        players=[]
-        player_names = ["Alex", "Bob", "Cindy", "David", "Eric"]
-
-        # build player
-        A = build_player(args.player_strategy, "Alex", PERSONA_A, player_names=player_names)
-        # Modify PlayerA's settings for ablation experiments.
-        if args.player_engine: A.engine = args.player_engine
-        if args.player_k:  A.k_level = args.player_k
-        players.append(A)
-
-        # build opponent
-        for program_name, persona in [("Bob", PERSONA_B), ("Cindy", PERSONA_C), ("David", PERSONA_D), ("Eric", PERSONA_E)]:
-            players.append(build_player(args.computer_strategy, program_name, persona, args.init_mean, args.norm_std, player_names=player_names))
-
-        # run multi-round game (default 10)
-        Game = G08A(players)
-        Game.run_multi_round(args.max_round)
-
-        # export game records
-        prefix = f"{args.player_strategy}_VS_{args.computer_strategy}_{exp_no}"
-        if args.computer_strategy in ["fix", "last"]:
-            prefix = f"{args.player_strategy}_VS_{args.computer_strategy}-{args.init_mean}-{args.norm_std}_{exp_no}"
-
-        output_file = f"{args.output_dir}/{prefix}.json"
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        with open(output_file,"w") as fout:
-            messages = {}
-            biddings = {}
-            logs = {}
-            for agent in Game.all_players:
-                if agent.is_agent:
-                     messages[agent.name] = agent.message
-                biddings[agent.name] = agent.biddings
-                if agent.logs:
-                    logs[agent.name] = agent.logs
+def get_output_file(args, exp_no):
+    prefix = f"{args.player_strategy}_VS_{args.computer_strategy}_{exp_no}"
+    if args.computer_strategy in ["fix", "last"]:
+        prefix = f"{args.player_strategy}_VS_{args.computer_strategy}-{args.init_mean}-{args.norm_std}_{exp_no}"
+    return f"{args.output_dir}/{prefix}.json"
+
+
+def result_exists(args, exp_no):
+    """
+    Whether the game has already been exported in every requested format.
+    """
+    output_file = get_output_file(args, exp_no)
+    game = os.path.basename(output_file)[:-len(".json")]
+    if args.output_format in ["json", "both"] and not os.path.exists(output_file):
+        return False
+    if args.output_format in ["store", "both"] and not ResultStore(args.output_dir).has(game):
+        return False
+    return True
+
+
+def game_tables(Game):
+    """
+    Numeric tables of a finished game: one "rounds" row per player and round played,
+    one "players" row per player.
+    """
+    rounds = {"player": [], "round": [], "bid": [], "won": []}
+    for agent in Game.all_players:
+        for r, bid in enumerate(agent.biddings, 1):
+            rounds["player"].append(agent.name)
+            rounds["round"].append(r)
+            rounds["bid"].append(bid)
+            rounds["won"].append(agent.name in Game.round_winner[r])
+    players = {
+        "player": [agent.name for agent in Game.all_players],
+        "hp": [agent.hp for agent in Game.all_players],
+        "is_agent": [agent.is_agent for agent in Game.all_players],
+    }
+    return {"rounds": rounds, "players": players}
+
+
+def build_game(args, exp_no):
+    """
+    The players and the G08A game of experiment `exp_no`
+    """
+    players=[]
+    player_names = ["Alex", "Bob", "Cindy", "David", "Eric"]
+
+    # build player
+    A = build_player(args.player_strategy, "Alex", PERSONA_A, player_names=player_names)
+    # Modify PlayerA's settings for ablation experiments.
+    if args.player_engine: A.engine = args.player_engine
+    if args.player_k:  A.k_level = args.player_k
+    players.append(A)
+
+    # build opponent
+    for program_name, persona in [("Bob", PERSONA_B), ("Cindy", PERSONA_C), ("David", PERSONA_D), ("Eric", PERSONA_E)]:
+        players.append(build_player(args.computer_strategy, program_name, persona, args.init_mean, args.norm_std, player_names=player_names))
+
+    return G08A(players, concurrent_prediction=args.concurrent_prediction)
+
 
+def game_log(args, exp_no):
+    """
+    Event log of experiment `exp_no`, next to its output file
+    """
+    output_file = get_output_file(args, exp_no)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    return GameLog(output_file[:-len(".json")] + ".events.jsonl")
+
+
+def run_experiment(args, exp_no):
+    """
+    Play one game and export its records (a JSON dump, the result store of the output dir or both), returns the output file
+    """
+    output_file = get_output_file(args, exp_no)
+    # experiment exp_no is its own replicate: own cache entries and mock answers, whichever worker plays it
+    start_run(exp_no)
+
+    # run multi-round game (default 10), logging every completion and round as it happens
+    Game = build_game(args, exp_no)
+    log = game_log(args, exp_no)
+    set_event_sink(log.write)
+    try:
+        with call_tags(game=os.path.basename(output_file)[:-len(".json")]):
+            Game.run_multi_round(args.max_round, log)
+    finally:
+        set_event_sink(None)
+        log.close(finished=False)
+    return export_game(args, exp_no, Game)
+
+
+def run_lockstep(cells, max_workers=64):
+    """
+    Play the games of `cells` ((args, exp_no) pairs) round by round together (see lockstep.py)
+    and export every finished one. Returns {output_file: exception} of the games that failed.
+    """
+    games = LockstepGames(max_workers)
+    built = []
+    for args, exp_no in cells:
+        Game = build_game(args, exp_no)
+        # output files of different cells can share a basename, the game name is the full path
+        games.add(get_output_file(args, exp_no)[:-len(".json")], Game, args.max_round, game_log(args, exp_no), replicate=exp_no)
+        built.append((args, exp_no, Game))
+    failed = {f"{name}.json": error for name, error in games.run().items()}
+    for args, exp_no, Game in built:
+        if get_output_file(args, exp_no) not in failed:
+            export_game(args, exp_no, Game)
+    return failed
+
+
+def export_game(args, exp_no, Game):
+    """
+    Export the records of the finished game `Game` of experiment `exp_no`, returns the output file
+    """
+    output_file = get_output_file(args, exp_no)
+    
+    messages = {}
+    biddings = {}
+    logs = {}
+    parse_stats = {}
+    for agent in Game.all_players:
+        if agent.is_agent:
+             messages[agent.name] = agent.message
+             parse_stats[agent.name] = dict(agent.parse_stats)
+        biddings[agent.name] = agent.biddings
+        if agent.logs:
+            logs[agent.name] = agent.logs
+
+    if args.output_format in ["json", "both"]:
+        with open(output_file,"w") as fout:
             debug_info = {
                 "winners": Game.round_winner,
                 "biddings": biddings,
                 "message": messages,
-                "logs":logs
+                "logs":logs,
+                "parse_stats": parse_stats
             }
 
             json.dump(debug_info, fout, indent=4)
+    if args.output_format in ["store", "both"]:
+        game = os.path.basename(output_file)[:-len(".json")]
+        meta = {"player_strategy": args.player_strategy, "computer_strategy": args.computer_strategy, "exp_no": exp_no}
+        transcript = {"message": messages, "logs": logs, "parse_stats": parse_stats}
+        ResultStore(args.output_dir).write(game, game_tables(Game), transcript, meta)
+    return output_file
 
-if __name__=="__main__":
+
+def main(args):
+    configure(backend=args.backend, latency=args.mock_latency)
+    if args.trace:
+        start_trace()
+
+    if args.lockstep:
+        failed = run_lockstep([(args, exp_no) for exp_no in range(args.start_exp, args.exp_num)], args.lockstep_workers)
+        for output_file, error in failed.items():
+            print(f"{output_file} failed ({error!r}), run the same command again to resume it")
+    else:
+        for exp_no in range(args.start_exp, args.exp_num):
+            run_experiment(args, exp_no)
+
+    print("Bid parsing tiers:", dict(PARSE_STATS))
+    cache = default_cache()
+    if cache:
+        print("Response cache:", cache.stats())
+    print("All completions:")
+    print(format_call_summary(call_summary(by=())))
+    print("Completions by strategy and purpose:")
+    print(format_call_summary(call_summary(("strategy", "purpose"))))
+    if args.trace:
+        write_chrome_trace(args.trace)
+        print("Trace written to", args.trace)
+
+def get_parser():
     import argparse
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('--player_strategy', type=str, default="cot", choices=["agent","cot","pcot","kr","reflect", "persona", "refine", "spp"])
-    parser.add_argument('--computer_strategy', type=str,choices=["agent", "fix", "last", "mono", "monorand","cot","pcot","kr","reflect", "persona", "refine", "spp"], default="fix")
+    parser.add_argument('--player_strategy', type=str, default="cot", choices=PLAYER_STRATEGIES)
+    parser.add_argument('--computer_strategy', type=str,choices=COMPUTER_STRATEGIES, default="fix")
     parser.add_argument("--output_dir", type=str, default="result")
+    parser.add_argument("--output_format", type=str, default="json", choices=["json", "store", "both"], help="per-game JSON dumps, a columnar result store in the output dir, or both")
     parser.add_argument("--init_mean", type=int, default=40, help="init mean value for computer player")
     parser.add_argument("--norm_std", type=int, default=5, help="standard deviation of the random distribution of computer gamers")
     parser.add_argument('--max_round', type=int, default=10)
@@ -107,6 +237,15 @@ if __name__=="__main__":
     parser.add_argument('--exp_num', type=int, default=10)
     parser.add_argument('--player_engine', type=str, default=None, help="player's OpenAI api engine")
     parser.add_argument('--player_k', type=int, default=None, help="player's k-level (default 2)")
+    parser.add_argument('--concurrent_prediction', action="store_true", help="run the prediction phase of all players in a round concurrently")
+    parser.add_argument('--backend', type=str, default=None, choices=["openai", "mock"], help="completion backend (default: $ALYMPICS_BACKEND or openai)")
+    parser.add_argument('--mock_latency', type=str, default=None, help="latency of the mock backend, e.g. 0, fixed:0.2, uniform:0.1,0.5, lognormal:-1,0.5")
+    parser.add_argument('--trace', type=str, default=None, help="write every completion (player, round, purpose, tokens, latency) to this Chrome trace JSON file")
+    parser.add_argument('--lockstep', action="store_true", help="play all games round by round together, with the bids of all games in one concurrent dispatch")
+    parser.add_argument('--lockstep_workers', type=int, default=64, help="completions in flight at once with --lockstep")
+    return parser
 
-    args = parser.parse_args()
+
+if __name__=="__main__":
+    args = get_parser().parse_args()
     main(args)
\ No newline at end of file
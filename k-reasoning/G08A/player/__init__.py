@@ -1,3 +1,4 @@
+import paths
 from .basic_player import ProgramPlayer
 from .reasoning_player import *
 from .k_level_reasoning_player import *
\ No newline at end of file
@@ -2,6 +2,8 @@ from random import randint
 import numpy as np
 
 class Player():
+    unlogged_state = ("ROUND_WINNER",) # the game's round_winner, restored with the game
+
     def __init__(self, name):
         self.name = name
         self.hp = 10
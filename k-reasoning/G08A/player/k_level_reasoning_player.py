@@ -1,14 +1,15 @@
-from openai import OpenAI
-import time
-from copy import deepcopy
+from collections import ChainMap
 import os
 
+from conversation import Conversation
+from fan_out import fan_out
+from llm_backend import ChatClient, tagged
 from .reasoning_player import AgentPlayer
 
 round_number = round
 
 # 创建 DeepSeek API 客户端
-client = OpenAI(
+client = ChatClient(
     api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
     base_url="https://api.deepseek.com/v1",
 )
@@ -30,6 +31,9 @@ class KLevelReasoningPlayer(AgentPlayer):
                           "Please choose an integer between 1 and 100 for this round.")
     PREDICTION_RESPONSE = "I choose {bidding}."
 
+    # simulated opponent histories are rebuilt from history_biddings when missing
+    unlogged_state = AgentPlayer.unlogged_state + ("transcripts",)
+
     def __init__(self, name, persona, engine, players):
         super().__init__(name, persona, engine)
         self.bidding_history = {}
@@ -39,6 +43,8 @@ class KLevelReasoningPlayer(AgentPlayer):
         self.round_result = {}
         for player in players:
             self.history_biddings[player]=[]
+        # simulated message history of each opponent, extended by one round per round
+        self.transcripts = {}
 
         self.k_level = 2
 
@@ -53,94 +59,70 @@ class KLevelReasoningPlayer(AgentPlayer):
         self.bidding_history[round] = bidding_details
         self.history_biddings = history_biddings #  {"Alex": [1,2,3]}
 
+    @tagged("predict")
     def predict(self, round):
 
         def self_act(message):
-            status = 0
-            while status != 1:
-                try:
-                    response = client.chat.completions.create(
-                        model=self.engine,
-                        messages=message,
-                        temperature=0.7,
-                        max_tokens=800,
-                        top_p=0.95,
-                        frequency_penalty=0, 
-                        presence_penalty=0,
-                        stop=None)
-                    response = response.choices[0].message.content
-                    self.message.append({"role":"assistant","content":response})
-                    status = 1
-                except Exception as e:
-                    print(e)
-                    time.sleep(15)
+            response = client.chat.completions.create(
+                model=self.engine,
+                messages=message.render(),
+                temperature=0.7,
+                max_tokens=800,
+                top_p=0.95,
+                frequency_penalty=0, 
+                presence_penalty=0,
+                stop=None)
+            response = response.choices[0].message.content
+            self.message.append({"role":"assistant","content":response})
             return self.parse_result(response)
-        
-        def add_warning(hp, win):
-            if not win:
-                if hp < 5:
-                    return f"WARNING: You have lost 1 point of HP in this round! You now have only {hp} points of health left. You are in DANGER and one step closer to death. "
-                if hp <=3 :
-                    return f"WARNING: You have lost 1 point of HP in this round! You now have only {hp} points of health left. You are in extreme DANGER and one step closer to death.  "
-                return f"WARNING: You have lost 1 point of HP in this round! You now have only {hp} points of health left. You are one step closer to death.  "
-            return "You have successfully chosen the number closest to the target number, which is the average of all players' selected numbers multiplied by 0.8. As a result, you have won this round. All other players will now deduct 1 HP. "
-
-        history_biddings = deepcopy(self.history_biddings)
-        round_result = deepcopy(self.round_result)
-        round_winner = deepcopy(self.ROUND_WINNER)
+
+        # The lookahead levels write their simulated rounds on top of the real history.
+        simulated = {player: [] for player in self.history_biddings}
+        tails = {}
+        round_result = ChainMap({}, self.round_result)
+        round_winner = ChainMap({}, self.ROUND_WINNER)
         self_hp = self.hp
-        self_message = deepcopy(self.message)
+        self_message = self.message.fork()
         for k in range(self.k_level):
             prediction = {}
             logs = {}
             player_hp = {}
             k_round = round+k
-            for player in history_biddings:
-                hp=10
+            alive = []
+            for player in self.history_biddings:
                 if player == self.name: continue
                 
                 print(f"Player {self.name} conduct predict {player}")
-                message = [{
-                    "role": "system",
-                    "content": self.PREDICTION_GAME_SETTING.format(name=player)
-                }]
-                for r in range(len(history_biddings[player])):
-                    message.append({
-                        "role": "system",
-                        "content": self.PREDICTION_INQUIRY.format(name=player, round=r+1, hp=hp)
-                    })
-                    message.append({
-                        "role": "assistant",
-                        "content": self.PREDICTION_RESPONSE.format(bidding=history_biddings[player][r])
-                    })
-                    message.append({
-                        "role": "system",
-                        "content": round_result[r+1]
-                    })
-                    message.append({
-                        "role": "system",
-                        "content": add_warning(hp, player in round_winner[r+1])
-                    })
-                    if player not in round_winner[r+1]:
-                        hp-=1
+                transcript = self.update_transcript(player)
+                tail = tails.setdefault(player, {"message": [], "rounds": 0, "hp": transcript["hp"]})
+                new_biddings = simulated[player][tail["rounds"]:]
+                tail["hp"] = self.extend_transcript(tail["message"], player, new_biddings, transcript["rounds"]+tail["rounds"]+1, tail["hp"], round_result, round_winner)
+                tail["rounds"] += len(new_biddings)
+                message = transcript["message"].render() + tail["message"]
+                hp = tail["hp"]
 
                 # Predict the opponent's next move based on their historical information.
                 if hp>0:
                     message.append({
                         "role": "system",
-                        "content": self.PREDICTION_INQUIRY.format(name=player, round=len(history_biddings[player])+1, hp=hp)
+                        "content": self.PREDICTION_INQUIRY.format(name=player, round=transcript["rounds"]+tail["rounds"]+1, hp=hp)
                         })
-                    next_bidding = self.agent_simulate(message, engine=self.engine)
-                    message.append({
-                        "role": "assistant",
-                        "content": next_bidding
-                    })
-                    prediction[player] = self.parse_result(next_bidding)
+                    alive.append(player)
                 else:
-                    prediction[player] = history_biddings[player][-1]
+                    prediction[player] = simulated[player][-1] if simulated[player] else self.history_biddings[player][-1]
                 logs[player] = message
                 player_hp[player] = hp
 
+            # an opponent's prompt holds the simulated rounds of the earlier levels only, never
+            # the answers of the other opponents of this level, so they are simulated together
+            for player, next_bidding in zip(alive, self.simulate_opponents([logs[player] for player in alive])):
+                logs[player].append({
+                    "role": "assistant",
+                    "content": next_bidding
+                })
+                prediction[player] = self.parse_result(next_bidding)
+            prediction = {player: prediction[player] for player in logs}
+
             if k==self.k_level-2: break
             # If k-level >= 3, it is necessary to predict future outcomes.
 
@@ -172,8 +154,8 @@ class KLevelReasoningPlayer(AgentPlayer):
 
             # Use list comprehensions for concise and readable constructions
             bidding_numbers = [f"{prediction[player]}" for player in prediction]
-            for player in history_biddings:
-                history_biddings[player].append(prediction[player])
+            for player in simulated:
+                simulated[player].append(prediction[player])
             bidding_details = [f"{player} chose {prediction[player]}" for player in prediction]
             diff_details = [
                 f"{player}: |{prediction[player]} - {Target}| = {round_number(abs(prediction[player] - Target))}"
@@ -197,23 +179,77 @@ class KLevelReasoningPlayer(AgentPlayer):
         }
         return prediction
     
+    @staticmethod
+    def add_warning(hp, win):
+        if not win:
+            if hp < 5:
+                return f"WARNING: You have lost 1 point of HP in this round! You now have only {hp} points of health left. You are in DANGER and one step closer to death. "
+            if hp <=3 :
+                return f"WARNING: You have lost 1 point of HP in this round! You now have only {hp} points of health left. You are in extreme DANGER and one step closer to death.  "
+            return f"WARNING: You have lost 1 point of HP in this round! You now have only {hp} points of health left. You are one step closer to death.  "
+        return "You have successfully chosen the number closest to the target number, which is the average of all players' selected numbers multiplied by 0.8. As a result, you have won this round. All other players will now deduct 1 HP. "
+
+    def extend_transcript(self, message, player, biddings, first_round, hp, round_result, round_winner):
+        """
+        Append the rounds in which `player` chose `biddings`, starting at `first_round`, to `message`. Returns the HP left.
+        """
+        for r, bidding in enumerate(biddings, first_round):
+            message.append({
+                "role": "system",
+                "content": self.PREDICTION_INQUIRY.format(name=player, round=r, hp=hp)
+            })
+            message.append({
+                "role": "assistant",
+                "content": self.PREDICTION_RESPONSE.format(bidding=bidding)
+            })
+            message.append({
+                "role": "system",
+                "content": round_result[r]
+            })
+            message.append({
+                "role": "system",
+                "content": self.add_warning(hp, player in round_winner[r])
+            })
+            if player not in round_winner[r]:
+                hp-=1
+            if isinstance(message, Conversation):
+                message.close_round(f"Round {r}: {player} chose {bidding}; {player} {'won' if player in round_winner[r] else 'lost'}; HP {hp}.")
+        return hp
+
+    def update_transcript(self, player):
+        """
+        Bring the simulated history of `player` up to date with the rounds played so far.
+        """
+        transcript = self.transcripts.get(player)
+        if transcript is None:
+            transcript = self.transcripts[player] = {
+                "message": Conversation([{"role": "system", "content": self.PREDICTION_GAME_SETTING.format(name=player)}]),
+                "rounds": 0,
+                "hp": 10,
+            }
+        new_biddings = self.history_biddings[player][transcript["rounds"]:]
+        transcript["hp"] = self.extend_transcript(transcript["message"], player, new_biddings, transcript["rounds"]+1, transcript["hp"], self.round_result, self.ROUND_WINNER)
+        transcript["rounds"] += len(new_biddings)
+        return transcript
+
+    def simulate_opponents(self, messages):
+        """
+        Run `agent_simulate` on every opponent transcript concurrently, the answers keep the order of `messages`.
+        """
+        return fan_out(lambda message: self.agent_simulate(message, engine=self.engine), messages)
+
     # @staticmethod
+    @tagged("predict")
     def agent_simulate(self, message, engine):
-        while 1:
-            try:
-                response = client.chat.completions.create(
-                    model=engine,
-                    messages=message,
-                    temperature=0.7,
-                    max_tokens=80,
-                    top_p=0.9,
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    stop=None)
-                RESPONSE = response.choices[0].message.content
-                return RESPONSE
-            except Exception as e:
-                print(e)
-                time.sleep(15)
+        response = client.chat.completions.create(
+            model=engine,
+            messages=message,
+            temperature=0.7,
+            max_tokens=80,
+            top_p=0.9,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None)
+        return response.choices[0].message.content
 
 
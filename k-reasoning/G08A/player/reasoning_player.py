@@ -1,17 +1,23 @@
-from openai import OpenAI
-import time
 import os
+from collections import Counter
 
 from .basic_player import Player
+from bid_parsing import NUMBER, extract_number
+from conversation import Conversation
+from llm_backend import ChatClient, call_tags, tagged
 
 PERSONA = "You are {name} and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
 
 # 创建 DeepSeek API 客户端
-client = OpenAI(
+client = ChatClient(
     api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
     base_url="https://api.deepseek.com/v1",
 )
 
+# Which tier resolved each parsed number during this run.
+PARSE_STATS = Counter()
+
+
 class AgentPlayer(Player):
     is_agent=True
     GAME_SETTING = ("SURVIVE CHALLENGE!!! You are one of five players in the game. "
@@ -31,6 +37,7 @@ class AgentPlayer(Player):
     
     INQUIRY = ("Ok, {name}! Now is the ROUND {round}, and your HP is at {hp}. "
                "Please choose an integer between 1 and 100 for this round.")
+    BID_RANGE = (1, 100)
     
     def __init__(self, name, persona, engine="deepseek-chat"):
         self.name = name
@@ -39,60 +46,63 @@ class AgentPlayer(Player):
 
         self.biddings = []
         self.persona = persona
-        self.message = [{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}]
+        self.message = Conversation([{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}])
 
         self.logs = None
+        self.parse_stats = Counter()
 
+    @tagged("bid")
     def act(self):
         print(f"Player {self.name} conduct bidding")
-        status = 0
-        while status != 1:
-            try:
-                response = client.chat.completions.create(
-                    model=self.engine,
-                    messages=self.message,
-                    temperature=0.7,
-                    max_tokens=800,
-                    top_p=0.95,
-                    frequency_penalty=0, 
-                    presence_penalty=0,
-                    stop=None)
-                response = response.choices[0].message.content
-                self.message.append({"role":"assistant","content":response})
-                status = 1
-            except Exception as e:
-                print(e)
-                time.sleep(15)
+        response = client.chat.completions.create(
+            model=self.engine,
+            messages=self.message.render(),
+            temperature=0.7,
+            max_tokens=800,
+            top_p=0.95,
+            frequency_penalty=0, 
+            presence_penalty=0,
+            stop=None)
+        response = response.choices[0].message.content
+        self.message.append({"role":"assistant","content":response})
         self.biddings.append(self.parse_result(response))
 
     def parse_result(self, message):
-        status = 0
-        times = 0
-        while status != 1:
-            try:
-                response = client.chat.completions.create(
-                    model=self.engine,
-                    messages=[{"role":"system", "content":"By reading the conversation, extract the number chosen by player. Output format: number"}, {"role": "user", "content": message}],
-                    temperature=0.7,
-                    max_tokens=800,
-                    top_p=0.95,
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    stop=None)
-                response = response.choices[0].message.content
-                assert response.isnumeric(), "Not A Number: "+ message
-                bidding_info = int(float(response))
-                status = 1
-                return bidding_info
-            except AssertionError as e:
-                print("Result Parsing Error: ",e)
-                times+=1
-                if times>=3:
-                    exit()
-            except Exception as e:
-                print(e)
-                time.sleep(15)
-
+        """
+        Read the chosen number from a response: regex tiers first, the model only for ambiguous text.
+        """
+        low, high = self.BID_RANGE
+        tier, bidding = extract_number(message, low, high)
+        if tier is None:
+            tier, bidding = "llm", self.llm_parse_result(message)
+        if bidding is None:
+            # keep playing with the last number in range, or repeat the previous choice
+            numbers = [int(float(n)) for n in NUMBER.findall(message) if low <= int(float(n)) <= high]
+            tier, bidding = "fallback", numbers[-1] if numbers else (self.biddings[-1] if self.biddings else low)
+            print(f"Result Parsing Error: use {bidding} for {self.name}")
+        self.parse_stats[tier] += 1
+        PARSE_STATS[tier] += 1
+        return bidding
+
+    @tagged("parse")
+    def llm_parse_result(self, message):
+        """
+        Ask the model to extract the number, None after three unreadable answers.
+        """
+        for times in range(3):
+            response = client.chat.completions.create(
+                model=self.engine,
+                messages=[{"role":"system", "content":"By reading the conversation, extract the number chosen by player. Output format: number"}, {"role": "user", "content": message}],
+                temperature=0.7,
+                max_tokens=800,
+                top_p=0.95,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stop=None)
+            response = response.choices[0].message.content
+            if response.isnumeric():
+                return int(float(response))
+            print("Result Parsing Error: Not A Number: "+ message)
         return None
     
     def start_round(self, round):
@@ -101,6 +111,7 @@ class AgentPlayer(Player):
     def notice_round_result(self, round, bidding_info, round_target, win, bidding_details, history_biddings):
         self.message_update_result(bidding_info)
         self.message_update_warning(win)
+        self.message.close_round(f"Round {round}: {bidding_details}; target {round_target}; you {'won' if win else 'lost'}; your HP {self.hp}.")
     
     def message_update_result(self, bidding_info):
         self.message += [{"role":"system","content":bidding_info}]
@@ -118,23 +129,16 @@ class AgentPlayer(Player):
         self.message += [{"role":"system","content": add_warning()}]
 
     def conduct_inquiry(self, inquiry):
-        while 1:
-            try:
-                response = client.chat.completions.create(
-                    model=self.engine,
-                    messages=self.message + [{"role":"system","content":inquiry}],
-                    temperature=0.7,
-                    max_tokens=800,
-                    top_p=0.9,
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    stop=None)
-
-                RESPONSE = response.choices[0].message.content
-                return RESPONSE
-            except Exception as e:
-                print(e)
-                time.sleep(15)
+        response = client.chat.completions.create(
+            model=self.engine,
+            messages=self.message.request({"role":"system","content":inquiry}),
+            temperature=0.7,
+            max_tokens=800,
+            top_p=0.9,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None)
+        return response.choices[0].message.content
 
 
 class CoTAgentPlayer(AgentPlayer):
@@ -157,7 +161,7 @@ class PersonaAgentPlayer(AgentPlayer):
     def __init__(self, name, persona, engine):
         super().__init__(name, persona, engine)
         self.persona = self.MATH_EXPERT_PERSONA.format(name=name)
-        self.message = [{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}]
+        self.message = Conversation([{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}])
 
     def start_round(self, round):
         self.message += [{"role":"system","content":self.INQUIRY_PERSONA.format(name=self.name, round=round, hp=self.hp)}]
@@ -170,6 +174,7 @@ class ReflectionAgentPlayer(AgentPlayer):
         # refelxtion after round end
         self.reflect()
 
+    @tagged("reflect")
     def reflect(self):
         print(f"Player {self.name} conduct reflect")
         self.message += [{"role":"system","content": self.REFLECT_INQUIRY}, {"role":"assistant","content":self.conduct_inquiry(self.REFLECT_INQUIRY)}]  
@@ -179,7 +184,7 @@ class SelfRefinePlayer(AgentPlayer):
     INQUIRY_COT = ("Ok, {name}! Now is the ROUND {round}, and your HP is at {hp}. "
                    "Guess which number will win in the next round. Let's think step by step, and finally answer a number you think you can win.")
     
-    FEEDBACK_PROMPT = ("Carefully study the user's strategy in this round of the game. As a game expert, can you give a suggestion to optimize the user's strategy so that he can improve his winning rate in this round?")
+    FEEDBACK_PROMPT = ("Carefully study the player's strategy in this round of the game. As a game expert, can you give a suggestion to optimize the player's strategy so that he can improve his winning rate in this round?")
     REFINE_PROMPT = ("I have a game expert's advice on your strategy in this round."
                      "You can adjust your strategy just now according to his suggestion. Here are his suggestions:"
                      "{feedback}")
@@ -193,49 +198,32 @@ class SelfRefinePlayer(AgentPlayer):
     def start_round(self, round):
         self.cur_round = round
     
+    @tagged("bid")
     def act(self):
         print(f"Player {self.name} conduct bidding")
         def completion(message):
-            status = 0
-            while status != 1:
-                try:
-                    response = client.chat.completions.create(
-                        model=self.engine,
-                        messages=message,
-                        temperature=0.7,
-                        max_tokens=800,
-                        top_p=0.95,
-                        frequency_penalty=0,
-                        presence_penalty=0,
-                        stop=None)
-                    response = response.choices[0].message.content
-                    status = 1
-                except Exception as e:
-                    print(e)
-                    time.sleep(15)
-            return response
+            response = client.chat.completions.create(
+                model=self.engine,
+                messages=message,
+                temperature=0.7,
+                max_tokens=800,
+                top_p=0.95,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stop=None)
+            return response.choices[0].message.content
         
         for t in range(self.refine_times):
             # refine_times==action_times
             if t==0:
                 self.message.append({"role":"system","content":self.INQUIRY_COT.format(name=self.name, round=self.cur_round, hp=self.hp)})
             else:
-                refine_message = []
-                for m in self.message:
-                    if m["role"]=="system":
-                        refine_message.append(m)
-                    else:
-                        refine_message.append({
-                            "role": "user",
-                            "content": m["content"]
-                        })
-                refine_message.append({
-                        "role": "system",
-                        "content": self.FEEDBACK_PROMPT
-                    })
-                feedback = completion(refine_message)
+                # Ask for feedback on the conversation as it is (no re-roled copy), so the request extends the cached prompt prefix.
+                with call_tags(purpose="feedback"):
+                    feedback = completion(self.message.request({"role":"system","content":self.FEEDBACK_PROMPT}))
                 self.message.append({"role":"system","content": self.REFINE_PROMPT.format(feedback=feedback)})
-            self.message.append({"role":"assistant","content": completion(self.message)})
+            with call_tags(purpose="bid" if t==0 else "refine"):
+                self.message.append({"role":"assistant","content": completion(self.message.render())})
         
         self.biddings.append(self.parse_result(self.message[-1]["content"]))
 
@@ -310,8 +298,8 @@ Final answer: 6 * (1 + 1) + 12 = 24
     def __init__(self, name, persona, engine):
         super().__init__(name, persona, engine)
         self.persona = self.PERSONA.format(name=name)
-        self.message = [{"role":"system","content": self.SPP_EXAMPLE.format(name=self.name)},
-                        {"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}]
+        self.message = Conversation([{"role":"system","content": self.SPP_EXAMPLE.format(name=self.name)},
+                                     {"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}])
 
     def start_round(self, round):
         self.message += [{"role":"system","content":self.INQUIRY_SPP.format(name=self.name, round=round, hp=self.hp)}]
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Run a matrix of G08A experiments concurrently.
+
+Every cell (player_strategy x computer_strategy x engine x k_level x exp_no) is one
+`main.run_experiment` call executed in a process pool. All workers share a single
+semaphore around the API calls, so `--max_inflight` caps the requests in flight no
+matter how many games run at once. Cells whose results have already been exported are skipped,
+which makes an interrupted sweep resumable by re-running the same command.
+
+    python schedule.py --player_strategies all --computer_strategies all --exp_num 10 --workers 16 --max_inflight 32
+
+With `--batch DIR` all cells are played at once as threads of this process instead, and their
+completions are sent in waves through a batch endpoint (`--batch_endpoint openai` for the Batch
+API at half the price, `local` for a file-based stand-in that answers with the regular backend):
+every wave is one request JSONL in DIR, the games wait until its output file lands. Re-running
+the same command after an interruption resumes the games from their event logs and picks up
+waves that were already submitted.
+
+    python schedule.py --player_strategies all --computer_strategies all --exp_num 10 --batch result/batches --batch_endpoint openai
+
+With `--lockstep` all cells are played round by round together in this process instead
+(lockstep.py): the bids of all games of a round go out in one concurrent dispatch, with at most
+`--max_inflight` requests in flight.
+
+    python schedule.py --player_strategies kr cot --computer_strategies agent --exp_num 20 --lockstep --max_inflight 64
+"""
+import os
+import time
+import copy
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import paths
+from main import get_parser, get_output_file, result_exists, run_experiment, run_lockstep, PLAYER_STRATEGIES, COMPUTER_STRATEGIES
+from llm_backend import (BatchExecutor, LocalBatchEndpoint, OpenAIBatchEndpoint, configure, set_batch_executor,
+                         set_request_gate)
+
+
+def expand(values, choices):
+    if values == ["all"]:
+        return list(choices)
+    for value in values:
+        if value not in choices:
+            raise ValueError(f"unknown strategy {value}, choose from {choices}")
+    return values
+
+
+def build_cells(args):
+    """
+    Namespace of `main.py` arguments and exp_no for every cell of the matrix.
+    Engine and k-level variants write to their own sub-folder of the output dir.
+    """
+    cells = []
+    for engine in args.player_engines:
+        for k in args.player_ks:
+            output_dir = args.output_dir
+            if engine: output_dir = os.path.join(output_dir, engine)
+            if k: output_dir = os.path.join(output_dir, f"k{k}")
+            for player_strategy in expand(args.player_strategies, PLAYER_STRATEGIES):
+                for computer_strategy in expand(args.computer_strategies, COMPUTER_STRATEGIES):
+                    cell = copy.copy(args)
+                    cell.player_strategy = player_strategy
+                    cell.computer_strategy = computer_strategy
+                    cell.player_engine = engine
+                    cell.player_k = k
+                    cell.output_dir = output_dir
+                    for exp_no in range(args.start_exp, args.exp_num):
+                        cells.append((cell, exp_no))
+    return cells
+
+
+def init_worker(gate, backend, mock_latency):
+    set_request_gate(gate)
+    configure(backend=backend, latency=mock_latency)
+
+
+def run_batched(executor, cell, exp_no):
+    """
+    `run_experiment` as one of the games of `executor`.
+    """
+    return executor.run(run_experiment, cell, exp_no)
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def main(args):
+    cells = build_cells(args)
+    todo = [(cell, exp_no) for cell, exp_no in cells if not result_exists(cell, exp_no)]
+    print(f"{len(cells)} cells, {len(cells)-len(todo)} already done, {len(todo)} to run")
+    if not todo:
+        return
+
+    if args.lockstep:
+        configure(backend=args.backend, latency=args.mock_latency)
+        set_request_gate(threading.BoundedSemaphore(args.max_inflight) if args.max_inflight else None)
+        start = time.time()
+        failed = run_lockstep(todo, args.lockstep_workers)
+        print(f"{len(todo)-len(failed)} games done in lock-step | elapsed {format_time(time.time() - start)}")
+        for output_file, error in failed.items():
+            print("  ", output_file, f"failed ({error!r}), re-run the same command to retry it")
+        return
+
+    if args.batch:
+        configure(backend=args.backend, latency=args.mock_latency)
+        endpoint = OpenAIBatchEndpoint() if args.batch_endpoint == "openai" else LocalBatchEndpoint()
+        executor = BatchExecutor(args.batch, endpoint)
+        set_batch_executor(executor)
+        pool = ThreadPoolExecutor(len(todo))
+        def submit(cell, exp_no):
+            executor.add_game()
+            return pool.submit(run_batched, executor, cell, exp_no)
+    else:
+        gate = multiprocessing.BoundedSemaphore(args.max_inflight) if args.max_inflight else None
+        pool = ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(gate, args.backend, args.mock_latency))
+        submit = lambda cell, exp_no: pool.submit(run_experiment, cell, exp_no)
+    start = time.time()
+    done, failed = 0, []
+    with pool:
+        futures = {submit(cell, exp_no): get_output_file(cell, exp_no) for cell, exp_no in todo}
+        for future in as_completed(futures):
+            done += 1
+            try:
+                future.result()
+                status = "done"
+            except Exception as e:
+                failed.append(futures[future])
+                status = f"failed ({e!r})"
+            elapsed = time.time() - start
+            eta = elapsed / done * (len(todo) - done)
+            print(f"[{done}/{len(todo)}] {futures[future]} {status} | elapsed {format_time(elapsed)} | eta {format_time(eta)}", flush=True)
+
+    if args.batch:
+        print(f"{executor.requests} completions in {executor.waves} batch waves")
+    if failed:
+        print(f"{len(failed)} cells failed, re-run the same command to retry them:")
+        for output_file in failed:
+            print("  ", output_file)
+
+
+if __name__=="__main__":
+    parser = get_parser()
+    parser.add_argument('--player_strategies', type=str, nargs="+", default=["all"], help="player strategies or 'all'")
+    parser.add_argument('--computer_strategies', type=str, nargs="+", default=["all"], help="computer strategies or 'all'")
+    parser.add_argument('--player_engines', type=str, nargs="+", default=[None], help="player engines to ablate (default: ENGINE)")
+    parser.add_argument('--player_ks', type=int, nargs="+", default=[None], help="player k-levels to ablate (default 2)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="games played at the same time")
+    parser.add_argument('--max_inflight', type=int, default=16, help="API requests in flight across all workers, 0 for no cap")
+    parser.add_argument('--batch', type=str, default=None, help="play all cells at once and send their completions in waves through a batch endpoint, with the wave files in this dir")
+    parser.add_argument('--batch_endpoint', type=str, default="local", choices=["local", "openai"], help="batch endpoint of --batch: a local stand-in or the OpenAI-compatible Batch API")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,171 @@
+"""
+Vectorised G08A simulator for populations of program players (fix, last, mono, monorand).
+
+Program players need no LLM, so instead of playing their games one by one through the `G08A`
+engine, all games are simulated at once as (games x players) NumPy arrays, one array step per
+round. This calibrates the baseline opponents (bid distributions, win rates, survival) over
+millions of player-rounds in seconds:
+
+    python simulate.py --strategies fix fix last mono monorand --init_mean 40 --norm_std 5 --games 10000
+    python simulate.py --strategies fix last --players 100 --games 10000 --max_round 20
+
+The rules are those of `G08A.run_single_round` and `ProgramPlayer`: the target is 0.8 x the
+average bid of the players still alive (to 2 decimals), the bids closest to it win (the lower
+bid on equal distance), nobody wins when all bids are equal, every other player loses 1 HP,
+players at 0 HP are out. "last" players bid around the previous target, "mono" players lower
+their bid by `std` every round. The random numbers are drawn differently than in the engine, so
+single games differ, their distributions do not; `--check` compares both on the same population.
+"""
+import time
+
+import numpy as np
+
+PROGRAM_STRATEGIES = ["fix", "last", "mono", "monorand"]
+FIX, LAST, MONO = 0, 1, 2
+
+
+def _per_player(value, shape, dtype=float):
+    return np.broadcast_to(np.asarray(value, dtype=dtype), shape).copy()
+
+
+def simulate(strategies, means, stds, n_games, max_round=10, hp=10, seed=0):
+    """
+    Play `n_games` games of the program players `strategies` (one name per player) for `max_round`
+    rounds. `means` and `stds` are scalars, one value per player or (games x players) arrays.
+
+    Returns a dict of arrays laid out like `metrics.stack`: "biddings" (games x players x rounds,
+    NaN once a player is out), "won" (games x players x rounds), "targets" (games x rounds, NaN
+    once a game has no players left) and "hp" (games x players after the last round).
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_games, len(strategies))
+    codes = np.array([{"fix": FIX, "last": LAST, "mono": MONO, "monorand": MONO}[s] for s in strategies])
+    mean = _per_player(means, shape)
+    std = _per_player(stds, shape)
+    # a monorand player is a mono player whose step is drawn once, in 0..std
+    monorand = np.array([s == "monorand" for s in strategies])
+    std[:, monorand] = rng.integers(0, std[:, monorand].astype(int) + 1)
+    mono = np.broadcast_to(codes == MONO, shape)
+    last = np.broadcast_to(codes == LAST, shape)
+
+    health = np.full(shape, hp, dtype=int)
+    biddings = np.full(shape + (max_round,), np.nan)
+    won = np.zeros(shape + (max_round,), dtype=bool)
+    targets = np.full((n_games, max_round), np.nan)
+    for r in range(max_round):
+        alive = health > 0
+        n_alive = alive.sum(axis=1)
+        playing = n_alive > 0
+
+        bids = np.where(mono, mean, rng.normal(mean, std))
+        bids = np.clip(np.trunc(bids), 1, 100)
+        bids[~alive] = np.nan
+        average = np.nansum(bids, axis=1) / np.maximum(n_alive, 1)
+        target = np.round(average * 0.8, 2)
+
+        distance = np.abs(bids - target[:, None])
+        distance[~alive] = np.inf
+        closest = alive & (distance == distance.min(axis=1, keepdims=True))
+        win_bid = np.where(closest, bids, np.inf).min(axis=1)
+        tie = (n_alive >= 2) & (np.where(alive, bids, -np.inf).max(axis=1) == np.where(alive, bids, np.inf).min(axis=1))
+        winners = alive & (bids == win_bid[:, None]) & ~tie[:, None]
+
+        health -= alive & ~winners
+        mean = np.where(last & alive, target[:, None], mean)
+        mean = np.where(mono & (health > 0), mean - std, mean)
+
+        biddings[:, :, r] = bids
+        won[:, :, r] = winners
+        targets[playing, r] = target[playing]
+    return {"biddings": biddings, "won": won, "targets": targets, "hp": health}
+
+
+def engine_games(strategies, mean, std, n_games, max_round=10):
+    """
+    The same population played game by game through the headless `G08A` engine, as `simulate` arrays.
+    `mean` and `std` are scalars or one value per player.
+    """
+    from game import G08A
+    from player import ProgramPlayer
+
+    mean = np.broadcast_to(mean, len(strategies)).tolist()
+    std = np.broadcast_to(std, len(strategies)).tolist()
+    result = {"biddings": np.full((n_games, len(strategies), max_round), np.nan),
+              "won": np.zeros((n_games, len(strategies), max_round), dtype=bool),
+              "hp": np.zeros((n_games, len(strategies)), dtype=int)}
+    for g in range(n_games):
+        players = [ProgramPlayer(f"P{p}", strategy, mean[p], std[p]) for p, strategy in enumerate(strategies)]
+        game = G08A(players)
+        for player in players:
+            player.ROUND_WINNER = game.round_winner
+        for r in range(1, max_round+1):
+            if not game.survival_players:
+                break
+            game.run_single_round(r)
+        for p, player in enumerate(players):
+            result["biddings"][g, p, :len(player.biddings)] = player.biddings
+            for r, winners in game.round_winner.items():
+                result["won"][g, p, r-1] = player.name in winners
+            result["hp"][g, p] = player.hp
+    return result
+
+
+def summary(result, strategies):
+    """
+    Per strategy: mean bid of the first and last round played, win rate per round played, survival rate.
+    """
+    rows = {}
+    played = ~np.isnan(result["biddings"])
+    for strategy in dict.fromkeys(strategies):
+        columns = [p for p, s in enumerate(strategies) if s == strategy]
+        bids = result["biddings"][:, columns]
+        with np.errstate(invalid="ignore"):
+            rows[strategy] = {
+                "first_bid": float(np.nanmean(bids[:, :, 0])),
+                "last_bid": float(np.nanmean(bids[:, :, -1])) if played[:, columns, -1].any() else float("nan"),
+                "win_rate": float(result["won"][:, columns].sum() / max(played[:, columns].sum(), 1)),
+                "survival": float((result["hp"][:, columns] > 0).mean()),
+            }
+    return rows
+
+
+def print_summary(rows):
+    print(f"{'strategy':<10} {'first bid':>9} {'last bid':>9} {'win rate':>9} {'survival':>9}")
+    for strategy, row in rows.items():
+        print(f"{strategy:<10} {row['first_bid']:>9.2f} {row['last_bid']:>9.2f} {row['win_rate']:>9.3f} {row['survival']:>9.3f}")
+
+
+def main(args):
+    strategies = args.strategies * (args.players // len(args.strategies)) + args.strategies[:args.players % len(args.strategies)] \
+        if args.players else args.strategies
+    start = time.time()
+    result = simulate(strategies, args.init_mean, args.norm_std, args.games, args.max_round, seed=args.seed)
+    elapsed = time.time() - start
+    print(f"{args.games} games x {len(strategies)} players x {args.max_round} rounds in {elapsed:.2f}s "
+          f"({args.games * args.max_round / elapsed:,.0f} game-rounds/s, {args.games * len(strategies) * args.max_round / elapsed:,.0f} player-rounds/s)")
+    print_summary(summary(result, strategies))
+
+    if args.check:
+        start = time.time()
+        checked = engine_games(strategies, args.init_mean, args.norm_std, args.check, args.max_round)
+        print(f"G08A engine (headless), {args.check} games in {time.time() - start:.2f}s:")
+        print_summary(summary(checked, strategies))
+
+
+def get_parser():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--strategies', type=str, nargs="+", default=["fix", "fix", "last", "mono", "monorand"], choices=PROGRAM_STRATEGIES, help="strategy of every player")
+    parser.add_argument('--players', type=int, default=None, help="number of players, the strategies are repeated to fill them")
+    parser.add_argument("--init_mean", type=int, default=40, help="init mean value for computer player")
+    parser.add_argument("--norm_std", type=int, default=5, help="standard deviation of the random distribution of computer gamers")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--max_round', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', type=int, default=0, help="also play this many games through the G08A engine and print the same summary")
+    return parser
+
+
+if __name__=="__main__":
+    args = get_parser().parse_args()
+    main(args)
@@ -1,12 +1,18 @@
 import re
 import json
 import os
-from glob import glob
+import numpy as np
 import matplotlib.pyplot as plt
 from openai import OpenAI
 
+import paths
+import metrics
+from catalogue import Catalogue
+
+INDEXED_FIELDS = ["biddings", "winner", "status", "logs"] # per-game fields the metrics read, kept in the catalogue
+
 class SAGEvaluator(object):
-    def __init__(self, players, opponents, result_dir, output_dir) -> None:
+    def __init__(self, players, opponents, result_dir, output_dir, index_workers=None) -> None:
         self.players = players.split(",")
         self.opponents = opponents.split(",")
         self.result_dir = result_dir
@@ -15,6 +21,52 @@ class SAGEvaluator(object):
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
 
+        # every metric reads the games through one scan of the result folder
+        self.catalogue = Catalogue(result_dir, INDEXED_FIELDS, index_workers)
+        self._stacked = None
+
+    def load_games(self, pattern, *fields):
+        """
+        (result file, records) of every game matching the glob `pattern` (e.g. "kr_VS_agent*") with
+        the requested fields, served by the catalogue of result_dir: indexed fields come from memory,
+        the others ("message", ...) are read from the game on demand.
+        """
+        for game in self.catalogue.match(pattern):
+            yield self.catalogue.path(game), self.catalogue.get(game, *fields)
+
+    def stacked(self):
+        """
+        Bid, survival and prediction tensors (games x players x rounds) of every game in the catalogue, built once.
+        """
+        if self._stacked is None:
+            games = self.catalogue.match()
+            records = [self.catalogue.get(game, *INDEXED_FIELDS) for game in games]
+            bids = metrics.stack(records, "biddings")
+            alive, n_rounds = metrics.stack_status(records)
+            self._stacked = {
+                "rows": {game: i for i, game in enumerate(games)},
+                "bids": bids,
+                "alive": alive,
+                "n_rounds": n_rounds,
+                "predictions": metrics.stack_predictions(records, bids.shape[2]),
+            }
+        return self._stacked
+
+    def rows(self, pattern):
+        """
+        Rows of the stacked tensors of the games matching the glob `pattern`.
+        """
+        index = self.stacked()["rows"]
+        return np.array([index[game] for game in self.catalogue.match(pattern)], dtype=int)
+
+    def game_survival_rates(self, agent, computer):
+        t = self.stacked()
+        rows = self.rows(f"{agent}_VS_{computer}*")
+        return metrics.survival_rate(t["alive"][rows], t["n_rounds"][rows], soft=True)
+
+    def game_adaption_indices(self, agent, computer):
+        return metrics.second_bid_deviation_ratio(self.stacked()["bids"][self.rows(f"{agent}_VS_{computer}*")])
+
     def survival_rate(self, status, soft=True):
         rounds = [str(r) for r in range(1, len(status)+1)]
         players = {}
@@ -46,25 +98,13 @@ class SAGEvaluator(object):
         for agent in players:
             asr_result.setdefault(agent, {})
             for computer in opponents:
-                exp = f"{self.result_dir}/{agent}_VS_{computer}*.json"
-                cots = glob(exp)
-
-                wins = {}
-                for result in cots:
-                    with open(result) as fin:
-                        result = json.load(fin)["status"]
-                        sr = self.survival_rate(result, soft=True)
-                        for player in sr:
-                            wins.setdefault(player, [])
-                            wins[player].append(sr[player])
-
-                win_rate = sum(wins["Alex"])/len(wins["Alex"])
-                asr_result[agent][computer] = win_rate
+                rates = self.game_survival_rates(agent, computer)
+                asr_result[agent][computer] = rates.mean() if len(rates) else np.nan
         
         average = {}
         for i, agent in enumerate(asr_result):
-            average[agent] = list(asr_result[agent].values())
-            average[agent] = sum(average[agent])/len(average[agent])
+            # pairs without games are NaN, left out of the average (NaN, printed blank, when no pair has games)
+            average[agent] = metrics.nanmean(list(asr_result[agent].values()))
         
         print(f"{'':7s}\t"+"\t".join([f"{agent:7s}" for agent in players]))
         for computer in opponents:
@@ -82,37 +122,12 @@ class SAGEvaluator(object):
         players, opponents = self.players, self.opponents
         adaption_result = {}
 
-        def mean(a):
-            if not a:
-                return -1
-            return sum(a)/len(a)
-
         for oppo in opponents:
             exp_result = {}
             for agent in players:
-                exps = glob(f"{self.result_dir}/{agent}_VS_{oppo}*.json")
-                for exp in exps:
-                    with open(exp) as fin:
-                        logs = json.load(fin)
-                        exp_ground = logs["biddings"]
-                    target_div = {"first":[],"second":[]}
-                    for r in range(0, 10):
-                        if r>=len(exp_ground["Alex"]): 
-                            break
-                        second_bid=0
-                        player_bid=exp_ground["Alex"][r]
-                        for p in exp_ground:
-                            if r>=len(exp_ground[p]): continue
-                            if p!="Alex" and exp_ground[p][r]>second_bid:
-                                second_bid=exp_ground[p][r]
-                        if r>=5:
-                            target_div["second"].append(abs(player_bid-second_bid))
-                        else:
-                            target_div["first"].append(abs(player_bid-second_bid))
-                    exp_result.setdefault(agent, [])
-                    if not target_div["second"] or not target_div["first"]:
-                        continue
-                    exp_result[agent].append(mean(target_div["second"])/mean(target_div["first"]))
+                if not len(self.rows(f"{agent}_VS_{oppo}*")): continue
+                ratios = self.game_adaption_indices(agent, oppo) # [2nd bid deviation @ (second half)] / [2nd bid deviation @ (first half)]
+                exp_result[agent] = ratios[~np.isnan(ratios)].tolist()
             adaption_result[oppo]=exp_result
         
 
@@ -148,29 +163,11 @@ class SAGEvaluator(object):
         kr_max_div_dict={}
 
         for oppo in opponents:
-            kr_avg_div = {}
-            kr_exps = glob(f"{self.result_dir}/kr_VS_*.json")
-            for exp in kr_exps:
-                m = re.match(f"{self.result_dir}/kr_VS_{oppo}_(\d).json", exp)
-                if not m: continue
-                exp_num = m.groups()[0]
-                with open(exp) as fin:
-                    logs = json.load(fin)
-                    exp_ground = logs["biddings"]
-                    result = logs["logs"]["Alex"]
-                # print(exp_ground)
-                for r in range(0, len(exp_ground["Alex"])):
-                    try:
-                        prediction = result[f'round{r+1}']["prediction"]
-                    except:
-                        continue
-                    if not prediction: continue
-                    round_ground = {p: exp_ground[p][r] for p in exp_ground if p!="Alex" and len(exp_ground[p])>r}
-                    # print(r, prediction, round_ground)
-                    predict_avg = max(prediction.values())
-                    ground_avg = max(round_ground.values())
-                    kr_avg_div.setdefault(r, [])
-                    kr_avg_div[r].append(abs(predict_avg-ground_avg))
+            t = self.stacked()
+            rows = [t["rows"][game] for game in self.catalogue.match(f"kr_VS_{oppo}_*")
+                    if re.match(f"{self.result_dir}/kr_VS_{oppo}_(\d).json", self.catalogue.path(game))]
+            errors = metrics.prediction_error(t["predictions"][rows], t["bids"][rows], reduce=np.nanmax)
+            kr_avg_div = {r: errors[:, r][~np.isnan(errors[:, r])].tolist() for r in range(errors.shape[1]) if not np.isnan(errors[:, r]).all()}
 
             if print_value:
                 print(f"{oppo:7s}",end="\t")
@@ -188,15 +185,12 @@ class SAGEvaluator(object):
         """
         for oppo in opponents:
             kr_avg_div = {}
-            kr_exps = glob(f"{self.result_dir}/pcot_VS_*.json")
-            for exp in kr_exps:
+            for exp, logs in self.load_games(f"pcot_VS_{oppo}_*", "biddings", "message", "status"):
                 m = re.match(f"{self.result_dir}/pcot_VS_{oppo}_(\d).json", exp)
                 if not m: continue
                 exp_num = m.groups()[0]
-                with open(exp) as fin:
-                    logs = json.load(fin)
-                    exp_ground = logs["biddings"]
-                    result = logs["message"]["Alex"]
+                exp_ground = logs["biddings"]
+                result = logs["message"]["Alex"]
                 # print(exp_ground)
                 for i in range(len(result)):
                     content = result[i]["content"]
@@ -342,15 +336,12 @@ class SAGEvaluator(object):
         kr_max_div_dict={}
         for oppo in opponents:
             kr_avg_div = {}
-            kr_exps = glob(f"{self.result_dir}/pcot_VS_*.json")
-            for exp in kr_exps:
+            for exp, logs in self.load_games(f"pcot_VS_{oppo}_*", "biddings", "message", "status"):
                 m = re.match(f"{self.result_dir}/pcot_VS_{oppo}_(\d).json", exp)
                 if not m: continue
                 exp_num = m.groups()[0]
-                with open(exp) as fin:
-                    logs = json.load(fin)
-                    exp_ground = logs["biddings"]
-                    result = logs["message"]["Alex"]
+                exp_ground = logs["biddings"]
+                result = logs["message"]["Alex"]
                 
                 for i in range(len(result)):
                     content = result[i]["content"]
@@ -410,12 +401,31 @@ class SAGEvaluator(object):
             kr_max_div_dict[oppo] = kr_avg_div
 
         return kr_max_div_dict
-        
+
+    def confidence_intervals(self, n_boot=1000, alpha=0.05):
+        """
+        Mean and bootstrap confidence interval over games of the survival round and adaption index of every strategy pair.
+        """
+        print("="*40+f" {1-alpha:.0%} Bootstrap Confidence Intervals "+"="*40)
+        print(f"{'':7s}\t{'':7s}\t{'games':5s}\t{'Survival Round':24s}\t{'Adaption Index':24s}")
+        for agent in self.players:
+            for computer in self.opponents:
+                rates = self.game_survival_rates(agent, computer)
+                if not len(rates): continue
+                cells = []
+                for values in [rates * 10, self.game_adaption_indices(agent, computer)]:
+                    mean, low, high = metrics.bootstrap_ci(values, n_boot, alpha)
+                    cells.append(f"{mean:.2f} [{low:.2f}, {high:.2f}]")
+                print(f"{agent:7s}\t{computer:7s}\t{len(rates):<5d}\t{cells[0]:24s}\t{cells[1]:24s}")
+        print()
+
 
 def main(args):
-    evaluator = SAGEvaluator(args.players, args.opponents, args.result_dir, args.output_dir)
+    evaluator = SAGEvaluator(args.players, args.opponents, args.result_dir, args.output_dir, args.index_workers)
     evaluator.average_survival_round()
     evaluator.adaption_index()
+    if args.bootstrap:
+        evaluator.confidence_intervals(args.bootstrap, args.alpha)
 
     # the calculation of Prediction Accuracy is used only for pcot and kr.
     # evaluator.prediction_accuracy()
@@ -429,6 +439,9 @@ if __name__=="__main__":
     parser.add_argument("--opponents", type=str, default="agent")
     parser.add_argument("--result_dir", type=str, default="result")
     parser.add_argument("--output_dir", type=str, default="output")
+    parser.add_argument('--bootstrap', type=int, default=0, help="bootstrap resamples of the confidence intervals of every strategy pair, 0 to skip")
+    parser.add_argument('--alpha', type=float, default=0.05, help="1 - confidence level of the bootstrap intervals")
+    parser.add_argument("--index_workers", type=int, default=None, help="processes parsing new or changed result files (default: all cores)")
     parser.add_argument('--exp_rnd', type=int, default=10)
     parser.add_argument('--exp_num', type=int, default=10)
 
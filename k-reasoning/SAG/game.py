@@ -1,14 +1,21 @@
 import json
 
+import paths
+from fan_out import fan_out
+from llm_backend import call_tags
+
 class SurvivalAuctionGame():
     # Prompts
     ROUND_NOTICE = "Thank you all for participating in Round {}. In this round, {}.\nTotal water resource supply is {}. According to the principle of the highest bidder and the rule when the game is tied, {} won this auction and obtain water resource. After allocation, all survival residents' information is as follows: \n {}"
 
-    def __init__(self, players) -> None:
+    def __init__(self, players, concurrent_prediction=False) -> None:
         self.players = players[::]
         self.survival_players = players[::]
         self.round_winners = {}
         self.round_status = {}
+        # overlap the start_round (e.g. k-level prediction) of all players
+        self.concurrent_prediction = concurrent_prediction
+        self.log = None # GameLog of the game, see run_multi_round
 
     def _get_salary(self):
         for player in self.survival_players:
@@ -54,10 +61,18 @@ class SurvivalAuctionGame():
 
         for player in self.survival_players:
             player.update_public_info(round_id, history_biddings, player_status)
-            player.start_round(round_id, supply)
+        if self.concurrent_prediction:
+            # start_round only touches the player's own state and the public history
+            fan_out(lambda player: player.start_round(round_id, supply), self.survival_players)
+        else:
+            for player in self.survival_players:
+                player.start_round(round_id, supply)
         
         for player in self.survival_players:
             player.act()
+        if self.log:
+            for player in self.survival_players:
+                self.log.write({"event": "bid", "round": round_id, "player": player.name, "bid": player.last_bidding})
         
         # 3. check winners
         winners = self._check_winner(supply)
@@ -116,11 +131,22 @@ class SurvivalAuctionGame():
         with open(path, 'w') as f:
             json.dump(history, f)
 
-    def run_multi_round(self, n_round, supply_list):
+    def run_multi_round(self, n_round, supply_list, log=None):
+        """
+        Play rounds 1..n_round. With a GameLog every round is logged as it completes, and a game
+        interrupted in an earlier run resumes after its last completed round.
+        """
         assert isinstance(supply_list, list)
         assert n_round == len(supply_list)
 
-        for i in range(1, n_round+1):
-            self.run_single_round(i, supply_list[i-1])
+        self.log = log
+        first_round = log.open(self, self.players, n_round) + 1 if log else 1
+        for i in range(first_round, n_round+1):
             if len(self.survival_players) == 0:
-                break
\ No newline at end of file
+                break
+            with call_tags(round=i):
+                self.run_single_round(i, supply_list[i-1])
+            if log:
+                log.end_round(i, self, self.players)
+        if log:
+            log.close()
\ No newline at end of file
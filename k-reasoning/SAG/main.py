@@ -1,17 +1,28 @@
 import os
 import json
-from openai import OpenAI
 
+import paths
 from player import *
+from llm_backend import (call_summary, call_tags, configure, default_cache, format_call_summary, set_event_sink,
+                         start_run, start_trace, write_chrome_trace)
+from player.reasoning_player import PARSE_STATS
 from game import SurvivalAuctionGame
+from game_log import GameLog
+from result_store import ResultStore
 
-# 创建 DeepSeek API 客户端
-client = OpenAI(
-    api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
-    base_url="https://api.deepseek.com/v1",
-)
+# the players' completions go through the shared client of src/llm_backend.py
 ENGINE = "deepseek-chat"
 
+PLAYER_STRATEGIES = ["agent","cot","pcot","kr","reflect", "persona", "refine", "spp"]
+COMPUTER_STRATEGIES = ["agent","cot","pcot","kr","reflect", "persona", "refine", "spp"]
+
+# Predefined character information
+PERSONA_A = "You are Alex and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
+PERSONA_B = "You are Bob and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
+PERSONA_C = "You are Cindy and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
+PERSONA_D = "You are David and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
+PERSONA_E = "You are Eric and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
+
 
 def build_player(strategy, name, persona):
     """
@@ -33,77 +44,164 @@ def build_player(strategy, name, persona):
     elif strategy=="persona":
         return PersonaAgentPlayer(name, ENGINE, 10, 100, persona)
     elif strategy=="spp":
-        return SPPAgentPlayer(name, 10, ENGINE, 100, persona)
+        return SPPAgentPlayer(name, ENGINE, 10, 100, persona)
     else:
         raise NotImplementedError
 
 
-def main(args):
-    # Predefined character information
-    PERSONA_A = "You are Alex and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
-    PERSONA_B = "You are Bob and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
-    PERSONA_C = "You are Cindy and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
-    PERSONA_D = "You are David and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
-    PERSONA_E = "You are Eric and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
+def get_output_file(args, exp_no):
+    prefix = f"{args.player_strategy}_VS_{args.computer_strategy}_{exp_no}"
+    return f"{args.output_dir}/{prefix}.json"
 
 
-    for exp_no in range(args.start_exp, args.exp_num):
-        players = []
-
-        # build player
-        A = build_player(args.player_strategy, "Alex", PERSONA_A)
-        # Modify PlayerA's settings for ablation experiments.
-        if args.player_engine: A.engine = args.player_engine
-        if args.player_k: A.k_level = args.player_k
-        players.append(A)
-
-        # build opponent
-        for program_name, persona in [("Bob", PERSONA_B), ("Cindy", PERSONA_C), ("David", PERSONA_D), ("Eric", PERSONA_E)]:
-            players.append(build_player(args.computer_strategy, program_name, persona))
-        print("Initial players done.")
-
-        # run multi-round game (default 10)
-        WA = SurvivalAuctionGame(players)
-        WA.run_multi_round(args.max_round, [10]*args.max_round)
-
-        # Export game records
-        prefix = f"{args.player_strategy}_VS_{args.computer_strategy}_{exp_no}"
-        output_file = f"{args.output_dir}/{prefix}.json"
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        with open(output_file,"w") as fout:
-            messages = {}
-            biddings = {}
-            logs = {}
-            for agent in WA.players:
-                if agent.is_agent:
-                     messages[agent.name] = agent.message
-                biddings[agent.name] = agent.biddings
-                if agent.logs:
-                    logs[agent.name] = agent.logs
+def result_exists(args, exp_no):
+    """
+    Whether the game has already been exported in every requested format.
+    """
+    output_file = get_output_file(args, exp_no)
+    game = os.path.basename(output_file)[:-len(".json")]
+    if args.output_format in ["json", "both"] and not os.path.exists(output_file):
+        return False
+    if args.output_format in ["store", "both"] and not ResultStore(args.output_dir).has(game):
+        return False
+    return True
+
+
+def parse_status(status):
+    """
+    "NAME:Alex\tBALANCE:20\tHEALTH POINT:8\tNO_DRINK:1" -> {"NAME": "Alex", "BALANCE": 20, ...}
+    """
+    fields = dict(item.split(":", 1) for item in status.split("\t"))
+    return {key: value if key == "NAME" else json.loads(value) for key, value in fields.items()}
+
 
+def game_tables(WA):
+    """
+    Numeric tables of a finished game: one "rounds" row per player and round played, with the
+    bid and the status after the round's settlement.
+    """
+    rounds = {"player": [], "round": [], "bid": [], "won": [], "balance": [], "hp": [], "no_drink": []}
+    for agent in WA.players:
+        for r, bid in enumerate(agent.biddings, 1):
+            status = parse_status(WA.round_status[r][agent.name])
+            rounds["player"].append(agent.name)
+            rounds["round"].append(r)
+            rounds["bid"].append(bid)
+            rounds["won"].append(agent.name in WA.round_winners[r])
+            rounds["balance"].append(status["BALANCE"])
+            rounds["hp"].append(status["HEALTH POINT"])
+            rounds["no_drink"].append(status["NO_DRINK"])
+    return {"rounds": rounds}
+
+
+def run_experiment(args, exp_no):
+    """
+    Play one game and export its records (a JSON dump, the result store of the output dir or both), returns the output file
+    """
+    # experiment exp_no is its own replicate: own cache entries and mock answers, whichever worker plays it
+    start_run(exp_no)
+    players = []
+
+    # build player
+    A = build_player(args.player_strategy, "Alex", PERSONA_A)
+    # Modify PlayerA's settings for ablation experiments.
+    if args.player_engine: A.engine = args.player_engine
+    if args.player_k: A.k_level = args.player_k
+    players.append(A)
+
+    # build opponent
+    for program_name, persona in [("Bob", PERSONA_B), ("Cindy", PERSONA_C), ("David", PERSONA_D), ("Eric", PERSONA_E)]:
+        players.append(build_player(args.computer_strategy, program_name, persona))
+    print("Initial players done.")
+
+    output_file = get_output_file(args, exp_no)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    # run multi-round game (default 10), logging every completion and round as it happens
+    WA = SurvivalAuctionGame(players, concurrent_prediction=args.concurrent_prediction)
+    log = GameLog(output_file[:-len(".json")] + ".events.jsonl")
+    set_event_sink(log.write)
+    try:
+        with call_tags(game=os.path.basename(output_file)[:-len(".json")]):
+            WA.run_multi_round(args.max_round, [10]*args.max_round, log)
+    finally:
+        set_event_sink(None)
+        log.close(finished=False)
+
+    # Export game records
+    
+    messages = {}
+    biddings = {}
+    logs = {}
+    parse_stats = {}
+    for agent in WA.players:
+        if agent.is_agent:
+             messages[agent.name] = agent.message
+             parse_stats[agent.name] = dict(agent.parse_stats)
+        biddings[agent.name] = agent.biddings
+        if agent.logs:
+            logs[agent.name] = agent.logs
+
+    if args.output_format in ["json", "both"]:
+        with open(output_file,"w") as fout:
             debug_info = {
                 "biddings": biddings,
                 "winner": WA.round_winners,
                 "status": WA.round_status,
                 "message": messages,
-                "logs":logs
+                "logs":logs,
+                "parse_stats": parse_stats
             }
 
             json.dump(debug_info, fout, indent=4)
+    if args.output_format in ["store", "both"]:
+        game = os.path.basename(output_file)[:-len(".json")]
+        meta = {"player_strategy": args.player_strategy, "computer_strategy": args.computer_strategy, "exp_no": exp_no}
+        transcript = {"message": messages, "logs": logs, "parse_stats": parse_stats}
+        ResultStore(args.output_dir).write(game, game_tables(WA), transcript, meta)
+    return output_file
 
-if __name__=="__main__":
+
+def main(args):
+    configure(backend=args.backend, latency=args.mock_latency)
+    if args.trace:
+        start_trace()
+
+    for exp_no in range(args.start_exp, args.exp_num):
+        run_experiment(args, exp_no)
+
+    print("Bid parsing tiers:", dict(PARSE_STATS))
+    cache = default_cache()
+    if cache:
+        print("Response cache:", cache.stats())
+    print("All completions:")
+    print(format_call_summary(call_summary(by=())))
+    print("Completions by strategy and purpose:")
+    print(format_call_summary(call_summary(("strategy", "purpose"))))
+    if args.trace:
+        write_chrome_trace(args.trace)
+        print("Trace written to", args.trace)
+
+def get_parser():
     import argparse
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('--player_strategy', type=str, default="cot", choices=["agent","cot","pcot","kr","reflect","tot", "persona", "refine", "spp"])
-    parser.add_argument('--computer_strategy', type=str,choices=["agent", "fix", "last", "mono", "monorand","cot","pcot","kr","reflect","tot", "persona", "refine", "spp"], default="fix")
+    parser.add_argument('--player_strategy', type=str, default="cot", choices=PLAYER_STRATEGIES)
+    parser.add_argument('--computer_strategy', type=str,choices=COMPUTER_STRATEGIES, default="agent")
     parser.add_argument("--output_dir", type=str, default="result")
+    parser.add_argument("--output_format", type=str, default="json", choices=["json", "store", "both"], help="per-game JSON dumps, a columnar result store in the output dir, or both")
     parser.add_argument('--max_round', type=int, default=10)
     parser.add_argument('--start_exp', type=int, default=0)
     parser.add_argument('--exp_num', type=int, default=10)
     parser.add_argument('--player_engine', type=str, default=None, help="player's OpenAI api engine")
     parser.add_argument('--player_k', type=int, default=None, help="player's k-level (default 2)")
+    parser.add_argument('--concurrent_prediction', action="store_true", help="run the prediction phase of all players in a round concurrently")
+    parser.add_argument('--backend', type=str, default=None, choices=["openai", "mock"], help="completion backend (default: $ALYMPICS_BACKEND or openai)")
+    parser.add_argument('--mock_latency', type=str, default=None, help="latency of the mock backend, e.g. 0, fixed:0.2, uniform:0.1,0.5, lognormal:-1,0.5")
+    parser.add_argument('--trace', type=str, default=None, help="write every completion (player, round, purpose, tokens, latency) to this Chrome trace JSON file")
+    return parser
+
 
-    args = parser.parse_args()
+if __name__=="__main__":
+    args = get_parser().parse_args()
     main(args)
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""
+Puts the modules shared by all games on `sys.path`: src/ (llm_backend, conversation,
+result_store) and k-reasoning/common/ (game_log, catalogue, metrics, bid_parsing, fan_out).
+Import it before them.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SHARED = [os.path.join(ROOT, "src"), os.path.join(ROOT, "k-reasoning", "common")]
+
+for path in SHARED:
+    if path not in sys.path:
+        sys.path.append(path)
@@ -1,2 +1,3 @@
+import paths
 from .reasoning_player import *
 from .k_level_reasoning_player import *
\ No newline at end of file
@@ -1,4 +1,7 @@
 class Player():
+    is_agent = False
+    unlogged_state = ()
+
     def __init__(self, name, water_requirement, daily_salary):
         self.name = name
         self.biddings=[]
@@ -1,14 +1,14 @@
-from openai import OpenAI
-import time
-from copy import deepcopy
 import os
 
+from conversation import Conversation
+from fan_out import fan_out
+from llm_backend import ChatClient, tagged
 from .reasoning_player import AgentPlayer
 
 PERSONA = "You are {name} and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
 
 # 创建 DeepSeek API 客户端
-client = OpenAI(
+client = ChatClient(
     api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
     base_url="https://api.deepseek.com/v1",
 )
@@ -29,9 +29,12 @@ class KLevelReasoningPlayer(AgentPlayer):
     REBID_RESPONSE = "In this round, {biddings}. Due to the detection of leakage issues in today's bids, the bids in this round are invalidated and today's auction will be restarted."
 
 
-    def __init__(self, name, requirement, budget, k_level, initial_health=8, initial_money=0, engine="deepseek-chat"):
-        super().__init__(name, requirement, budget, initial_health, initial_money, engine)
-        self.k_level = k_level
+    # simulated opponent histories are rebuilt from the public history when missing
+    unlogged_state = AgentPlayer.unlogged_state + ("transcripts",)
+
+    def __init__(self, name, engine, water_requirement, daily_salary, persona):
+        super().__init__(name, engine, water_requirement, daily_salary, persona)
+        self.k_level = 2
         self.history_prediction = []
         
         self.bidding_history = {}
@@ -40,6 +43,8 @@ class KLevelReasoningPlayer(AgentPlayer):
         self.history_biddings = {}
         self.opponent_status = {}
         self.round_supply = {}
+        # simulated message history of each opponent, extended by one round per round
+        self.transcripts = {}
         self.round_result = {}
 
     def start_round(self, round, supply):
@@ -57,53 +62,41 @@ class KLevelReasoningPlayer(AgentPlayer):
         self.history_biddings = history_biddings #  {"Alex": [1,2,3]}
         self.opponent_status[round] = player_stauts
 
+    @tagged("predict")
     def predict(self, round):
+        """
+        Predicted bids of the opponents, from levels 0 to k_level-2 of simulated opponents, the
+        opponents of each level simulated concurrently.
+
+        At level k >= 1 every opponent answers the level k-1 predictions of the others. Before the
+        concurrent simulation an opponent also saw the level k predictions of the opponents
+        simulated before it (in player order), so games with k_level >= 3 do not reproduce earlier
+        results; with the default k_level of 2 only level 0 is simulated and nothing changes.
+        """
         def self_act(message):
-            status = 0
-            while status != 1:
-                try:
-                    response = client.chat.completions.create(
-                        model=self.engine,
-                        messages=message,
-                        temperature=0.7,
-                        max_tokens=800,
-                        top_p=0.95,
-                        frequency_penalty=0, 
-                        presence_penalty=0,
-                        stop=None)
-                    response = response.choices[0].message.content
-                    message.append({"role":"assistant","content":response})
-                    status = 1
-                except Exception as e:
-                    print(e)
-                    time.sleep(15)
+            response = client.chat.completions.create(
+                model=self.engine,
+                messages=message.render(),
+                temperature=0.7,
+                max_tokens=800,
+                top_p=0.95,
+                frequency_penalty=0, 
+                presence_penalty=0,
+                stop=None)
+            response = response.choices[0].message.content
+            message.append({"role":"assistant","content":response})
             return self.parse_result(response)
 
-        self_message = deepcopy(self.message)
+        self_message = self.message.fork()
         prediction = {}
         logs = {}
 
         for k in range(self.k_level):
+            last_prediction = dict(prediction)
             for player in self.history_biddings:
                 if player == self.name: continue
                 print(f"Player {self.name} conduct predict {player}")
-                message = [{
-                    "role": "system",
-                    "content": self.PREDICTION_GAME_SETTING.format(name=player)
-                }]
-                for r in range(len(self.history_biddings[player])):
-                    message.append({
-                        "role": "system",
-                        "content": self.PREDICTION_INQUIRY.format(name=player, round=r+1, supply = self.round_supply[r+1], status=self.opponent_status[r+1][player])
-                    })
-                    message.append({
-                        "role": "assistant",
-                        "content": self.PREDICTION_RESPONSE.format(bidding=self.history_biddings[player][r])
-                    })
-                    message.append({
-                        "role": "system",
-                        "content": self.round_result[r+1]
-                    })
+                message = list(self.update_transcript(player)["message"].render())
                 round_id = len(self.history_biddings[player])+1
                 if k==0:
                     # Predict the opponent's next move based on their historical information.
@@ -111,28 +104,24 @@ class KLevelReasoningPlayer(AgentPlayer):
                         "role": "system",
                         "content": self.PREDICTION_INQUIRY.format(name=player, round=round_id, supply = self.round_supply[round_id], status=self.opponent_status[round_id][player])
                     })
-                    next_bidding = self.agent_simulate(message, engine=self.engine)
-                    message.append({
-                        "role": "assistant",
-                        "content": next_bidding
-                    })
                 else:
                     # If k >= 0, make the decision for k based on the prediction result of k-1.
 
-                    prediction_str = ", ".join([f"{oppo} might bid {prediction[oppo]}"  for oppo in prediction if oppo!=player])+". "
+                    prediction_str = ", ".join([f"{oppo} might bid {last_prediction[oppo]}"  for oppo in last_prediction if oppo!=player])+". "
                     message.append({
                         "role": "system",
                         "content": self.INQUIRY_COT.format(name=player, round=round_id, supply = self.round_supply[round_id], prediction=prediction_str, status=self.opponent_status[round_id][player])
                     })
-                    next_bidding = self.agent_simulate(message, engine=self.engine)
-                    message.append({
-                        "role": "assistant",
-                        "content": next_bidding
-                    })
-
-                prediction[player] = self.parse_result(next_bidding)
                 logs[player] = message
 
+            opponents = [player for player in self.history_biddings if player != self.name]
+            for player, next_bidding in zip(opponents, self.simulate_opponents([logs[player] for player in opponents])):
+                logs[player].append({
+                    "role": "assistant",
+                    "content": next_bidding
+                })
+                prediction[player] = self.parse_result(next_bidding, self.opponent_status[round][player])
+
             if k==self.k_level-2: break
             prediction_str = ", ".join([f"{player} might choose {prediction[player]}"  for player in prediction])+". "
             self_message += [{"role":"system","content":self.INQUIRY_COT.format(name=self.name, round=round, supply=self.round_supply[round], prediction=prediction_str, status=self.get_status())}]
@@ -149,21 +138,49 @@ class KLevelReasoningPlayer(AgentPlayer):
         }
         return prediction
     
+    def update_transcript(self, player):
+        """
+        Bring the simulated history of `player` up to date with the rounds played so far.
+        """
+        transcript = self.transcripts.get(player)
+        if transcript is None:
+            transcript = self.transcripts[player] = {
+                "message": Conversation([{"role": "system", "content": self.PREDICTION_GAME_SETTING.format(name=player)}]),
+                "rounds": 0,
+            }
+        for r in range(transcript["rounds"], len(self.history_biddings[player])):
+            transcript["message"].append({
+                "role": "system",
+                "content": self.PREDICTION_INQUIRY.format(name=player, round=r+1, supply = self.round_supply[r+1], status=self.opponent_status[r+1][player])
+            })
+            transcript["message"].append({
+                "role": "assistant",
+                "content": self.PREDICTION_RESPONSE.format(bidding=self.history_biddings[player][r])
+            })
+            transcript["message"].append({
+                "role": "system",
+                "content": self.round_result[r+1]
+            })
+            transcript["message"].close_round(f"Day {r+1}: {player} bid {self.history_biddings[player][r]}; status before bidding: {self.opponent_status[r+1][player]}")
+        transcript["rounds"] = len(self.history_biddings[player])
+        return transcript
+
+    def simulate_opponents(self, messages):
+        """
+        Run `agent_simulate` on every opponent transcript concurrently, the answers keep the order of `messages`.
+        """
+        return fan_out(lambda message: self.agent_simulate(message, engine=self.engine), messages)
+
     # @staticmethod
+    @tagged("predict")
     def agent_simulate(self, message, engine):
-        while 1:
-            try:
-                response = client.chat.completions.create(
-                    model=engine,
-                    messages=message,
-                    temperature=0.7,
-                    max_tokens=80,
-                    top_p=0.9,
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    stop=None)
-                RESPONSE = response.choices[0].message.content
-                return RESPONSE
-            except Exception as e:
-                print(e)
-                time.sleep(15)
\ No newline at end of file
+        response = client.chat.completions.create(
+            model=engine,
+            messages=message,
+            temperature=0.7,
+            max_tokens=80,
+            top_p=0.9,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None)
+        return response.choices[0].message.content
\ No newline at end of file
@@ -1,81 +1,101 @@
-from openai import OpenAI
-import time
+import re
 import os
+from collections import Counter
 
 from .basic_player import Player
+from bid_parsing import extract_number
+from conversation import Conversation
+from llm_backend import ChatClient, call_tags, emit_event, tagged
 
 PERSONA = "You are {name} and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 10 days by acquiring the water resources. "
 
 # 创建 DeepSeek API 客户端
-client = OpenAI(
+client = ChatClient(
     api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
     base_url="https://api.deepseek.com/v1",
 )
 
+BALANCE = re.compile(r"BALANCE:\s*(-?\d+)")
+
+# Which tier resolved each parsed number during this run.
+PARSE_STATS = Counter()
+
+
 class AgentPlayer(Player):
+    is_agent = True
+    GAME_SETTING = ("SURVIVE CHALLENGE!!! You are one of five residents of W-Town, and every day the town's whole water supply is auctioned among the surviving residents. "
+                    "Every day, each resident receives a fixed salary, which is added to their balance. Then each resident submits a bid for the day's water. "
+                    "The resident with the highest bid wins the water and pays the bid from their balance, but a bid higher than the bidder's balance is invalid. "
+                    "If two or more residents make the same highest bid, nobody gets water that day. "
+                    "Every resident starts with 8 HP and a balance of 0. Drinking the water restores 2 HP (up to 10 HP). "
+                    "A resident who does not get water loses HP: 1 point on the first day without water, 2 points on the second consecutive day, and so on. "
+                    "Once a resident's HP reaches 0, they are eliminated from the challenge. ")
     INQUIRY = ("Hello, {name}! Today is the Day {round} of the Water Allocation Challenge, with a quantity of {supply} units."
                " Your status:\n{status}\nPlease carefully analyze your situation to decide on this round of bidding."
                " Remember, the most important thing is to SURVIVE!! Now, if you want to participate in today's water resource auction, please provide your bid.")
     
-    def __init__(self, name, requirement, budget, initial_health=8, initial_money=0, engine="deepseek-chat"):
-        super().__init__(name, requirement, budget, initial_health, initial_money)
+    def __init__(self, name, engine, water_requirement, daily_salary, persona):
+        super().__init__(name, water_requirement, daily_salary)
         self.engine = engine
-        self.message = [{"role":"system","content":PERSONA.format(name=name)}]
-        self.biddings = []
+        self.persona = persona
+        self.message = Conversation([{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}])
+        self.parse_stats = Counter()
 
+    @tagged("bid")
     def act(self):
         print(f"Player {self.name} conduct bidding")
-        status = 0
-        while status != 1:
-            try:
-                response = client.chat.completions.create(
-                    model=self.engine,
-                    messages=self.message,
-                    temperature=0.7,
-                    max_tokens=800,
-                    top_p=0.95,
-                    frequency_penalty=0, 
-                    presence_penalty=0,
-                    stop=None)
-                response = response.choices[0].message.content
-                self.message.append({"role":"assistant","content":response})
-                status = 1
-            except Exception as e:
-                print(e)
-                time.sleep(15)
+        response = client.chat.completions.create(
+            model=self.engine,
+            messages=self.message.render(),
+            temperature=0.7,
+            max_tokens=800,
+            top_p=0.95,
+            frequency_penalty=0, 
+            presence_penalty=0,
+            stop=None)
+        response = response.choices[0].message.content
+        self.message.append({"role":"assistant","content":response})
         self.biddings.append(self.parse_result(response))
         return self.last_bidding
 
-    def parse_result(self, message):
-        status = 0
-        times = 0
-        error_times = 0
-        while status != 1:
-            try:
-                response = client.chat.completions.create(
-                    model=self.engine,
-                    messages=[{"role":"system", "content":"By reading the conversation, extract the number chosen by player. Output format: number. If the player does not bid, Output: 0."}, {"role": "user", "content": message}],
-                    temperature=0.7,
-                    max_tokens=8,
-                    top_p=0.95,
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    stop=None)
-                response = response.choices[0].message.content
-                assert response.isnumeric()
-                return int(response)
-            except AssertionError as e:
-                print("Result Parsing Error: ",message)
-                times+=1
-                if times>=3:
-                    exit()
-            except Exception as e:
-                print(e)
-                time.sleep(15)
-                error_times+=1
-                if error_times>=5:
-                    exit()
+    def parse_result(self, message, status=None):
+        """
+        Read the bid from a response of the player whose status line is `status` (default: this
+        player's). Regex tiers first, but only for bids between 0 and the bidder's balance; any other
+        number, or a lone number on the last line, is read by the model instead. An answer the model
+        cannot read either counts as not bidding (0), and is logged as a "parse_fallback" event.
+        """
+        balance = self.balance if status is None else int(BALANCE.search(status).group(1))
+        tier, bidding = extract_number(message, 0, balance)
+        if tier in [None, "last_number"]:
+            tier, bidding = "llm", self.llm_parse_result(message)
+        if bidding is None:
+            tier, bidding = "fallback", 0
+            print(f"Result Parsing Error: {self.name} does not bid")
+            emit_event({"event": "parse_fallback", "player": self.name, "response": message, "bid": bidding})
+        self.parse_stats[tier] += 1
+        PARSE_STATS[tier] += 1
+        return bidding
 
+    @tagged("parse")
+    def llm_parse_result(self, message):
+        """
+        Ask the model to extract the number, None after three unreadable answers.
+        """
+        for times in range(3):
+            response = client.chat.completions.create(
+                model=self.engine,
+                messages=[{"role":"system", "content":"By reading the conversation, extract the number chosen by player. Output format: number. If the player does not bid, Output: 0."}, {"role": "user", "content": message}],
+                temperature=0.7,
+                max_tokens=8,
+                top_p=0.95,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stop=None)
+            response = response.choices[0].message.content
+            if response.isnumeric():
+                return int(response)
+            print("Result Parsing Error: ",message)
         return None
     
     def start_round(self, round, supply):
@@ -94,6 +114,7 @@ class AgentPlayer(Player):
                 return f"WARNING: You have lost {reduced_hp} point of HP in this round! You now have only {self.hp} points of health left. You are one step closer to death.  "
             return "You have successfully won the bidding for today's water resources and restored 2 points of HP."
         self.message += [{"role":"system","content": add_warning()}]
+        self.message.close_round(f"Day {round}: {bidding_details}; you {'won' if win else 'did not win'} the water; {self.get_status()}")
     
     def message_update_result(self, bidding_info):
         self.message += [{"role":"system","content":bidding_info}]
@@ -102,23 +123,16 @@ class AgentPlayer(Player):
         self.message += [{"role":"system","content":info}]
 
     def conduct_inquiry(self, inquiry):
-        while 1:
-            try:
-                response = client.chat.completions.create(
-                    model=self.engine,
-                    messages=self.message + [{"role":"system","content":inquiry}],
-                    temperature=0.7,
-                    max_tokens=800,
-                    top_p=0.9,
-                    frequency_penalty=0,
-                    presence_penalty=0,
-                    stop=None)
-
-                RESPONSE = response.choices[0].message.content
-                return RESPONSE
-            except Exception as e:
-                print(e)
-                time.sleep(15)
+        response = client.chat.completions.create(
+            model=self.engine,
+            messages=self.message.request({"role":"system","content":inquiry}),
+            temperature=0.7,
+            max_tokens=800,
+            top_p=0.9,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None)
+        return response.choices[0].message.content
 
 
 
@@ -133,7 +147,7 @@ class PersonaAgentPlayer(AgentPlayer):
     def __init__(self, name, engine, water_requirement, daily_salary, persona):
         super().__init__(name, engine, water_requirement, daily_salary, persona)
         self.persona = self.MATH_EXPERT_PERSONA.format(name=name)
-        self.message = [{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}]
+        self.message = Conversation([{"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}])
 
     def start_round(self, round, supply):
         self.message += [{"role":"system","content":self.INQUIRY_PERSONA.format(name=self.name, round=round, supply=supply, status=self.get_status())}]
@@ -173,15 +187,13 @@ Final answer: 6 * (1 + 1) + 12 = 24
     
     PERSONA = "You are {name} and involved in a survive challenge."
     
-    def __init__(self, name, water_requirement, daily_salary, persona):
-        super().__init__(name, water_requirement, daily_salary, persona)
-        # self.persona = self.PERSONA.format(name=name)
-        self.persona = persona
-        self.message = [{"role":"system","content": self.SPP_EXAMPLE.format(name=self.name)},
-                        {"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}]
+    def __init__(self, name, engine, water_requirement, daily_salary, persona):
+        super().__init__(name, engine, water_requirement, daily_salary, persona)
+        self.message = Conversation([{"role":"system","content": self.SPP_EXAMPLE.format(name=self.name)},
+                                     {"role":"system","content": self.persona + self.GAME_SETTING.format(NAME=self.name)}])
 
     def start_round(self, round, supply):
-        self.message += [{"role":"system","content":self.INQUIRY.format(name=self.name, round=round, supply=supply, status=self.get_status())}]
+        self.message += [{"role":"system","content":self.INQUIRY_SPP.format(name=self.name, round=round, supply=supply, status=self.get_status())}]
 
 class CoTAgentPlayer(AgentPlayer):
     INQUIRY_COT = ("Hello, {name}! Today is the Day {round} of the Water Allocation Challenge, with a quantity of {supply} units."
@@ -234,60 +246,53 @@ class ReflectionAgentPlayer(AgentPlayer):
         super().notice_round_result(round, bidding_info, win, bidding_details)
         self.reflect()
 
+    @tagged("reflect")
     def reflect(self):
         print(f"Player {self.name} conduct reflect")
         self.message += [{"role":"system","content": self.REFLECT_INQUIRY}, {"role":"assistant","content":self.conduct_inquiry(self.REFLECT_INQUIRY)}]  
 
 class SelfRefinePlayer(AgentPlayer):
-    def __init__(self, name, requirement, budget, initial_health=8, initial_money=0, engine="deepseek-chat"):
-        super().__init__(name, requirement, budget, initial_health, initial_money, engine)
-    
+    INQUIRY_COT = CoTAgentPlayer.INQUIRY_COT
+
+    FEEDBACK_PROMPT = ("Carefully study the player's bidding strategy in this round of the game. As a game expert, can you give a suggestion to optimize the player's strategy so that he can improve his chance of survival?")
+    REFINE_PROMPT = ("I have a game expert's advice on your strategy in this round."
+                     "You can adjust your strategy just now according to his suggestion. Here are his suggestions:"
+                     "{feedback}")
+
+    def __init__(self, name, engine, water_requirement, daily_salary, persona, refine_times = 2):
+        super().__init__(name, engine, water_requirement, daily_salary, persona)
+
+        self.refine_times = refine_times
+
     def start_round(self, round, supply):
         self.cur_round = round
         self.cur_supply = supply
     
+    @tagged("bid")
     def act(self):
         print(f"Player {self.name} conduct bidding")
         def completion(message):
-            status = 0
-            while status != 1:
-                try:
-                    response = client.chat.completions.create(
-                        model=self.engine,
-                        messages=message,
-                        temperature=0.7,
-                        max_tokens=800,
-                        top_p=0.95,
-                        frequency_penalty=0,
-                        presence_penalty=0,
-                        stop=None)
-                    response = response.choices[0].message.content
-                    status = 1
-                except Exception as e:
-                    print(e)
-                    time.sleep(15)
-            return response
+            response = client.chat.completions.create(
+                model=self.engine,
+                messages=message,
+                temperature=0.7,
+                max_tokens=800,
+                top_p=0.95,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stop=None)
+            return response.choices[0].message.content
         
         for t in range(self.refine_times):
             if t==0:
                 self.message.append({"role":"system","content":self.INQUIRY_COT.format(name=self.name, round=self.cur_round, supply=self.cur_supply, status=self.get_status())})
             else:
-                refine_message = []
-                for m in self.message:
-                    if m["role"]=="system":
-                        refine_message.append(m)
-                    else:
-                        refine_message.append({
-                            "role": "user",
-                            "content": m["content"]
-                        })
-                refine_message.append({
-                        "role": "system",
-                        "content": self.FEEDBACK_PROMPT
-                    })
-                feedback = completion(refine_message)
+                # Ask for feedback on the conversation as it is (no re-roled copy), so the request extends the cached prompt prefix.
+                with call_tags(purpose="feedback"):
+                    feedback = completion(self.message.request({"role":"system","content":self.FEEDBACK_PROMPT}))
                 self.message.append({"role":"system","content": self.REFINE_PROMPT.format(feedback=feedback)})
-            self.message.append({"role":"assistant","content": completion(self.message)})
+            with call_tags(purpose="bid" if t==0 else "refine"):
+                self.message.append({"role":"assistant","content": completion(self.message.render())})
         
         self.biddings.append(self.parse_result(self.message[-1]["content"]))
         return self.last_bidding
\ No newline at end of file
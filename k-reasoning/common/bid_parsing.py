@@ -0,0 +1,61 @@
+"""
+Regex tiers that read a bid or chosen number from a player's response before the model is asked
+to extract it.
+
+Shared by G08A and SAG, whose `paths.py` puts k-reasoning/common/ on `sys.path`. Each game passes
+its own bounds: G08A the range of the game (1-100), SAG the bidder's balance.
+
+    tier, number = extract_number(response, 0, balance)   # (None, None) when ambiguous
+"""
+import re
+
+# The "Answer:" / "Final answer:" line the prompts ask for, captured up to the end of the line
+# (or the next line when the answer starts one). Only a lone number or the result after the last
+# "=" is read from it; "Final answer: 45 * 0.8" is left to the model.
+ANSWER_LINE = re.compile(r"\b(?:final answer(?:\s+is)?\s*[:：]?|answer\s*[:：])[ \t]*\n?[ \t]*([^\n]*)", re.IGNORECASE)
+# Patterns tried after the answer line, before asking the model to extract the number: a stated
+# choice or bid. Hypotheticals ("If I choose 30 ...", "I would choose 25") are not choices.
+BID_PATTERNS = [
+    ("choose", re.compile(r"(?<!\bif )\bI(?:'ll| will)? (?:choose|pick|select|go with)\s*(?:the number\s*)?[*\s]*(\d+(?:\.\d+)?)", re.IGNORECASE)),
+    ("bid", re.compile(r"(?<!\bif I )(?<!\bwould )\bbid(?:ding)?(?: price)?\s*(?:of|is|at|:)?\s*[*\s]*\$?\s*(\d+(?:\.\d+)?)", re.IGNORECASE)),
+]
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+LONE_NUMBER = re.compile(r"[*\s]*\$?\s*(\d+(?:\.\d+)?)[*\s]*[.!]?[*\s]*")
+
+
+def extract_number(text, low, high):
+    """
+    Regex fast path of `AgentPlayer.parse_result`, for numbers between `low` and `high`.
+    Returns (tier, number), or (None, None) when the text is ambiguous.
+    """
+    answers = ANSWER_LINE.findall(text)
+    if answers:
+        lone = LONE_NUMBER.fullmatch(answers[-1].rsplit("=", 1)[-1])
+        number = lone and as_integer(lone.group(1))
+        if number is not None and low <= number <= high:
+            return "answer", number
+        return None, None
+    for tier, pattern in BID_PATTERNS:
+        matches = pattern.findall(text)
+        if matches:
+            number = as_integer(matches[-1])
+            if number is None:
+                return None, None
+            if low <= number <= high:
+                return tier, number
+    # a closing line that mentions exactly one number in range, e.g. "**42**"
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    if lines:
+        numbers = {float(n) for n in NUMBER.findall(lines[-1])}
+        numbers = [n for n in numbers if low <= n <= high]
+        if len(numbers) == 1 and numbers[0].is_integer():
+            return "last_number", int(numbers[0])
+    return None, None
+
+
+def as_integer(number):
+    """
+    The integer written as `number` ("36", "36.0"), None for a fraction such as "38.5".
+    """
+    value = float(number)
+    return int(value) if value.is_integer() else None
@@ -0,0 +1,206 @@
+"""
+Index of the games in a result folder, shared by all evaluator metrics.
+
+Shared by G08A and SAG, whose `paths.py` puts k-reasoning/common/ on `sys.path`.
+
+The folder is scanned once: every game (a per-game JSON dump or a game of the result store in
+the folder) is parsed once, in parallel, and its small fields are kept in memory under the key
+(player strategy, opponent, exp_no). The index is saved to `<result_dir>/.catalogue.json`; the
+next run only re-parses games whose file changed (mtime or size) and drops deleted ones. Fields
+that are not indexed (e.g. the long "message" transcripts) are read from the game on demand.
+
+    catalogue = Catalogue("result", ["winners", "biddings"])
+    for game in catalogue.match("kr_VS_agent*"):
+        record = catalogue.get(game, "winners")
+"""
+import fnmatch
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+from result_store import ResultStore
+
+INDEX_FILE = ".catalogue.json"
+VERSION = 1
+TRANSCRIPT_FIELDS = ["message", "logs", "parse_stats"]
+GAME_NAME = re.compile(r"^(?P<player>.+?)_VS_(?P<opponent>.+)_(?P<exp_no>\d+)$")
+PARALLEL_MIN = 16 # fewer stale games are parsed in this process
+
+
+def parse_name(game):
+    """
+    "kr_VS_fix-40-5_3" -> ("kr", "fix-40-5", 3), None for names that are not games.
+    """
+    m = GAME_NAME.match(game)
+    if not m:
+        return None
+    return m.group("player"), m.group("opponent"), int(m.group("exp_no"))
+
+
+def store_record(store, game, fields):
+    """
+    Rebuild the requested fields of a game of the result store in the layout of the JSON dumps.
+    """
+    record = {}
+    if "biddings" in fields:
+        rows = store.read("rounds", ["player", "bid"], [game])
+        record["biddings"] = {}
+        for player, bid in zip(rows["player"].tolist(), rows["bid"].tolist()):
+            record["biddings"].setdefault(player, []).append(bid)
+    for field in ["winners", "winner"]: # G08A and SAG name the round winners differently
+        if field not in fields:
+            continue
+        rows = store.read("rounds", ["player", "round", "won"], [game])
+        record[field] = {}
+        for rnd, player, won in sorted(zip(rows["round"].tolist(), rows["player"].tolist(), rows["won"].tolist()), key=lambda row: row[0]):
+            record[field].setdefault(str(rnd), [])
+            if won: record[field][str(rnd)].append(player)
+    if "status" in fields:
+        rows = store.read("rounds", ["player", "round", "balance", "hp", "no_drink"], [game])
+        record["status"] = {}
+        columns = [rows[column].tolist() for column in ["round", "player", "balance", "hp", "no_drink"]]
+        for rnd, player, balance, hp, no_drink in sorted(zip(*columns), key=lambda row: row[0]):
+            record["status"].setdefault(str(rnd), {})
+            record["status"][str(rnd)][player] = f"NAME:{player}\tBALANCE:{balance}\tHEALTH POINT:{hp}\tNO_DRINK:{no_drink}"
+    transcript_fields = [field for field in fields if field in TRANSCRIPT_FIELDS]
+    if transcript_fields:
+        transcript = store.transcript(game)
+        for field in transcript_fields:
+            record[field] = transcript[field]
+    return record
+
+
+def load_record(result_dir, source, game, fields):
+    """
+    Requested fields of one game, from its JSON dump or from the result store.
+    """
+    if source == "store":
+        return store_record(ResultStore(result_dir), game, fields)
+    with open(os.path.join(result_dir, f"{game}.json")) as fin:
+        record = json.load(fin)
+    return {field: record[field] for field in fields if field in record}
+
+
+def _load_job(job):
+    return load_record(*job)
+
+
+class Catalogue:
+    def __init__(self, result_dir, fields, workers=None):
+        """
+        `fields` are kept in memory for every game, `workers` processes parse changed games (default: all cores).
+        """
+        self.result_dir = result_dir
+        self.fields = list(fields)
+        self.workers = workers or os.cpu_count()
+        self.entries = {} # game -> {"source", "stamp", "key", "record"}
+        self._load_index()
+        self.refresh()
+
+    @property
+    def index_file(self):
+        return os.path.join(self.result_dir, INDEX_FILE)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file) as fin:
+                index = json.load(fin)
+        except (OSError, ValueError):
+            return
+        if index.get("version") == VERSION and set(self.fields) <= set(index.get("fields", [])):
+            self.entries = index["entries"]
+            for entry in self.entries.values():
+                entry["record"] = {field: entry["record"][field] for field in self.fields if field in entry["record"]}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_file}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as fout:
+            json.dump({"version": VERSION, "fields": self.fields, "entries": self.entries}, fout)
+        os.replace(tmp_path, self.index_file)
+
+    def _sources(self):
+        """
+        game -> (source, stamp) of every game in the folder. A game in both formats is read from the store.
+        """
+        sources = {}
+        for path in glob(os.path.join(self.result_dir, "*.json")):
+            game = os.path.basename(path)[:-len(".json")]
+            if parse_name(game):
+                stat = os.stat(path)
+                sources[game] = ("json", [stat.st_mtime_ns, stat.st_size])
+        if ResultStore.exists(self.result_dir):
+            store = ResultStore(self.result_dir)
+            for game in store.games():
+                if parse_name(game):
+                    stat = os.stat(os.path.join(self.result_dir, "games", f"{game}.json"))
+                    sources[game] = ("store", [stat.st_mtime_ns, stat.st_size])
+        return sources
+
+    def refresh(self):
+        """
+        Re-index the games added or changed since the last scan, forget deleted ones. Returns the number of parsed games.
+        """
+        if not os.path.isdir(self.result_dir):
+            self.entries = {}
+            return 0
+        sources = self._sources()
+        removed = [game for game in self.entries if game not in sources]
+        for game in removed:
+            del self.entries[game]
+        stale = [game for game, (source, stamp) in sources.items()
+                 if game not in self.entries or [self.entries[game]["source"], self.entries[game]["stamp"]] != [source, stamp]]
+
+        jobs = [(self.result_dir, sources[game][0], game, self.fields) for game in stale]
+        if len(jobs) >= PARALLEL_MIN and self.workers > 1:
+            with ProcessPoolExecutor(self.workers) as pool:
+                records = list(pool.map(_load_job, jobs, chunksize=max(1, len(jobs) // (4 * self.workers))))
+        else:
+            records = [_load_job(job) for job in jobs]
+        for game, record in zip(stale, records):
+            source, stamp = sources[game]
+            self.entries[game] = {"source": source, "stamp": stamp, "key": list(parse_name(game)), "record": record}
+
+        if stale or removed:
+            try:
+                self._save_index()
+            except OSError:
+                pass # read-only result folder: keep the index in memory only
+        return len(stale)
+
+    def match(self, pattern="*"):
+        """
+        Games whose name matches the glob `pattern`, e.g. "kr_VS_agent*", sorted.
+        """
+        return sorted(fnmatch.filter(self.entries, pattern))
+
+    def select(self, player=None, opponent=None, exp_no=None):
+        """
+        Games with the given (player strategy, opponent, exp_no) key parts, None matches anything.
+        """
+        wanted = [player, opponent, exp_no]
+        return sorted(game for game, entry in self.entries.items()
+                      if all(want is None or want == part for want, part in zip(wanted, entry["key"])))
+
+    def key(self, game):
+        return tuple(self.entries[game]["key"])
+
+    def path(self, game):
+        """
+        Result file of a game as the JSON dumps name it (also for games of the result store).
+        """
+        return f"{self.result_dir}/{game}.json"
+
+    def get(self, game, *fields):
+        """
+        The requested fields of a game, indexed ones from memory, the others from the game's source.
+        """
+        entry = self.entries[game]
+        record = {field: entry["record"][field] for field in fields if field in entry["record"]}
+        missing = [field for field in fields if field not in record]
+        if missing:
+            record.update(load_record(self.result_dir, entry["source"], game, missing))
+        return record
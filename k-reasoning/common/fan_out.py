@@ -0,0 +1,24 @@
+"""
+Concurrent fan-out of the completion calls of one game step.
+
+Shared by G08A and SAG, whose `paths.py` puts k-reasoning/common/ on `sys.path`.
+
+One thread per item, each running with the caller's call tags, event sink and run (see
+`carry_tags`), the results in the order of the items:
+
+    answers = fan_out(lambda message: player.agent_simulate(message, engine), messages)
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_backend import carry_tags
+
+
+def fan_out(fn, items):
+    """
+    [fn(item) for item in items], called concurrently when there is more than one item.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(carry_tags(fn), items))
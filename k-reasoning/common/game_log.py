@@ -0,0 +1,232 @@
+"""
+Append-only JSONL event log of one game, and resuming a game from it.
+
+Shared by G08A and SAG, whose `paths.py` puts k-reasoning/common/ on `sys.path`, and by
+src/waterAllocation.py.
+
+Every event is one JSON line, flushed as soon as it happens:
+
+    {"event": "start", "roster": [["Alex", "KLevelReasoningPlayer"], ...], "max_round": 10, "game": {...}, "players": {...}}
+    {"event": "completion", "model": ..., "prompt": <last message>, "response": ..., "cached": false}
+    {"event": "bid", "round": 3, "player": "Bob", "bid": 42}
+    {"event": "parse_fallback", "player": "Bob", "response": ..., "bid": 0}
+    {"event": "round", "round": 3, "game": {...}, "players": {"Alex": {...}, ...}, "survivors": [...]}
+    {"event": "end"}
+
+A "round" event holds what changed in the game and in every player during the round (messages
+appended to a conversation, bids appended to a list, keys of a dict that changed, other
+JSON-serialisable attributes that were reassigned). When a game is interrupted (a crash, an
+exhausted retry budget, a killed worker), replaying these deltas rebuilds biddings, hp,
+balance, messages, winners etc. as they were after the last completed round, and the game goes
+on from the next one. Completions of the interrupted round stay in the log for inspection; with
+a response cache (ALYMPICS_CACHE) re-asking them costs nothing.
+
+Attributes listed in a class's `unlogged_state` (caches the player rebuilds on its own, shared
+references to game state) are not logged.
+"""
+import json
+import os
+import threading
+
+from conversation import Conversation
+
+
+def _encode(value):
+    """
+    JSON text of `value`, None when it is not serialisable (clients, locks, player objects, ...).
+    """
+    try:
+        return json.dumps(value, default=_numpy_scalar)
+    except (TypeError, ValueError):
+        return None
+
+
+def _numpy_scalar(value):
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(type(value).__name__)
+
+
+class GameLog:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._seen = {} # id(object) -> {attribute: what was logged last}
+
+    # ---------------------------------------------------------------- writing
+
+    def write(self, event):
+        line = json.dumps(event, default=_numpy_scalar) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self, finished=True):
+        if self._file is None:
+            return
+        if finished:
+            self.write({"event": "end"})
+        self._file.close()
+        self._file = None
+
+    def _delta(self, obj):
+        """
+        Changes of the logged attributes of `obj` since the previous call.
+        """
+        seen = self._seen.setdefault(id(obj), {})
+        skip = set(getattr(obj, "unlogged_state", ()))
+        delta = {}
+        for name, value in vars(obj).items():
+            if name in skip or name.startswith("_"):
+                continue
+            last = seen.get(name)
+            if isinstance(value, Conversation):
+                rounds = [list(r) for r in value.rounds]
+                state = ["conversation", len(value), len(rounds), value.head, value.compacted]
+                if last and last[0] == "conversation" and last[1] <= len(value) and last[2] <= len(rounds):
+                    if last != state:
+                        delta[name] = {"append": value[last[1]:], "rounds": rounds[last[2]:], "head": value.head, "compacted": value.compacted}
+                else:
+                    delta[name] = {"conversation": list(value), "rounds": rounds, "head": value.head, "compacted": value.compacted}
+                seen[name] = state
+            elif isinstance(value, dict):
+                encoded = {}
+                for key, item in value.items():
+                    text = _encode(item)
+                    if text is None or _encode(key) is None:
+                        encoded = None
+                        break
+                    encoded[_encode(key)] = text
+                if encoded is None:
+                    continue
+                if last and last[0] == "dict":
+                    update = [[json.loads(key), json.loads(text)] for key, text in encoded.items() if last[1].get(key) != text]
+                    remove = [json.loads(key) for key in last[1] if key not in encoded]
+                    if update or remove:
+                        delta[name] = {"update": update, "remove": remove}
+                else:
+                    delta[name] = {"update": [[json.loads(key), json.loads(text)] for key, text in encoded.items()], "remove": [], "clear": True}
+                seen[name] = ["dict", encoded]
+            elif isinstance(value, list):
+                text = _encode(value)
+                if text is None:
+                    continue
+                if last and last[0] == "list" and len(value) >= last[1] and _encode(value[:last[1]]) == last[2]:
+                    if len(value) > last[1]:
+                        delta[name] = {"append": json.loads(_encode(value[last[1]:]))}
+                elif not last or last[2] != text:
+                    delta[name] = {"set": json.loads(text)}
+                seen[name] = ["list", len(value), text]
+            else:
+                text = _encode(value)
+                if text is None:
+                    continue
+                if not last or last[1] != text:
+                    delta[name] = {"set": json.loads(text)}
+                seen[name] = ["value", text]
+        return delta
+
+    def end_round(self, round_id, game, players):
+        """
+        Log the state changes of `game` and `players` during round `round_id`.
+        """
+        self.write({
+            "event": "round",
+            "round": round_id,
+            "game": self._delta(game),
+            "players": {player.name: self._delta(player) for player in players},
+            "survivors": [player.name for player in game.survival_players],
+        })
+
+    # ---------------------------------------------------------------- resuming
+
+    @staticmethod
+    def _apply(obj, delta):
+        for name, change in delta.items():
+            current = getattr(obj, name, None)
+            if "conversation" in change or (isinstance(current, Conversation) and "append" in change):
+                if "conversation" in change:
+                    messages, rounds = change["conversation"], change["rounds"]
+                else:
+                    messages, rounds = list(current) + change["append"], [list(r) for r in current.rounds] + change["rounds"]
+                conversation = Conversation(messages, current.budget if isinstance(current, Conversation) else None,
+                                            current.keep_rounds if isinstance(current, Conversation) else 2)
+                conversation.head = change["head"]
+                conversation.rounds = [tuple(r) for r in rounds]
+                conversation.compacted = change["compacted"]
+                setattr(obj, name, conversation)
+            elif "update" in change:
+                if not isinstance(current, dict):
+                    current = {}
+                    setattr(obj, name, current)
+                if change.get("clear"):
+                    current.clear()
+                for key in change["remove"]:
+                    current.pop(key, None)
+                for key, item in change["update"]:
+                    current[key] = item
+            elif "append" in change:
+                current.extend(change["append"])
+            elif isinstance(current, list) and isinstance(change["set"], list):
+                current[:] = change["set"]
+            else:
+                setattr(obj, name, change["set"])
+
+    def _read(self):
+        """
+        Events of an existing log and the byte offset after the last complete line.
+        """
+        events, offset = [], 0
+        if not os.path.exists(self.path):
+            return events, offset
+        with open(self.path, "rb") as fin:
+            for line in fin:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    break # torn last line of a crashed write
+                if not line.endswith(b"\n"):
+                    events.pop()
+                    break
+                offset += len(line)
+        return events, offset
+
+    def open(self, game, players, max_round):
+        """
+        Start logging `game`. Returns the last round completed by an earlier, interrupted run of
+        the same game, whose state has then been restored into `game` and `players`, or 0.
+        """
+        header = {"event": "start", "roster": [[player.name, type(player).__name__] for player in players], "max_round": max_round}
+        events, offset = self._read()
+        resumable = bool(events) and events[0].get("roster") == header["roster"] and events[-1]["event"] != "end"
+
+        completed = 0
+        if resumable:
+            by_name = {player.name: player for player in players}
+            for event in events:
+                if event["event"] not in ["start", "round"]:
+                    continue
+                self._apply(game, event["game"])
+                for name, delta in event["players"].items():
+                    self._apply(by_name[name], delta)
+                game.survival_players = [by_name[name] for name in event["survivors"]]
+                completed = event.get("round", 0)
+            with open(self.path, "r+b") as fout:
+                fout.truncate(offset)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a" if resumable else "w", encoding="utf-8")
+        # the start event holds the whole initial state (e.g. random opponent parameters),
+        # every later delta is relative to it or to the restored state
+        state = {
+            "game": self._delta(game),
+            "players": {player.name: self._delta(player) for player in players},
+            "survivors": [player.name for player in game.survival_players],
+        }
+        if not resumable:
+            self.write({**header, **state})
+        if completed:
+            print(f"Resuming {self.path} after round {completed}")
+        return completed
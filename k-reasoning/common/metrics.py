@@ -0,0 +1,171 @@
+"""
+NumPy kernels of the evaluation metrics.
+
+Shared by G08A and SAG, whose `paths.py` puts k-reasoning/common/ on `sys.path`.
+
+The games of a result folder are stacked once into (games x players x rounds) arrays in which a
+missing value (an eliminated player, a shorter game, a round without prediction) is NaN or False.
+Every metric is then a few array operations over all games at once, and the evaluators only pick
+the rows (games) of each strategy pair.
+
+    bids = stack(records, "biddings")                   # (games, 5, rounds)
+    ratios = target_deviation_ratio(bids[rows])         # G08A adaption index of every game
+    mean, low, high = bootstrap_ci(ratios)
+"""
+import warnings
+
+import numpy as np
+
+PLAYER_NAMES = ["Alex", "Bob", "Cindy", "David", "Eric"]
+
+
+def _rounds(records, field):
+    return max([len(values) for record in records for values in record[field].values()] or [0])
+
+
+def stack(records, field="biddings", names=PLAYER_NAMES):
+    """
+    (games x players x rounds) float array of a per-player list field, NaN where a player has no value.
+    """
+    values = np.full((len(records), len(names), _rounds(records, field)), np.nan)
+    for g, record in enumerate(records):
+        for p, name in enumerate(names):
+            row = record[field].get(name, [])
+            values[g, p, :len(row)] = row
+    return values
+
+
+def stack_winners(records, field="winners", names=PLAYER_NAMES):
+    """
+    (games x players x rounds) bool array of the round winners and the number of rounds of every game.
+    """
+    n_rounds = np.array([len(record[field]) for record in records], dtype=int)
+    won = np.zeros((len(records), len(names), max(n_rounds, default=0)), dtype=bool)
+    index = {name: p for p, name in enumerate(names)}
+    for g, record in enumerate(records):
+        for rnd, winners in record[field].items():
+            for name in winners:
+                won[g, index[name], int(rnd)-1] = True
+    return won, n_rounds
+
+
+def stack_status(records, names=PLAYER_NAMES):
+    """
+    (games x players x rounds) bool array of the players still in the game (SAG "status") and the number of rounds of every game.
+    """
+    n_rounds = np.array([len(record["status"]) for record in records], dtype=int)
+    alive = np.zeros((len(records), len(names), max(n_rounds, default=0)), dtype=bool)
+    index = {name: p for p, name in enumerate(names)}
+    for g, record in enumerate(records):
+        for rnd, status in record["status"].items():
+            for name in status:
+                alive[g, index[name], int(rnd)-1] = True
+    return alive, n_rounds
+
+
+def stack_predictions(records, rounds, player="Alex", names=PLAYER_NAMES):
+    """
+    (games x players x rounds) float array of the opponent bids `player` predicted in its K-level reasoning logs, NaN where none.
+    """
+    predictions = np.full((len(records), len(names), rounds), np.nan)
+    index = {name: p for p, name in enumerate(names)}
+    for g, record in enumerate(records):
+        logs = record.get("logs", {}).get(player, {})
+        for r in range(rounds):
+            prediction = (logs.get(f"round{r+1}") or {}).get("prediction") or {}
+            for name, value in prediction.items():
+                if name in index:
+                    predictions[g, index[name], r] = value
+    return predictions
+
+
+def win_rate(won, n_rounds, player=0, max_round=None):
+    """
+    Share of the rounds of every game won by `player`, counting wins up to `max_round`.
+    """
+    return won[:, player, :max_round].sum(axis=1) / np.maximum(n_rounds, 1)
+
+
+def survival_rate(alive, n_rounds, player=0, soft=True):
+    """
+    Last round `player` was in the game over the rounds of the game (soft), or whether it survived to the end.
+    """
+    rounds = np.arange(1, alive.shape[2]+1)
+    last = np.max(np.where(alive[:, player], rounds, 0), axis=1)
+    if soft:
+        return last / np.maximum(n_rounds, 1)
+    return (last == n_rounds).astype(float)
+
+
+def _nan_reduce(reduce, values, axis):
+    """
+    reduce (np.nanmean, np.nanmax, ...) that returns NaN for all-NaN slices without warning.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return reduce(values, axis=axis)
+
+
+def nanmean(values):
+    """
+    Mean of the non-NaN values, NaN (without warning) when there are none.
+    """
+    return _nan_reduce(np.nanmean, np.asarray(values, dtype=float), None)
+
+
+def _split_ratio(deviation, split, reduce):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _nan_reduce(reduce, deviation[:, split:], 1) / _nan_reduce(reduce, deviation[:, :split], 1)
+
+
+def target_deviation_ratio(bids, player=0, ratio=0.8, split=5, rounds=10):
+    """
+    G08A adaption index of every game: distance of `player`'s bid to the round target (ratio x
+    average bid), summed over the rounds after `split` over the sum before it.
+    """
+    bids = bids[:, :, :rounds]
+    target = _nan_reduce(np.nanmean, bids, 1) * ratio
+    return _split_ratio(np.abs(bids[:, player] - target), split, np.nansum)
+
+
+def second_bid_deviation_ratio(bids, player=0, split=5, rounds=10):
+    """
+    SAG adaption index of every game: distance of `player`'s bid to the highest bid of the
+    others, averaged over the rounds after `split` over the average before it. NaN when the
+    player did not bid on both sides of the split.
+    """
+    bids = bids[:, :, :rounds]
+    others = np.nan_to_num(np.delete(bids, player, axis=1), nan=0.0)
+    second = np.max(others, axis=1, initial=0.0)
+    return _split_ratio(np.abs(bids[:, player] - second), split, np.nanmean)
+
+
+def prediction_error(predictions, bids, player=0, reduce=np.nanmean):
+    """
+    |reduce(predicted opponent bids) - reduce(actual opponent bids)| of every game and round,
+    NaN where `player` made no prediction or did not bid (reduce is np.nanmean in G08A,
+    np.nanmax in SAG).
+    """
+    rounds = min(predictions.shape[2], bids.shape[2])
+    predicted = _nan_reduce(reduce, np.delete(predictions[:, :, :rounds], player, axis=1), 1)
+    actual = _nan_reduce(reduce, np.delete(bids[:, :, :rounds], player, axis=1), 1)
+    return np.where(np.isnan(bids[:, player, :rounds]), np.nan, np.abs(predicted - actual))
+
+
+def bootstrap_ci(values, n_boot=1000, alpha=0.05, seed=0, chunk=1 << 22):
+    """
+    Mean of the finite `values` and its (1-alpha) percentile bootstrap interval, all resamples
+    drawn as one index array (in chunks of about `chunk` values).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.nan, np.nan, np.nan
+    rng = np.random.default_rng(seed)
+    per_chunk = max(1, chunk // len(values))
+    means = np.concatenate([
+        values[rng.integers(0, len(values), size=(min(per_chunk, n_boot - start), len(values)))].mean(axis=1)
+        for start in range(0, n_boot, per_chunk)
+    ])
+    low, high = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return values.mean(), low, high
@@ -1,7 +1,11 @@
-import json
+import asyncio
 import os
+import threading
 import time
-from openai import OpenAI
+import weakref
+
+from conversation import Conversation
+from llm_backend import AsyncChatClient, ChatClient, TokenBucket, carry_tags
 
 class PlayGround:
     def __init__(self) -> None:
@@ -20,43 +24,111 @@ class Player:
         self.persona = persona
         self.llm = None
         self.player_status = {} # Player Status
-        self.history = [] # Memory Cache
+        self.history = Conversation() # Memory Cache, append-only so requests share a cached prompt prefix
         self.reasoning = None # Reasoning Plugin
         self.other_components = None # Other Components
 
     def append_message(self, role, content):
-        self.history.append({"role": role, "content": content})
+        self.history.add(role, content)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+async def _await(coro):
+    return await coro
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous game code.
+
+    All coroutines share one long-lived event loop in a background thread, so async clients
+    keep their connection pools between rounds and this also works inside a notebook.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="alympics-loop", daemon=True).start()
+    # the loop thread does not see the caller's call tags (game, round), hand them over
+    return asyncio.run_coroutine_threadsafe(carry_tags(_await)(coro), _loop).result()
+
 
 class LLM:
-    def __init__(self, engine=None, temperature=0.7, sleep_time=10) -> None:
+    # Limits shared by every LLM instance of the process, see `LLM.configure`.
+    max_concurrency = int(os.getenv("ALYMPICS_MAX_CONCURRENCY", "8"))
+    rate_limiter = TokenBucket(float(os.getenv("ALYMPICS_RPM", "60")) / 60, capacity=max_concurrency)
+    _semaphores = weakref.WeakKeyDictionary() # one semaphore per event loop
+
+    def __init__(self, engine=None, temperature=0.7, sleep_time=0) -> None:
         # 使用 DeepSeek API 客户端
-        self.client = OpenAI(
+        self.client = ChatClient(
             api_key=os.getenv("DEEPSEEK_API_KEY", "sk-9c0aa3bc893449e6a65e2c39cee01dec"),
             base_url="https://api.deepseek.com/v1",
+            rate_limiter=LLM.rate_limiter,
         )
+        self._aclient = None
         
         self.engine = os.getenv("DEEPSEEK_MODEL", "deepseek-chat") if not engine else engine
         self.temperature = temperature
-        self.sleep_time = sleep_time
-
-    def call(self, message):
-        status = 0
-        while status != 1:
-            try:
-                response = self.client.chat.completions.create(
-                        model=self.engine,
-                        messages=message,
-                        temperature=self.temperature,
-                        max_tokens=800,
-                        top_p=0.95,
-                        frequency_penalty=0,
-                        presence_penalty=0,
-                        stop=None)
-                RESPONSE = response.choices[0].message.content
-                status = 1
-                time.sleep(self.sleep_time)
-            except Exception as e:
-                print(e)
-                time.sleep(5)
-                pass
-        return RESPONSE
\ No newline at end of file
+        self.sleep_time = sleep_time # extra pause after each completion, the rate limiter handles pacing
+
+    @classmethod
+    def configure(cls, max_concurrency=None, requests_per_minute=None):
+        """
+        Set the process-wide number of in-flight `acall` requests and the request rate.
+        The rate limiter's burst capacity follows the number of in-flight requests.
+        """
+        if max_concurrency is not None:
+            cls.max_concurrency = max_concurrency
+            cls._semaphores = weakref.WeakKeyDictionary()
+        if max_concurrency is not None or requests_per_minute is not None:
+            rate = cls.rate_limiter.rate if requests_per_minute is None else requests_per_minute / 60
+            cls.rate_limiter.set_rate(rate, capacity=cls.max_concurrency)
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            self._aclient = AsyncChatClient(api_key=self.client.api_key, base_url=self.client.base_url, rate_limiter=LLM.rate_limiter)
+        return self._aclient
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = LLM._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = LLM._semaphores[loop] = asyncio.Semaphore(LLM.max_concurrency)
+        return semaphore
+
+    def _request(self, message, **params):
+        request = dict(
+            model=self.engine,
+            messages=message,
+            temperature=self.temperature,
+            max_tokens=800,
+            top_p=0.95,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=None)
+        request.update(params)
+        return request
+
+    def call(self, message, **params):
+        """
+        Blocking completion; `params` override request fields, e.g. `response_format`.
+        Transient errors are retried by the client's RetryPolicy, the others are raised.
+        Requests sent to the API are paced by `LLM.rate_limiter`, cache hits and mock answers are not.
+        """
+        response = self.client.chat.completions.create(**self._request(message, **params))
+        if self.sleep_time:
+            time.sleep(self.sleep_time)
+        return response.choices[0].message.content
+
+    async def acall(self, message, **params):
+        """
+        Asynchronous `call`; at most `LLM.max_concurrency` requests are in flight per event loop.
+        """
+        async with self._semaphore():
+            response = await self.aclient.chat.completions.create(**self._request(message, **params))
+            if self.sleep_time:
+                await asyncio.sleep(self.sleep_time)
+            return response.choices[0].message.content
@@ -0,0 +1,252 @@
+"""
+Accounting of the chat completions and the event stream of the games.
+
+Every completion is recorded with its latency, tokens (including prompt tokens served from the
+provider's prefix cache), cost and the tags of the code that asked for it (`call_tags`: game,
+player, round, purpose such as bid/parse/predict/reflect). `call_summary` aggregates the records
+by any of these tags, `write_chrome_trace` exports them as a timeline for chrome://tracing or Perfetto.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+from response_cache import current_run
+
+
+# Optional callable receiving one event per completion, e.g. the `write` of a game's GameLog.
+_event_sink = contextvars.ContextVar("alympics_event_sink", default=None)
+
+
+def set_event_sink(sink):
+    """
+    Pass every completion of the calling thread (and of the threads it hands work to with
+    `carry_tags`) to `sink(event)` as it arrives, None stops. Games played in parallel threads
+    each keep their own sink.
+    """
+    _event_sink.set(sink)
+
+
+def emit_event(event):
+    """
+    Pass a game event (e.g. a bid that could not be parsed) to the sink of the calling thread, if any.
+    """
+    sink = _event_sink.get()
+    if sink is not None:
+        sink(event)
+
+
+def emit_completion(request, response, cached):
+    sink = _event_sink.get()
+    if sink is None:
+        return
+    messages = request.get("messages") or [{}]
+    sink({
+        "event": "completion",
+        "model": request.get("model"),
+        "n_messages": len(messages),
+        "prompt": messages[-1].get("content"),
+        "response": response.choices[0].message.content,
+        "cached": cached,
+        "tags": _call_tags.get(),
+    })
+
+
+def cached_prompt_tokens(usage):
+    """
+    Prompt tokens served from the provider's prefix cache: DeepSeek reports
+    `prompt_cache_hit_tokens`, OpenAI `prompt_tokens_details.cached_tokens`.
+    """
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    if hit is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        hit = getattr(details, "cached_tokens", None) if details is not None else None
+    return hit or 0
+
+
+# USD per million tokens: (prompt, prompt served from the prefix cache, completion).
+# List prices, override or extend with ALYMPICS_PRICES='{"model": [prompt, cached, completion]}'.
+PRICES = {
+    "deepseek-chat": (0.27, 0.07, 1.10),
+    "deepseek-reasoner": (0.55, 0.14, 2.19),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("ALYMPICS_PRICES", "{}")).items()})
+
+BATCH_DISCOUNT = float(os.getenv("ALYMPICS_BATCH_DISCOUNT", "0.5")) # price factor of batch API completions
+
+_call_tags = contextvars.ContextVar("alympics_call_tags", default={})
+_calls = {} # (model, tags) -> summed counters
+_spans = None # list of per-call records while a trace is recorded, see `start_trace`
+_calls_lock = threading.Lock()
+CALL_COUNTERS = ["calls", "retries", "cached", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "latency_s", "cost_usd"]
+
+
+@contextlib.contextmanager
+def call_tags(**tags):
+    """
+    Tag the completions requested inside the block, e.g. `with call_tags(player="Alex", purpose="bid"):`.
+    Nested blocks add to or override the outer tags.
+    """
+    token = _call_tags.set({**_call_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _call_tags.reset(token)
+
+
+def tagged(purpose):
+    """
+    Method decorator tagging the completions of the method with `purpose`, the player's name and its class (the strategy).
+    """
+    def decorate(method):
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(self, *args, **kwargs):
+                with call_tags(player=getattr(self, "name", None), strategy=type(self).__name__, purpose=purpose):
+                    return await method(self, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with call_tags(player=getattr(self, "name", None), strategy=type(self).__name__, purpose=purpose):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def carry_tags(fn):
+    """
+    `fn` running with the caller's context (call tags, event sink, run), for functions handed to
+    worker threads or another thread's event loop, which start without it.
+    """
+    # the workers count their samples in the caller's run, not in one of their own
+    current_run()
+    context = contextvars.copy_context()
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            # a task runs in its own copy of the loop's context
+            for var, value in context.items():
+                var.set(value)
+            return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # one copy per call, a context cannot be entered by two threads at once
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def call_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    prompt, cached, completion = PRICES.get(model, (0.0, 0.0, 0.0))
+    return ((prompt_tokens - cached_tokens) * prompt + cached_tokens * cached + completion_tokens * completion) / 1e6
+
+
+def record_call(request, started, response=None, cached=False, error=None, batched=False, mock=False):
+    """
+    Account one completion attempt that began at `started` (`time.perf_counter()`): a response, a cache hit or an error.
+    Answers of the offline mock backend (`mock`) keep their tokens but cost nothing.
+    """
+    latency = time.perf_counter() - started
+    tags = _call_tags.get()
+    model = request.get("model")
+    usage = None if cached else getattr(response, "usage", None) # cache hits cost nothing
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    cached_tokens = cached_prompt_tokens(usage)
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    values = {
+        "calls": 1, "retries": int(error is not None), "cached": int(cached),
+        "prompt_tokens": prompt_tokens, "cached_prompt_tokens": cached_tokens, "completion_tokens": completion_tokens,
+        "latency_s": latency,
+        "cost_usd": 0.0 if mock else call_cost(model, prompt_tokens, cached_tokens, completion_tokens) * (BATCH_DISCOUNT if batched else 1.0),
+    }
+    key = (model, tuple(sorted(tags.items(), key=lambda item: item[0])))
+    with _calls_lock:
+        counters = _calls.setdefault(key, dict.fromkeys(CALL_COUNTERS, 0))
+        for name, value in values.items():
+            counters[name] += value
+        if _spans is not None:
+            _spans.append({
+                "start": time.time() - latency, "latency": latency, "thread": threading.get_ident(),
+                "model": model, "tags": dict(tags), "error": type(error).__name__ if error is not None else None,
+                **{name: values[name] for name in ["cached", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "cost_usd"]},
+            })
+
+
+def call_summary(by=("purpose",)):
+    """
+    Summed counters of the recorded completions grouped by tags (and/or "model"), most expensive first;
+    `by=()` sums up all of them. `retries` counts failed attempts, each of which its caller retried or
+    gave up on, `prefix_hit_rate` is the share of prompt tokens served from the provider's prefix cache.
+    """
+    groups = {}
+    with _calls_lock:
+        for (model, tags), counters in _calls.items():
+            fields = {"model": model, **dict(tags)}
+            key = tuple(fields.get(name) for name in by)
+            group = groups.setdefault(key, dict.fromkeys(CALL_COUNTERS, 0))
+            for name in CALL_COUNTERS:
+                group[name] += counters[name]
+    rows = []
+    for key, counters in groups.items():
+        row = dict(zip(by, key))
+        row.update(counters)
+        row["mean_latency_s"] = row["latency_s"] / row["calls"]
+        row["prefix_hit_rate"] = row["cached_prompt_tokens"] / row["prompt_tokens"] if row["prompt_tokens"] else 0.0
+        rows.append(row)
+    return sorted(rows, key=lambda row: (-row["cost_usd"], -row["latency_s"]))
+
+
+def format_call_summary(rows):
+    """
+    `call_summary` rows as an aligned text table.
+    """
+    if not rows:
+        return "no completions recorded"
+    columns = list(rows[0])
+    def cell(value):
+        if isinstance(value, float):
+            return f"{value:.4f}" if abs(value) < 100 else f"{value:.1f}"
+        return "-" if value is None else str(value)
+    table = [columns] + [[cell(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    return "\n".join("  ".join(text.ljust(width) for text, width in zip(line, widths)) for line in table)
+
+
+def start_trace():
+    """
+    Keep a record of every completion from now on, for `write_chrome_trace`.
+    """
+    global _spans
+    with _calls_lock:
+        if _spans is None:
+            _spans = []
+
+
+def write_chrome_trace(path):
+    """
+    Write the completions recorded since `start_trace` as Chrome trace events, one row per player.
+    """
+    with _calls_lock:
+        spans = list(_spans or [])
+    rows = {}
+    events = []
+    for span in spans:
+        row = span["tags"].get("player") or f"thread {span['thread']}"
+        tid = rows.setdefault(row, len(rows) + 1)
+        events.append({
+            "name": span["tags"].get("purpose") or "completion", "cat": span["model"] or "llm", "ph": "X",
+            "ts": span["start"] * 1e6, "dur": span["latency"] * 1e6, "pid": os.getpid(), "tid": tid,
+            "args": {**span["tags"], **{name: span[name] for name in ["error", "cached", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "cost_usd"]}},
+        })
+    events += [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": row}} for row, tid in rows.items()]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as fout:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fout)
@@ -0,0 +1,274 @@
+"""
+Batch API execution of the chat completions.
+
+With a `BatchExecutor` installed, completions are not sent one by one but collected across all
+games of the process into waves that go to a batch endpoint as one JSONL file.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from mock_backend import MockClient
+from response_cache import ResponseCache, next_sample, to_dict
+from transport import api_client
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBatchEndpoint:
+    """
+    File-based stand-in of a batch API for tests and offline runs: a submitted input JSONL is
+    answered line by line with the regular backend (mock or online) and the output JSONL is
+    written next to it, in the format of the OpenAI Batch API.
+
+    The mock backend answers every line with the sample of the game that asked (the part of the
+    custom_id after the "-"), so a batched mock game plays exactly like a direct one.
+    """
+    def __init__(self, workers=16):
+        self.workers = workers
+
+    def _answer(self, backend, line):
+        try:
+            if isinstance(backend, MockClient):
+                response, delay = backend._complete(line["body"], line["custom_id"].split("-", 1)[1])
+                time.sleep(delay)
+            else:
+                response = backend.chat.completions.create(**line["body"])
+            return {"custom_id": line["custom_id"], "response": {"status_code": 200, "body": to_dict(response)}, "error": None}
+        except Exception as e:
+            return {"custom_id": line["custom_id"], "response": None, "error": {"code": type(e).__name__, "message": str(e)}}
+
+    def submit(self, input_path, output_path, base_url, api_key):
+        from concurrent.futures import ThreadPoolExecutor
+        if os.path.exists(output_path):
+            return None
+        with open(input_path) as fin:
+            lines = [json.loads(line) for line in fin]
+        from llm_backend import ChatClient  # llm_backend imports this module
+        backend = ChatClient(api_key=api_key, base_url=base_url, cache=None)._backend()
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(lambda line: self._answer(backend, line), lines))
+        with _replace_file(output_path) as fout:
+            for result in results:
+                fout.write(json.dumps(result) + "\n")
+        return None
+
+    def wait(self, handle, output_path):
+        return output_path
+
+
+class OpenAIBatchEndpoint:
+    """
+    The OpenAI-compatible Batch API: upload the input file, create a batch, poll it until it has
+    ended and download its output (and error) file.
+    """
+    def __init__(self, poll_interval=30.0, completion_window="24h"):
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    def submit(self, input_path, output_path, base_url, api_key):
+        """
+        Handle of the batch of `input_path`, created unless an earlier run already did (see the .batch file).
+        """
+        client = api_client(base_url, api_key)
+        id_path = input_path[:-len(".input.jsonl")] + ".batch"
+        if os.path.exists(output_path):
+            return None
+        if os.path.exists(id_path):
+            with open(id_path) as fin:
+                return client, fin.read().strip()
+        with open(input_path, "rb") as fin:
+            uploaded = client.files.create(file=fin, purpose="batch")
+        batch = client.batches.create(input_file_id=uploaded.id, endpoint="/v1/chat/completions", completion_window=self.completion_window)
+        with _replace_file(id_path) as fout:
+            fout.write(batch.id)
+        return client, batch.id
+
+    def wait(self, handle, output_path):
+        if handle is None:
+            return output_path
+        client, batch_id = handle
+        while True:
+            batch = client.batches.retrieve(batch_id)
+            if batch.status == "completed":
+                break
+            if batch.status in ["failed", "expired", "cancelled"]:
+                raise RuntimeError(f"batch {batch_id} {batch.status}")
+            time.sleep(self.poll_interval)
+        with _replace_file(output_path) as fout:
+            for file_id in [batch.output_file_id, getattr(batch, "error_file_id", None)]:
+                if file_id:
+                    fout.write(client.files.content(file_id).text.rstrip("\n") + "\n")
+        return output_path
+
+
+@contextlib.contextmanager
+def _replace_file(path):
+    """
+    Write `path` through a temporary file, so that a crash never leaves a partial file behind.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as fout:
+        yield fout
+    os.replace(tmp_path, path)
+
+
+class BatchExecutor:
+    """
+    Runs the completions of many concurrent games (threads announced with `add_game` that run
+    the game with `run`) in waves.
+
+    Every completion blocks its game; once all registered games are waiting, or no new request
+    came in for `linger` seconds (a game may wait on its own worker threads), the pending
+    requests form a wave: one JSONL per endpoint in `root`, submitted to `endpoint`, whose
+    answers wake the games up again. A run restarted on the same games (see the per-game event
+    logs) takes the requests answered by earlier waves from their output files, and a wave with
+    the same requests as one already submitted is not submitted again (its file is named after
+    their hash).
+    """
+    def __init__(self, root, endpoint=None, linger=0.5, max_wave=50000):
+        self.root = root
+        self.endpoint = endpoint or LocalBatchEndpoint()
+        self.linger = linger
+        self.max_wave = max_wave
+        self.active = 0
+        self.waves = 0
+        self.requests = 0
+        self._pending = []
+        self._last_request = 0.0
+        self._answers = None # (request, sample) -> response of every wave that landed
+        self._errors = {}
+        self._cond = threading.Condition()
+        os.makedirs(root, exist_ok=True)
+        threading.Thread(target=self._run_waves, name="alympics-batch", daemon=True).start()
+
+    def add_game(self):
+        """
+        Announce a game before its thread starts, so that no wave leaves without its first request.
+        """
+        with self._cond:
+            self.active += 1
+
+    def run(self, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) as one of the announced games whose completions are batched together.
+        """
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify_all()
+
+    def complete(self, base_url, api_key, request):
+        """
+        Response (as a dict) of `request` once its wave has been answered.
+        """
+        # which sample of this request the game asks for, only the mock backend needs it
+        slot = {"done": threading.Event(), "sample": next_sample("mock", ResponseCache.make_key(request))}
+        with self._cond:
+            self._pending.append((base_url, api_key, request, slot))
+            self._last_request = time.monotonic()
+            self._cond.notify_all()
+        slot["done"].wait()
+        if "error" in slot:
+            raise slot["error"]
+        return slot["response"]
+
+    def _ready(self):
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.active or time.monotonic() - self._last_request >= self.linger
+
+    def _run_waves(self):
+        while True:
+            with self._cond:
+                while not self._ready():
+                    self._cond.wait(self.linger if self._pending else None)
+                wave, self._pending = self._pending[:self.max_wave], self._pending[self.max_wave:]
+            try:
+                self._submit_wave(wave)
+            except Exception as e:
+                for *_, slot in wave:
+                    slot.setdefault("error", e)
+                    slot["done"].set()
+
+    def _load_answers(self):
+        """
+        Answers of the waves in `root` that landed before, by request and sample.
+        """
+        answers = {}
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(".output.jsonl"):
+                continue
+            with open(os.path.join(self.root, name.replace(".output.", ".input."))) as fin:
+                requests = {line["custom_id"]: json.dumps(line["body"], sort_keys=True) for line in map(json.loads, fin)}
+            with open(os.path.join(self.root, name)) as fin:
+                for result in map(json.loads, fin):
+                    if not result.get("error") and (result["response"] or {}).get("status_code") == 200 and result["custom_id"] in requests:
+                        answers[(requests[result["custom_id"]], result["custom_id"].split("-", 1)[1])] = result["response"]["body"]
+        return answers
+
+    def _submit_wave(self, wave):
+        if self._answers is None:
+            self._answers = self._load_answers()
+        self.waves += 1
+        self.requests += len(wave)
+        groups = {}
+        for base_url, api_key, request, slot in wave:
+            item = (json.dumps(request, sort_keys=True), str(slot["sample"]), slot)
+            if item[:2] not in self._answers:
+                groups.setdefault((base_url, api_key), []).append(item)
+        submitted = []
+        for (base_url, api_key), items in groups.items():
+            items.sort(key=lambda item: item[:2])
+            name = hashlib.sha256("\n".join(f"{text} {sample}" for text, sample, _ in items).encode()).hexdigest()[:16]
+            input_path = os.path.join(self.root, f"wave-{name}.input.jsonl")
+            output_path = os.path.join(self.root, f"wave-{name}.output.jsonl")
+            if not os.path.exists(input_path):
+                with _replace_file(input_path) as fout:
+                    for i, (text, sample, _) in enumerate(items):
+                        fout.write(json.dumps({"custom_id": f"{i}-{sample}", "method": "POST", "url": "/v1/chat/completions", "body": json.loads(text)}) + "\n")
+            submitted.append((self.endpoint.submit(input_path, output_path, base_url, api_key), input_path, output_path))
+        logger.info("Batch wave %d: %d requests, %d answered before, %d file(s)",
+                    self.waves, len(wave), len(wave) - sum(len(items) for items in groups.values()), len(groups))
+        for handle, input_path, output_path in submitted:
+            self.endpoint.wait(handle, output_path)
+            with open(input_path) as fin:
+                requests = {line["custom_id"]: json.dumps(line["body"], sort_keys=True) for line in map(json.loads, fin)}
+            with open(output_path) as fin:
+                for result in map(json.loads, fin):
+                    key = (requests.get(result["custom_id"]), result["custom_id"].split("-", 1)[1])
+                    if result.get("error") or (result["response"] or {}).get("status_code") != 200:
+                        self._errors[key] = result.get("error") or result["response"]
+                    else:
+                        self._answers[key] = result["response"]["body"]
+        for base_url, api_key, request, slot in wave:
+            key = (json.dumps(request, sort_keys=True), str(slot["sample"]))
+            if key in self._answers:
+                slot["response"] = self._answers[key]
+            else:
+                slot["error"] = RuntimeError(f"batch request failed: {self._errors.pop(key, 'no result in batch output')}")
+            slot["done"].set()
+
+
+_batch_executor = None
+
+
+def set_batch_executor(executor):
+    """
+    Send all completions of the process through `executor` (a BatchExecutor), None sends them directly again.
+    """
+    global _batch_executor
+    _batch_executor = executor
+
+
+def batch_executor():
+    """
+    The executor installed with `set_batch_executor`, None while completions are sent directly.
+    """
+    return _batch_executor
@@ -0,0 +1,151 @@
+"""
+Chat histories laid out for provider-side prompt (prefix) caching.
+
+The k-reasoning games import this module from here (their `paths.py` puts src/ on `sys.path`).
+
+DeepSeek and OpenAI reuse the computation of a request prefix they have already seen, so a
+request is cheap and fast when it only appends messages to an earlier one. `Conversation`
+makes that the only way to grow a history: earlier messages cannot be edited, removed or
+re-roled, and one-off instructions are sent after the history with `request` instead of being
+spliced into it. `accounting.call_summary()` reports how many prompt tokens were cache hits.
+
+With a token budget (ALYMPICS_MEMORY_TOKENS), `render` bounds the size of every request: the
+system prompt and the latest rounds stay verbatim and older rounds are replaced by the short
+numeric digests given to `close_round`. Rounds are folded in batches, down to 3/4 of the
+budget, so the rendered prefix only changes every few rounds and keeps hitting the cache.
+"""
+import os
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+MESSAGE_OVERHEAD = 4 # role and separators of one chat message
+LOW_WATER = 0.75
+SUMMARY_HEADER = "Summary of the earlier rounds:\n"
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Local estimate of the prompt tokens of `text`: tiktoken's cl100k_base when installed,
+    otherwise ~4 characters per token.
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message):
+    return count_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD
+
+
+def memory_budget():
+    """
+    Token budget of rendered conversations from ALYMPICS_MEMORY_TOKENS, None (unbounded) when unset or 0.
+    """
+    return int(os.getenv("ALYMPICS_MEMORY_TOKENS", "0")) or None
+
+
+class Conversation(list):
+    """
+    Append-only list of chat messages, usable wherever a list of messages is expected.
+
+    The first `head` messages (the system prompt) are never compacted, `keep_rounds` closed
+    rounds and the open one are always sent verbatim.
+    """
+    def __init__(self, messages=(), budget=None, keep_rounds=2):
+        super().__init__(messages)
+        self.head = len(self)
+        self.budget = memory_budget() if budget is None else budget
+        self.keep_rounds = keep_rounds
+        self.rounds = [] # (end index, digest) of every closed round
+        self.compacted = 0 # leading rounds replaced by their digests
+        self._sizes = [0] # _sizes[i]: tokens of the first i messages
+
+    def pin(self):
+        """
+        Mark the messages added so far as the system prompt, e.g. after `Player.append_message("system", ...)`.
+        """
+        self.head = len(self)
+
+    def close_round(self, digest):
+        """
+        End the current round. `digest` stands in for its messages once the round is compacted,
+        e.g. "Round 3: Alex chose 30, Bob chose 42; target 28.8; you lost; your HP 8."
+        """
+        self.rounds.append((len(self), digest))
+
+    def tokens(self, start=0, end=None):
+        end = len(self) if end is None else end
+        for message in self[len(self._sizes) - 1:end]:
+            self._sizes.append(self._sizes[-1] + message_tokens(message))
+        return self._sizes[end] - self._sizes[start]
+
+    def _summary(self, rounds):
+        return {"role": "system", "content": SUMMARY_HEADER + "\n".join(digest for _, digest in self.rounds[:rounds])}
+
+    def _rendered_tokens(self, rounds):
+        if rounds == 0:
+            return self.tokens()
+        start = self.rounds[rounds - 1][0]
+        return self.tokens(0, self.head) + message_tokens(self._summary(rounds)) + self.tokens(start)
+
+    def render(self):
+        """
+        Messages to send: the whole conversation while it fits the budget, otherwise the system
+        prompt, a digest of the oldest rounds and the remaining rounds verbatim.
+        """
+        if not self.budget or not self.rounds:
+            return self
+        if self._rendered_tokens(self.compacted) > self.budget:
+            limit = max(len(self.rounds) - self.keep_rounds, self.compacted)
+            rounds = self.compacted
+            while rounds < limit and self._rendered_tokens(rounds) > self.budget * LOW_WATER:
+                rounds += 1
+            self.compacted = rounds
+        if self.compacted == 0:
+            return self
+        start = self.rounds[self.compacted - 1][0]
+        return self[:self.head] + [self._summary(self.compacted)] + self[start:]
+
+    def add(self, role, content):
+        self.append({"role": role, "content": content})
+        return self
+
+    def request(self, *messages):
+        """
+        Messages for a one-off call: the (rendered) history followed by `messages`, e.g.
+        `conversation.request({"role": "system", "content": inquiry})`. The history is not modified.
+        """
+        return list(self.render()) + list(messages)
+
+    def fork(self):
+        """
+        Independent copy sharing the messages and rounds seen so far, e.g. for a lookahead.
+        """
+        conversation = Conversation(self, self.budget, self.keep_rounds)
+        conversation.head = self.head
+        conversation.rounds = list(self.rounds)
+        conversation.compacted = self.compacted
+        conversation._sizes = self._sizes[:len(self) + 1]
+        return conversation
+
+    def _edit(self, *args, **kwargs):
+        raise TypeError("Conversation is append-only, earlier messages are part of the cached prompt prefix")
+
+    __setitem__ = __delitem__ = insert = pop = remove = clear = sort = reverse = _edit
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+    def __add__(self, messages):
+        conversation = self.fork()
+        conversation.extend(messages)
+        return conversation
@@ -0,0 +1,298 @@
+"""Subgame-perfect equilibrium of the platform game, the reference LLM play is compared against.
+
+The solver backward-inducts over the stages of `PlatformGame._play_round`:
+mode (M) -> commission (M) -> innovation (S) -> imitation (M) -> prices (M and S) -> display share (M).
+Every stage is a grid search over the action space the game allows, refined around the best
+point, and all subgames of a stage are solved at once with `settle_batch`: the configurations
+and the decisions of the earlier stages are array axes, every stage adds one more.
+
+- Display share: M's profit is linear in it, so only 0 and 1 are evaluated (ties show S).
+- Prices are chosen simultaneously, the Nash equilibrium is found by iterated best response on
+  price grids that are re-centred on the current profile at every level. S only ever sells
+  through one channel, so its strategies reduce to an on-platform price (direct price equal to
+  it, never chosen by consumers) or a direct price with the on-platform price at its cap.
+- Imitation is a yes/no comparison where the game allows it (dual mode, Δ > σ, not banned).
+- Innovation, commission: grid search with refinement, mode: the best allowed one.
+
+Results are cached per (GameConfig, RegulationConfig, solver settings) hash, and `solve_batch`
+solves all uncached configurations of a sweep in one vectorised pass.
+
+    from equilibrium import solve, distance
+    equilibrium = solve(GameConfig(), RegulationConfig())
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import asdict, fields
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from platform_game import MODES, GameConfig, RegulationConfig, settle_batch
+
+DUAL, MARKETPLACE, SELLER = range(len(MODES))
+
+_cache: Dict[str, Dict] = {}
+
+
+def config_hash(config: GameConfig, regulation: RegulationConfig, **settings) -> str:
+    """Stable hash of a configuration, the key of the equilibrium cache."""
+    payload = json.dumps([asdict(config), asdict(regulation), settings], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _grid_search(
+    solve: Callable, key: str, lower, upper, points: int, levels: int = 1, keep: Sequence[str] | None = None
+) -> Dict[str, np.ndarray]:
+    """Maximise solve(values)[key] over values in [lower, upper], for every entry of lower/upper.
+
+    solve gets the candidate values along a new last axis and returns a dict of arrays of that
+    shape. The grid runs from upper to lower so ties go to the larger value; every further level
+    re-grids between the neighbours of the best value so far. Returns the outcome at the best
+    value under "value", only key and the names in keep unless keep is None.
+    """
+    lower, upper = np.broadcast_arrays(np.asarray(lower, dtype=float), np.asarray(upper, dtype=float))
+    steps = np.linspace(0.0, 1.0, points)
+    low, high = lower, upper
+    best = None
+    for _ in range(levels):
+        values = high[..., None] + (low - high)[..., None] * steps
+        outcome = solve(values)
+        index = outcome[key].argmax(axis=-1)[..., None]
+        names = outcome if keep is None else (key, *keep)
+        outcome = {name: np.take_along_axis(outcome[name], index, axis=-1)[..., 0] for name in names}
+        outcome["value"] = np.take_along_axis(values, index, axis=-1)[..., 0]
+        if best is None:
+            best = outcome
+        else:
+            better = outcome[key] > best[key]
+            best = {name: np.where(better, value, best[name]) for name, value in outcome.items()}
+        step = (high - low) / max(points - 1, 1)
+        low = np.maximum(lower, best["value"] - step)
+        high = np.minimum(upper, best["value"] + step)
+    return best
+
+
+def _pick(condition, first: Dict[str, np.ndarray], second: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {name: np.where(condition, first[name], second[name]) for name in first}
+
+
+def _expand(*arrays) -> List[np.ndarray]:
+    return [np.asarray(array)[..., None] for array in arrays]
+
+
+class _Solver:
+    """Backward induction for a batch of configurations, along the first axis of every array."""
+
+    def __init__(self, configs: Sequence[GameConfig], regulations: Sequence[RegulationConfig], points: int,
+                 levels: int, price_points: int, price_levels: int, iterations: int):
+        self.configs = {f.name: np.array([getattr(c, f.name) for c in configs]) for f in fields(GameConfig)}
+        self.bans = {f.name: np.array([getattr(r, f.name) for r in regulations]) for f in fields(RegulationConfig)}
+        self.points = points
+        self.levels = levels
+        self.price_points = price_points
+        self.price_levels = price_levels
+        self.iterations = iterations
+        self.size = len(configs)
+
+    def param(self, name: str, like, rows=None) -> np.ndarray:
+        """GameConfig field of every configuration (or of the given rows), shaped to broadcast against like."""
+        values = self.configs[name] if rows is None else self.configs[name][rows]
+        return values.reshape((-1,) + (1,) * (np.ndim(like) - 1))
+
+    def ban(self, name: str, like, rows=None) -> np.ndarray:
+        values = self.bans[name] if rows is None else self.bans[name][rows]
+        return values.reshape((-1,) + (1,) * (np.ndim(like) - 1))
+
+    def outcome(self, rows, mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct, display_share):
+        profile = np.broadcast_arrays(
+            mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct, display_share
+        )
+        config = GameConfig(**{name: self.param(name, profile[0], rows) for name in self.configs})
+        outcome = settle_batch(config, *profile)
+        names = ("mode", "commission", "innovation", "imitation", "price_M", "price_S_platform", "price_S_direct", "display_share")
+        return {**dict(zip(names, profile)), **outcome}
+
+    def display(self, rows, mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct, keep=None):
+        """Stage 4: M shows S to everyone or to nobody, unless the share is fixed by mode or regulation."""
+        free = (mode == DUAL) & ~self.ban("ban_self_preferencing", mode, rows)
+        fixed = np.where(mode == SELLER, 0.0, 1.0)
+        profile = _expand(mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct)
+        return _grid_search(
+            lambda share: self.outcome(rows, *profile, share),
+            "profit_M", np.where(free, 0.0, fixed), np.where(free, 1.0, fixed), 2, keep=keep,
+        )
+
+    def best_responses(self, rows, mode, commission, innovation, imitation, prices, bounds):
+        """One round of best responses of a list of subgames: M to S's prices, then S to M's new price."""
+        fixed = _expand(mode, commission, innovation, imitation)
+        price_M, price_S_platform, price_S_direct = prices
+        bounds_M, bounds_platform, bounds_direct, cap_S = bounds
+        price_M = _grid_search(
+            lambda p: self.display(rows, *fixed, p, *_expand(price_S_platform, price_S_direct), keep=()),
+            "profit_M", *bounds_M, self.price_points, keep=(),
+        )["value"]
+        platform = _grid_search(
+            lambda p: self.display(rows, *fixed, *_expand(price_M), p, p, keep=("profit_S",)),
+            "profit_S", *bounds_platform, self.price_points, keep=(),
+        )
+        direct = _grid_search(
+            lambda p: self.display(rows, *fixed, *_expand(price_M, cap_S), p, keep=("profit_S",)),
+            "profit_S", *bounds_direct, self.price_points, keep=(),
+        )
+        use_direct = direct["profit_S"] > platform["profit_S"]
+        return np.stack([
+            price_M,
+            np.where(use_direct, cap_S, platform["value"]),
+            np.where(use_direct, direct["value"], platform["value"]),
+        ])
+
+    def prices(self, mode, commission, innovation, imitation):
+        """Stage 3: iterated best response of P_M and (P_S^in, P_S^out) on shrinking price grids.
+
+        The subgames are flattened, and only those still moving are iterated.
+        """
+        mode, commission, innovation, imitation = np.broadcast_arrays(mode, commission, innovation, imitation)
+        shape = mode.shape
+        rows = np.broadcast_to(np.arange(self.size).reshape((-1,) + (1,) * (len(shape) - 1)), shape).ravel()
+        mode, commission, innovation, imitation = (x.ravel() for x in (mode, commission, innovation, imitation))
+        sigma, convenience = self.param("sigma", mode, rows), self.param("convenience", mode, rows)
+        cap_M = np.where(mode == MARKETPLACE, 0.0, convenience + np.where(imitation, innovation, sigma))
+        cap_S = np.where(mode == SELLER, 0.0, commission + innovation)
+        caps = np.stack([cap_M, cap_S, cap_S])
+        prices = half = caps
+        converged = np.ones(len(mode), dtype=bool)
+        for _ in range(self.price_levels):
+            # the grids of a level stay put, so the iteration either settles or cycles on them
+            lower, upper = np.maximum(0.0, prices - half), np.minimum(caps, prices + half)
+            history = [prices]
+            active = np.arange(len(mode))
+            for _ in range(self.iterations):
+                bounds = [(lower[i, active], upper[i, active]) for i in range(3)] + [cap_S[active]]
+                profile = self.best_responses(
+                    rows[active], mode[active], commission[active], innovation[active], imitation[active],
+                    prices[:, active], bounds,
+                )
+                moved = (profile != prices[:, active]).any(axis=0)
+                # returning to an earlier profile is a best-response cycle, there is no pure equilibrium on the grid
+                cycling = np.zeros_like(moved)
+                for earlier in history[:-1]:
+                    cycling |= (profile == earlier[:, active]).all(axis=0)
+                prices = prices.copy()
+                prices[:, active] = profile
+                history.append(prices)
+                converged[active[moved & cycling]] = False
+                active = active[moved & ~cycling]
+                if not len(active):
+                    break
+            converged[active] = False
+            half = 2 * half / max(self.price_points - 1, 1)
+        outcome = {**self.display(rows, mode, commission, innovation, imitation, *prices), "converged": converged}
+        return {name: value.reshape(shape) for name, value in outcome.items()}
+
+    def imitation(self, mode, commission, innovation):
+        """Stage 2b: M imitates when the game offers it and imitating raises its profit."""
+        honest = self.prices(mode, commission, innovation, False)
+        allowed = (mode == DUAL) & (innovation > self.param("sigma", innovation)) & ~self.ban("ban_imitation", innovation)
+        if not allowed.any():
+            return honest
+        imitate = self.prices(mode, commission, innovation, allowed)
+        return _pick(allowed & (imitate["profit_M"] > honest["profit_M"]), imitate, honest)
+
+    def innovation(self, mode, commission):
+        """Stage 2: S's innovation for every mode and commission."""
+        mode, commission = np.broadcast_arrays(mode, commission)
+        return _grid_search(
+            lambda delta: self.imitation(*_expand(mode, commission), delta),
+            "profit_S",
+            np.broadcast_to(self.param("min_innovation", mode), mode.shape),
+            np.broadcast_to(self.param("max_innovation", mode), mode.shape),
+            self.points,
+            self.levels,
+        )
+
+    def commission(self, mode):
+        """Stage 1: M's commission for every mode, 0 when M runs no marketplace."""
+        return _grid_search(
+            lambda tau: self.innovation(*_expand(mode), tau),
+            "profit_M",
+            0.0,
+            np.where(mode != SELLER, self.param("convenience", mode), 0.0),
+            self.points,
+            self.levels,
+        )
+
+    def solve(self) -> List[Dict]:
+        modes = np.broadcast_to(np.arange(len(MODES)), (self.size, len(MODES)))
+        outcome = self.commission(modes)
+        allowed = (modes != DUAL) | ~self.ban("ban_dual_mode", modes)
+        profits = np.where(allowed, outcome["profit_M"], -np.inf)
+        records = []
+        for i, best in enumerate(profits.argmax(axis=1)):
+            record = {name: value[i, best].item() for name, value in outcome.items() if name != "value"}
+            record["mode"] = MODES[best]
+            record["imitation"] = bool(record["imitation"])
+            record["converged"] = bool(record["converged"])
+            record["mode_profit_M"] = {MODES[m]: float(profits[i, m]) for m in range(len(MODES)) if allowed[i, m]}
+            records.append(record)
+        return records
+
+
+def solve_batch(
+    configs: Sequence[GameConfig],
+    regulations: Sequence[RegulationConfig] | RegulationConfig | None = None,
+    points: int = 7,
+    levels: int = 3,
+    price_points: int = 9,
+    price_levels: int = 2,
+    iterations: int = 12,
+) -> List[Dict]:
+    """Equilibrium records of many configurations, the uncached ones are solved together.
+
+    regulations is one RegulationConfig for all configurations or one per configuration.
+    points/levels set the commission and innovation grids, price_points/price_levels the price
+    grids and iterations caps the best-response rounds per price level.
+    """
+    if regulations is None or isinstance(regulations, RegulationConfig):
+        regulations = [regulations or RegulationConfig()] * len(configs)
+    settings = dict(points=points, levels=levels, price_points=price_points, price_levels=price_levels, iterations=iterations)
+    keys = [config_hash(config, regulation, **settings) for config, regulation in zip(configs, regulations)]
+    missing = {key: i for i, key in enumerate(keys) if key not in _cache}
+    if missing:
+        indices = list(missing.values())
+        records = _Solver([configs[i] for i in indices], [regulations[i] for i in indices], **settings).solve()
+        for key, record in zip(missing, records):
+            _cache[key] = {**record, "config_hash": key}
+    return [dict(_cache[key]) for key in keys]
+
+
+def solve(config: GameConfig | None = None, regulation: RegulationConfig | None = None, **settings) -> Dict:
+    """Subgame-perfect equilibrium of one round, in the format of `PlatformGame.round_records`.
+
+    The record also holds "converged" (False when best responses in the equilibrium price
+    subgame cycled, the last profile is kept), M's equilibrium profit per allowed mode and the
+    "config_hash" it is cached under.
+    """
+    return solve_batch([config or GameConfig()], regulation, **settings)[0]
+
+
+def distance(record: Dict, equilibrium: Dict, config: GameConfig) -> float:
+    """Distance of one round's decisions to the equilibrium, between 0 and 1.
+
+    Root mean square over mode, imitation (0 or 1 when they differ) and commission, innovation,
+    prices and display share, each scaled by the width of its range in the game.
+    """
+    price_range = config.convenience + config.max_innovation
+    scales = {
+        "commission": config.convenience,
+        "innovation": config.max_innovation - config.min_innovation,
+        "price_M": price_range,
+        "price_S_platform": price_range,
+        "price_S_direct": price_range,
+        "display_share": 1.0,
+    }
+    gaps = [float(record["mode"] != equilibrium["mode"]), float(record["imitation"] != equilibrium["imitation"])]
+    for name, scale in scales.items():
+        gaps.append(min(abs(record[name] - equilibrium[name]) / scale, 1.0) if scale else 0.0)
+    return float(np.sqrt(np.mean(np.square(gaps))))
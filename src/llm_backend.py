@@ -0,0 +1,160 @@
+"""
+Chat-completion plumbing shared by the Alympics games.
+
+The k-reasoning games import this module from here (their `paths.py` puts src/ on `sys.path`).
+
+`ChatClient` is a drop-in replacement for an `OpenAI` client: game code keeps calling
+`client.chat.completions.create(...)` and the client adds an optional on-disk response
+cache in front of the real endpoint. The endpoint itself is either the OpenAI-compatible
+API or, for offline benchmarks, the deterministic `MockClient` (ALYMPICS_BACKEND=mock).
+Cache hits and mock answers are returned at once; requests that reach the API are paced and
+retried, or collected into waves for a batch endpoint.
+
+The parts live in their own modules, whose public names are also importable from here:
+- `response_cache`: the response cache and the runs that number repeated requests (`start_run`),
+- `accounting`: tokens, latency and cost of every completion by tag (`call_tags`, `call_summary`) and game events,
+- `mock_backend`: the offline backend,
+- `transport`: shared SDK clients, `TokenBucket` pacing, `RetryPolicy` and `CircuitBreaker`,
+- `batching`: the `BatchExecutor` and its batch endpoints.
+"""
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+from accounting import (BATCH_DISCOUNT, CALL_COUNTERS, PRICES, cached_prompt_tokens, call_cost, call_summary, call_tags,
+                        carry_tags, emit_completion, emit_event, format_call_summary, record_call, set_event_sink, start_trace,
+                        tagged, write_chrome_trace)
+from batching import BatchExecutor, LocalBatchEndpoint, OpenAIBatchEndpoint, batch_executor, set_batch_executor
+from mock_backend import AsyncMockClient, MockClient, MockPrefixCache, MockResponder, parse_latency, prefix_cache
+from response_cache import ResponseCache, current_run, default_cache, next_sample, start_run, to_dict, to_namespace
+from transport import (DEFAULT_BASE_URL, HTTP_SETTINGS, CircuitBreaker, RetryPolicy, TokenBucket, api_client, asend,
+                       circuit_breaker, retry_after, retry_policy, send, set_request_gate)
+
+# Overrides of the ALYMPICS_BACKEND / ALYMPICS_MOCK_SEED / ALYMPICS_MOCK_LATENCY variables, see `configure`.
+_settings = {}
+
+
+def configure(backend=None, seed=None, latency=None):
+    """
+    Select the completion backend for clients that have not issued a request yet,
+    e.g. from a `--backend mock` command line flag.
+    """
+    for key, value in (("backend", backend), ("seed", seed), ("latency", latency)):
+        if value is not None:
+            _settings[key] = value
+
+
+def backend_name():
+    return _settings.get("backend") or os.getenv("ALYMPICS_BACKEND", "openai")
+
+
+class ChatClient:
+    """
+    Drop-in for `OpenAI(api_key=..., base_url=...)` exposing `client.chat.completions.create`.
+    With a `rate_limiter` (a TokenBucket), every request sent to the endpoint takes a token first.
+    """
+    def __init__(self, api_key=None, base_url=DEFAULT_BASE_URL, cache="default", rate_limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._cache = cache
+        self.rate_limiter = rate_limiter
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+        self._client = None
+
+    @property
+    def cache(self):
+        # mock answers are never cached so they cannot be replayed as real ones
+        if backend_name() == "mock":
+            return None
+        return default_cache() if self._cache == "default" else self._cache
+
+    def _mock_backend(self, mock_class):
+        return mock_class(
+            seed=_settings.get("seed", os.getenv("ALYMPICS_MOCK_SEED", "0")),
+            latency=_settings.get("latency", os.getenv("ALYMPICS_MOCK_LATENCY", "0")),
+        )
+
+    def _backend(self):
+        if self._client is None:
+            if backend_name() == "mock":
+                self._client = self._mock_backend(MockClient)
+            else:
+                self._client = api_client(self.base_url, self.api_key)
+        return self._client
+
+    def _cache_key(self, request):
+        """
+        Key of the next sample of `request`: repeated identical requests get increasing indices.
+        """
+        sample = next_sample("samples", ResponseCache.make_key(request))
+        return ResponseCache.make_key(request, sample)
+
+    def create(self, **request):
+        key = None
+        cache = self.cache
+        started = time.perf_counter()
+        if cache is not None:
+            key = self._cache_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                response = to_namespace(cached)
+                record_call(request, started, response, cached=True)
+                emit_completion(request, response, True)
+                return response
+
+        executor = batch_executor()
+        if executor is not None:
+            # the completion joins the next wave of the batch executor
+            response = to_namespace(executor.complete(self.base_url, self.api_key, request))
+            return self._finish(request, started, response, key, batched=True)
+
+        backend = self._backend()
+        # only requests that reach the endpoint are paced
+        limiter = None if isinstance(backend, MockClient) else self.rate_limiter
+        response, attempt_started = send(backend, request, self.base_url, started, limiter)
+        return self._finish(request, attempt_started, response, key)
+
+    def _finish(self, request, started, response, key, batched=False):
+        record_call(request, started, response, batched=batched, mock=backend_name() == "mock")
+        emit_completion(request, response, False)
+        if key is not None:
+            self.cache.put(key, to_dict(response))
+        return response
+
+
+class AsyncChatClient(ChatClient):
+    """
+    Drop-in for `AsyncOpenAI`, `await client.chat.completions.create(...)`.
+    """
+    def _backend(self):
+        if backend_name() != "mock":
+            # the connections of an async client belong to the event loop that opened them
+            return api_client(self.base_url, self.api_key, is_async=True)
+        if self._client is None:
+            self._client = self._mock_backend(AsyncMockClient)
+        return self._client
+
+    async def create(self, **request):
+        key = None
+        cache = self.cache
+        started = time.perf_counter()
+        if cache is not None:
+            key = self._cache_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                response = to_namespace(cached)
+                record_call(request, started, response, cached=True)
+                emit_completion(request, response, True)
+                return response
+
+        executor = batch_executor()
+        if executor is not None:
+            response = to_namespace(await asyncio.to_thread(executor.complete, self.base_url, self.api_key, request))
+            return self._finish(request, started, response, key, batched=True)
+
+        backend = self._backend()
+        limiter = None if isinstance(backend, MockClient) else self.rate_limiter
+        response, attempt_started = await asend(backend, request, self.base_url, started, limiter)
+        return self._finish(request, attempt_started, response, key)
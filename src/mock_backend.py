@@ -0,0 +1,233 @@
+"""
+Offline completion backend (ALYMPICS_BACKEND=mock) used to profile the game engines without the network.
+
+Answers depend only on the seed, the request and its sample, so a mock run is reproducible
+whatever the order or concurrency of its requests. Latency and the provider's prefix cache are imitated.
+"""
+import asyncio
+import collections
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from response_cache import ResponseCache, current_run, next_sample, to_namespace
+
+
+def parse_latency(spec):
+    """
+    Latency distribution of the mock backend in seconds:
+    "0", "fixed:0.2", "uniform:0.1,0.5", "normal:0.5,0.1" or "lognormal:-1,0.5".
+    """
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    params = [float(v) for v in params.split(",")]
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(params[0], params[1])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+class MockResponder:
+    """
+    Scripted stand-in for the chat model. The first rule whose pattern matches the prompt
+    writes the answer; every random draw comes from an RNG seeded by (seed, request, sample),
+    so a run is reproducible regardless of call order or concurrency.
+    """
+    NAMES = ("Alex", "Bob", "Cindy", "David", "Eric")
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.rules = [
+            (r"extract the bidding price chosen by each player", self.parse_all_bids),
+            (r"extract the number chosen by player", self.parse_number),
+            (r"extract a prediction of the number chosen by each player", self.parse_predictions),
+            (r"Mode: dual/marketplace/seller", self.platform_mode),
+            (r"Commission: value", self.platform_commission),
+            (r"Innovation: value", self.platform_innovation),
+            (r"Imitate: yes/no", self.platform_imitation),
+            (r"Price: value", self.platform_price),
+            (r"PlatformPrice: x, DirectPrice: y", self.platform_seller_prices),
+            (r"DisplayShare: value", self.platform_display),
+            (r"summarize the experience|suggestion to optimize", self.advice),
+            (r"integer between 1 and 100|what number will you give|answer a number", self.choose_number),
+            (r"provide your bid|bidding strategy", self.water_bid),
+        ]
+
+    def rng(self, key):
+        return random.Random(f"{self.seed}:{key}")
+
+    def respond(self, messages, rng):
+        prompt = messages[-1]["content"] if messages else ""
+        context = "\n".join(m["content"] for m in messages[:1]) + "\n" + prompt
+        for pattern, handler in self.rules:
+            if re.search(pattern, context, re.IGNORECASE):
+                return handler(prompt, rng)
+        return self.choose_number(prompt, rng)
+
+    # ---- G08A / k-level reasoning ---- #
+    def choose_number(self, prompt, rng):
+        return f"Considering the previous rounds, I choose {rng.randint(1, 100)}."
+
+    def parse_number(self, prompt, rng):
+        numbers = re.findall(r"\d+", prompt)
+        return numbers[-1] if numbers else "0"
+
+    def parse_predictions(self, prompt, rng):
+        return json.dumps({name: rng.randint(1, 100) for name in self.NAMES[1:]})
+
+    def as_json(self, content):
+        """
+        Answer of a JSON-mode request (`response_format={"type": "json_object"}`).
+        """
+        try:
+            json.loads(content)
+            return content
+        except ValueError:
+            numbers = re.findall(r"\d+", content)
+            return json.dumps({"bid": int(numbers[-1]) if numbers else 0, "reason": content})
+
+    def advice(self, prompt, rng):
+        return "Choose a number a little below 0.8 times the expected average of the other players."
+
+    # ---- Survival auction / water allocation ---- #
+    def water_bid(self, prompt, rng):
+        balance = re.search(r"BALANCE:\s*(-?\d+)", prompt)
+        upper = max(0, int(balance.group(1))) if balance else 100
+        return f"To survive today I will bid ${rng.randint(0, upper)} for today's water resource auction."
+
+    def parse_all_bids(self, prompt, rng):
+        bids = {}
+        for name in self.NAMES:
+            match = re.search(rf"{name}:.*?\$?(\d+)", prompt, re.DOTALL)
+            if match:
+                bids[name] = int(match.group(1))
+        return json.dumps(bids)
+
+    # ---- Platform game ---- #
+    def platform_mode(self, prompt, rng):
+        allowed = re.search(r"Available modes: ([\w, ]+)\.", prompt)
+        modes = allowed.group(1).split(", ") if allowed else ["dual", "marketplace", "seller"]
+        return f"Mode: {rng.choice(modes)}"
+
+    def platform_commission(self, prompt, rng):
+        upper = re.search(r"b=\s*(\d+(\.\d+)?)", prompt)
+        return f"Commission: {rng.uniform(0, float(upper.group(1)) if upper else 10):.2f}"
+
+    def platform_innovation(self, prompt, rng):
+        bounds = re.search(r"≥ (\d+(\.\d+)?), ≤ (\d+(\.\d+)?)", prompt)
+        low, high = (float(bounds.group(1)), float(bounds.group(3))) if bounds else (5.0, 60.0)
+        return f"Innovation: {rng.uniform(low, high):.1f}"
+
+    def platform_imitation(self, prompt, rng):
+        return f"Imitate: {rng.choice(['yes', 'no'])}"
+
+    def platform_price(self, prompt, rng):
+        upper = re.search(r"≤ (\d+(\.\d+)?)", prompt)
+        return f"Price: {rng.uniform(0, float(upper.group(1)) if upper else 20):.2f}"
+
+    def platform_seller_prices(self, prompt, rng):
+        price = rng.uniform(0, 30)
+        return f"PlatformPrice: {price:.2f}, DirectPrice: {rng.uniform(0, price):.2f}"
+
+    def platform_display(self, prompt, rng):
+        return f"DisplayShare: {rng.random():.2f}"
+
+
+class MockPrefixCache:
+    """
+    Imitation of DeepSeek's prompt caching: the longest message prefix of a request that was
+    part of an earlier request counts as cached, in whole blocks of `block` tokens. Like the
+    provider's cache it forgets: only the `capacity` most recently used prefixes are kept.
+    """
+    def __init__(self, block=64, capacity=4096):
+        self.block = block
+        self.capacity = capacity
+        self.seen = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def lookup(self, messages):
+        prefix = hashlib.sha256()
+        tokens = 0
+        hit = 0
+        with self.lock:
+            for message in messages:
+                prefix.update(json.dumps(message, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+                tokens += len(str(message.get("content", ""))) // 4
+                digest = prefix.hexdigest()
+                if digest in self.seen:
+                    hit = tokens
+                    self.seen.move_to_end(digest)
+                else:
+                    self.seen[digest] = True
+                    if len(self.seen) > self.capacity:
+                        self.seen.popitem(last=False)
+        return hit // self.block * self.block
+
+
+def prefix_cache():
+    """
+    The `MockPrefixCache` of the calling run, which `response_cache.start_run` starts empty.
+    """
+    run = current_run()
+    return run.get("prefixes") or run.setdefault("prefixes", MockPrefixCache())
+
+
+class MockClient:
+    """
+    Offline replacement for `OpenAI()` used to profile the game engines without the network.
+    """
+    def __init__(self, seed=0, latency="0"):
+        self.responder = MockResponder(seed)
+        self.latency = parse_latency(latency)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _complete(self, request, sample=None):
+        key = ResponseCache.make_key(request)
+        if sample is None:
+            sample = next_sample("mock", key)
+        rng = self.responder.rng(f"{key}:{sample}")
+        content = self.responder.respond(request.get("messages", []), rng)
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            content = self.responder.as_json(content)
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in request.get("messages", []))
+        cached_tokens = prefix_cache().lookup(request.get("messages", []))
+        completion_tokens = len(content) // 4
+        response = to_namespace({
+            "id": f"mock-{key[:16]}-{sample}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_cache_hit_tokens": cached_tokens,
+                "prompt_cache_miss_tokens": prompt_tokens - cached_tokens,
+            },
+        })
+        return response, self.latency(rng)
+
+    def create(self, **request):
+        response, delay = self._complete(request)
+        if delay:
+            time.sleep(delay)
+        return response
+
+
+class AsyncMockClient(MockClient):
+    async def create(self, **request):
+        response, delay = self._complete(request)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
@@ -5,7 +5,10 @@ import re
 from dataclasses import dataclass
 from typing import Dict, Tuple
 
+import numpy as np
+
 from Alympics import PlayGround, Player, LLM
+from llm_backend import call_tags, tagged
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -32,19 +35,105 @@ class RegulationConfig:
     ban_self_preferencing: bool = False
 
 
+MODES = ("dual", "marketplace", "seller")
+
+
+def mode_codes(mode) -> np.ndarray:
+    """Index into MODES of every entry of mode (mode names or codes)."""
+    mode = np.asarray(mode)
+    if mode.dtype.kind in "iu":
+        return mode
+    codes = np.full(mode.shape, -1)
+    for code, name in enumerate(MODES):
+        codes[mode == name] = code
+    if (codes < 0).any():
+        raise ValueError(f"Unknown mode in {np.unique(mode[codes < 0])}, expected one of {MODES}")
+    return codes
+
+
+def settle_batch(
+    config: GameConfig,
+    mode,
+    commission,
+    innovation,
+    imitation,
+    price_M,
+    price_S_platform,
+    price_S_direct,
+    display_share,
+) -> Dict[str, np.ndarray]:
+    """Closed-form outcome of many strategy profiles at once.
+
+    Every argument is an array (or scalar) broadcast against the others, mode holds names or
+    MODES codes. Consumers aware of S choose the best of M, S on the platform, S direct and the
+    fringe product, unaware consumers choose between M and the fringe; ties go to the option
+    listed first. Returns arrays of sales, profits and innovation cost with the broadcast shape.
+    """
+    mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct, display_share = np.broadcast_arrays(
+        mode_codes(mode),
+        np.asarray(commission, dtype=float),
+        np.asarray(innovation, dtype=float),
+        np.asarray(imitation, dtype=bool),
+        np.asarray(price_M, dtype=float),
+        np.asarray(price_S_platform, dtype=float),
+        np.asarray(price_S_direct, dtype=float),
+        np.asarray(display_share, dtype=float),
+    )
+    dual, marketplace, seller = (mode == code for code in range(len(MODES)))
+
+    value_M = config.base_value + np.where(imitation, innovation, config.sigma) + config.convenience
+    value_S_platform = config.base_value + innovation + config.convenience
+    value_S_direct = config.base_value + innovation
+    net_M = np.where(dual | seller, value_M - price_M, -np.inf)
+    net_S_platform = np.where(dual | marketplace, value_S_platform - price_S_platform, -np.inf)
+    net_S_direct = np.where(dual | marketplace, value_S_direct - price_S_direct, -np.inf)
+    fringe = np.zeros_like(net_M)
+
+    aware_share = np.where(marketplace, 1.0, np.where(seller, 0.0, display_share))
+    unaware_share = 1.0 - aware_share
+
+    def allocate(options, share):
+        # the whole demand goes to the best option, nobody buys when it is the fringe (net utility 0)
+        options = np.stack(options)
+        best = options.argmax(axis=0)
+        best_net = np.take_along_axis(options, best[None], axis=0)[0]
+        quantity = np.clip(best_net / config.outside_option_scale, 0.0, 1.0) * share * config.market_size
+        quantity = np.where((share > 0.0) & (best_net > 0), quantity, 0.0)
+        return [np.where(best == i, quantity, 0.0) for i in range(len(options))]
+
+    aware_M, sales_S_platform, sales_S_direct, _ = allocate([net_M, net_S_platform, net_S_direct, fringe], aware_share)
+    unaware_M, _ = allocate([net_M, fringe], unaware_share)
+    sales_M = aware_M + unaware_M
+    innovation_cost = config.innovation_cost_scale * np.maximum(0.0, innovation - config.min_innovation) ** 2
+
+    profit_M = price_M * sales_M + commission * price_S_platform * sales_S_platform
+    profit_S = price_S_platform * (1 - commission) * sales_S_platform + price_S_direct * sales_S_direct - innovation_cost
+
+    return {
+        "sales_M": sales_M,
+        "sales_S_platform": sales_S_platform,
+        "sales_S_direct": sales_S_direct,
+        "profit_M": profit_M,
+        "profit_S": profit_S,
+        "innovation_cost": innovation_cost,
+    }
+
+
 class PlatformAgent(Player):
     def __init__(self, game_setting: str, name: str, role_desc: str):
         super().__init__(name, False, "")
         self.role_desc = role_desc
         self.balance = 0.0
         self.append_message("system", game_setting + "\n\n" + role_desc)
+        self.history.pin()
         self.llm = LLM()
 
+    @tagged("decide")
     def decide(self, round_id: int, context: str, decision_prompt: str) -> str:
         prompt = f"Round {round_id}. {context}\n{decision_prompt}"
         self.append_message("user", prompt)
         logger.info("Asking %s: %s", self.name, prompt)
-        response = self.llm.call(self.history)
+        response = self.llm.call(self.history.render())
         self.append_message("assistant", response)
         logger.info("%s response: %s", self.name, response)
         return response
@@ -59,12 +148,14 @@ class PlatformGame(PlayGround):
         game_setting: str,
         config: GameConfig | None = None,
         regulation: RegulationConfig | None = None,
+        equilibrium: Dict | None = None,
     ) -> None:
         super().__init__()
         self.game_setting = game_setting
         self.config = config or GameConfig()
         self.regulation = regulation or RegulationConfig()
         self.round_records: list[Dict[str, float | str | bool]] = []
+        self._equilibrium = equilibrium  # solved on first use unless given, e.g. by a sweep
 
         self.player_M = PlatformAgent(
             game_setting,
@@ -117,13 +208,6 @@ class PlatformGame(PlayGround):
         return default
 
     # ---------------- Economic primitives ---------------- #
-    def _cdf(self, net_utility: float) -> float:
-        return max(0.0, min(1.0, net_utility / self.config.outside_option_scale))
-
-    def _innovation_cost(self, innovation: float) -> float:
-        delta = max(0.0, innovation - self.config.min_innovation)
-        return self.config.innovation_cost_scale * (delta ** 2)
-
     def _clip(self, value: float, lower: float, upper: float) -> float:
         return max(lower, min(upper, value))
 
@@ -132,24 +216,12 @@ class PlatformGame(PlayGround):
             return ("marketplace", "seller")
         return ("dual", "marketplace", "seller")
 
-    def _allocate_sales(self, options: Dict[str, float], share: float) -> Dict[str, float]:
-        if share <= 0.0 or not options:
-            return {label: 0.0 for label in options}
-        best_label = max(options, key=options.get)
-        best_net = options[best_label]
-        if best_net <= 0:
-            return {label: 0.0 for label in options}
-        demand_share = self._cdf(best_net) * share
-        quantity = demand_share * self.config.market_size
-        result = {label: 0.0 for label in options}
-        result[best_label] = quantity
-        return result
-
     # ---------------- Game loop ---------------- #
     def run_game(self, rounds: int = 5):
         for round_id in range(1, rounds + 1):
             logger.info("--- Round %s ---", round_id)
-            self._play_round(round_id)
+            with call_tags(round=round_id):
+                self._play_round(round_id)
 
     def _play_round(self, round_id: int):
         allowed_modes = self._available_modes()
@@ -259,24 +331,26 @@ class PlatformGame(PlayGround):
         logger.info(summary)
         self.player_M.append_message("user", summary)
         self.player_S.append_message("user", summary)
-        self.round_records.append(
-            {
-                "round": round_id,
-                "mode": mode,
-                "commission": commission,
-                "innovation": innovation,
-                "imitation": imitation,
-                "display_share": display_bias,
-                "price_M": price_M,
-                "price_S_platform": price_S_platform,
-                "price_S_direct": price_S_direct,
-                "profit_M": outcome["profit_M"],
-                "profit_S": outcome["profit_S"],
-                "sales_M": outcome["sales_M"],
-                "sales_S_platform": outcome["sales_S_platform"],
-                "sales_S_direct": outcome["sales_S_direct"],
-            }
-        )
+        for player in (self.player_M, self.player_S):
+            player.history.close_round(summary.replace("\n", "; "))
+        record = {
+            "round": round_id,
+            "mode": mode,
+            "commission": commission,
+            "innovation": innovation,
+            "imitation": imitation,
+            "display_share": display_bias,
+            "price_M": price_M,
+            "price_S_platform": price_S_platform,
+            "price_S_direct": price_S_direct,
+            "profit_M": outcome["profit_M"],
+            "profit_S": outcome["profit_S"],
+            "sales_M": outcome["sales_M"],
+            "sales_S_platform": outcome["sales_S_platform"],
+            "sales_S_direct": outcome["sales_S_direct"],
+        }
+        record["distance_to_equilibrium"] = self.distance_to_equilibrium(record)
+        self.round_records.append(record)
 
     def _settle_round(
         self,
@@ -290,56 +364,25 @@ class PlatformGame(PlayGround):
         price_S_direct: float,
         display_bias: float,
     ) -> Dict[str, float]:
-        value_M = self.config.base_value + (innovation if imitation else self.config.sigma) + self.config.convenience
-        value_S_platform = self.config.base_value + innovation + self.config.convenience
-        value_S_direct = self.config.base_value + innovation
-        net_M = value_M - price_M if mode in {"dual", "seller"} else float("-inf")
-        net_S_platform = value_S_platform - price_S_platform if mode in {"dual", "marketplace"} else float("-inf")
-        net_S_direct = value_S_direct - price_S_direct if mode in {"dual", "marketplace"} else float("-inf")
-
-        if mode == "marketplace":
-            aware_share = 1.0
-            unaware_share = 0.0
-        elif mode == "seller":
-            aware_share = 0.0
-            unaware_share = 1.0
-        else:
-            aware_share = display_bias
-            unaware_share = 1.0 - display_bias
-
-        aware_sales = self._allocate_sales(
-            {
-                "platform": net_M,
-                "seller_platform": net_S_platform,
-                "seller_direct": net_S_direct,
-                "fringe": 0.0,
-            },
-            aware_share,
-        )
-        unaware_sales = self._allocate_sales(
-            {
-                "platform": net_M,
-                "fringe": 0.0,
-            },
-            unaware_share,
+        outcome = self.settle_batch(
+            mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct, display_bias
         )
+        return {**{key: float(value) for key, value in outcome.items()}, "round": round_id}
 
-        sales_M = aware_sales.get("platform", 0.0) + unaware_sales.get("platform", 0.0)
-        sales_S_platform = aware_sales.get("seller_platform", 0.0)
-        sales_S_direct = aware_sales.get("seller_direct", 0.0)
-        innovation_cost = self._innovation_cost(innovation)
+    @property
+    def equilibrium(self) -> Dict:
+        """Subgame-perfect equilibrium of one round under this game's configuration and regulation."""
+        if self._equilibrium is None:
+            from equilibrium import solve  # equilibrium imports this module
 
-        profit_M = price_M * sales_M + commission * price_S_platform * sales_S_platform
-        profit_S = (
-            price_S_platform * (1 - commission) * sales_S_platform + price_S_direct * sales_S_direct - innovation_cost
-        )
+            self._equilibrium = solve(self.config, self.regulation)
+        return self._equilibrium
 
-        return {
-            "sales_M": sales_M,
-            "sales_S_platform": sales_S_platform,
-            "sales_S_direct": sales_S_direct,
-            "profit_M": profit_M,
-            "profit_S": profit_S,
-            "innovation_cost": innovation_cost,
-            "round": round_id,
-        }
+    def distance_to_equilibrium(self, record: Dict) -> float:
+        from equilibrium import distance
+
+        return distance(record, self.equilibrium, self.config)
+
+    def settle_batch(self, *profiles) -> Dict[str, np.ndarray]:
+        """settle_batch with this game's configuration, for best-response and welfare analysis."""
+        return settle_batch(self.config, *profiles)
@@ -0,0 +1,169 @@
+"""
+Content-addressed response cache of the chat completions, and the runs that number repeated requests.
+
+The n-th identical request of a run is its n-th sample (`next_sample`): it has a cache key and
+a mock answer of its own, so a rerun of the same games replays the same samples in the same order.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+
+def to_namespace(value):
+    """
+    Turn a (cached) JSON response into an object with attribute access,
+    e.g. `response.choices[0].message.content`.
+    """
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(v) for v in value]
+    return value
+
+
+def to_dict(response):
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json")
+    if isinstance(response, SimpleNamespace):
+        return {k: to_dict(v) for k, v in vars(response).items()}
+    if isinstance(response, list):
+        return [to_dict(v) for v in response]
+    return response
+
+
+class ResponseCache:
+    """
+    Content-addressed response cache backed by SQLite.
+
+    Keys hash the whole request (model, messages, temperature, top_p, max_tokens, ...) plus
+    a sample index, so the n-th identical request of a run replays the n-th stored sample.
+    The file is bounded to `max_bytes` and evicts the least recently used entries.
+    """
+    def __init__(self, path, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, size INTEGER, last_access REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_env(cls):
+        """
+        Cache configured by ALYMPICS_CACHE (file path) and ALYMPICS_CACHE_MAX_MB, None when unset.
+        """
+        path = os.getenv("ALYMPICS_CACHE")
+        if not path:
+            return None
+        return cls(path, max_bytes=int(float(os.getenv("ALYMPICS_CACHE_MAX_MB", "1024")) * (1 << 20)))
+
+    @staticmethod
+    def make_key(request, sample=0):
+        payload = json.dumps({"request": request, "sample": sample}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET last_access=? WHERE key=?", (time.time(), key))
+            self.db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        data = json.dumps(response, ensure_ascii=False)
+        with self.lock:
+            old = self.db.execute("SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, data, len(data), time.time()))
+            self.total_bytes += len(data) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        # drop least recently used entries until the cache is back under 90% of its budget
+        target = self.max_bytes * 0.9
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            self.db.execute("DELETE FROM responses WHERE key=?", (key,))
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """
+    Process-wide cache shared by every client, see `ResponseCache.from_env`.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache.from_env() or False
+    return _default_cache or None
+
+
+# Count of identical requests ("samples": cache keys, "mock": mock answers) and the mock prefix
+# cache (see `mock_backend.prefix_cache`) of the current run, shared by all clients. A thread
+# that did not call `start_run` gets a fresh run on first use.
+_run = contextvars.ContextVar("alympics_run", default=None)
+_samples_lock = threading.Lock()
+
+
+def start_run(replicate=0):
+    """
+    Start an independent run (e.g. one seed of an experiment) in the calling thread: the sample
+    counters of repeated requests restart from zero, and for replicate != 0 the samples are
+    tagged so that the run gets its own cache entries and mock answers. Replicate 0 is the
+    default run, which keeps the keys of a plain single run. The mock prefix cache starts empty,
+    so no run sees cache hits from the prompts of another.
+    """
+    _run.set({"replicate": replicate, "samples": {}, "mock": {}})
+
+
+def current_run():
+    """
+    The run of the calling context, the default run (replicate 0) of its own if none was started.
+    """
+    if _run.get() is None:
+        start_run()
+    return _run.get()
+
+
+def next_sample(counter, key):
+    run = current_run()
+    with _samples_lock:
+        sample = run[counter].get(key, 0)
+        run[counter][key] = sample + 1
+    return f"{run['replicate']}:{sample}" if run["replicate"] else sample
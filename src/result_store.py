@@ -0,0 +1,120 @@
+"""
+Columnar store of game results.
+
+The k-reasoning games import this module from here (their `paths.py` puts src/ on `sys.path`).
+
+The numeric tables of a game (bids, winners, HP, balances, profits, ...) are written as one
+NumPy .npz shard per game and table, the transcripts (messages, reasoning logs) as one gzipped
+JSON blob per game. Shards are written once and never modified, so games played by parallel
+workers go to the same store without locking, and a reader loads only the columns it asks for
+(an .npz member is read only when accessed).
+
+    root/
+        games/<game>.json            meta data, written last: the game is complete
+        <table>/<game>.npz           one array per column
+        transcripts/<game>.json.gz
+
+    store = ResultStore("result")
+    store.write("kr_VS_agent_0", {"bids": {"player": [...], "round": [...], "bid": [...]}}, transcript, meta)
+    bids = store.read("bids", ["player", "bid"], games="kr_VS_agent*")
+"""
+import fnmatch
+import gzip
+import json
+import os
+
+import numpy as np
+
+MARKER = "store.json"
+
+
+def _replace(path, write, mode="w"):
+    """
+    Write path through a temporary file, so readers never see a partial file.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, mode) as fout:
+        write(fout)
+    os.replace(tmp_path, path)
+
+
+class ResultStore:
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def exists(root):
+        return os.path.exists(os.path.join(root, MARKER))
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write(self, game, tables, transcript=None, meta=None):
+        """
+        Store one game. `tables` maps table names to {column: equal-length sequence}.
+        """
+        for directory in [*tables, "transcripts", "games"]:
+            os.makedirs(self._path(directory), exist_ok=True)
+        if not os.path.exists(self._path(MARKER)):
+            _replace(self._path(MARKER), lambda fout: json.dump({"format": "npz", "version": 1}, fout))
+
+        for table, columns in tables.items():
+            arrays = {name: np.asarray(values) for name, values in columns.items()}
+            if len({len(array) for array in arrays.values()}) > 1:
+                raise ValueError(f"columns of table {table} have different lengths")
+            for name, array in arrays.items():
+                if array.dtype == object:
+                    raise ValueError(f"column {name} of table {table} mixes types, store numbers, booleans or strings")
+            _replace(self._path(table, f"{game}.npz"), lambda fout: np.savez(fout, **arrays), "wb")
+        if transcript is not None:
+            def dump(fout):
+                with gzip.open(fout, "wt", encoding="utf-8") as blob:
+                    json.dump(transcript, blob)
+            _replace(self._path("transcripts", f"{game}.json.gz"), dump, "wb")
+        meta = {**(meta or {}), "tables": list(tables), "transcript": transcript is not None}
+        _replace(self._path("games", f"{game}.json"), lambda fout: json.dump(meta, fout, indent=1))
+
+    def has(self, game):
+        return os.path.exists(self._path("games", f"{game}.json"))
+
+    def games(self, pattern="*"):
+        """
+        Complete games whose name matches the glob `pattern`, sorted.
+        """
+        if not os.path.isdir(self._path("games")):
+            return []
+        names = [name[:-len(".json")] for name in os.listdir(self._path("games")) if name.endswith(".json")]
+        return sorted(fnmatch.filter(names, pattern))
+
+    def meta(self, game):
+        with open(self._path("games", f"{game}.json")) as fin:
+            return json.load(fin)
+
+    def read(self, table, columns=None, games="*"):
+        """
+        Rows of `table` of the given games (a glob pattern or a list of names), as
+        {column: array} with an extra "game" column. Only `columns` (default all) are loaded.
+        """
+        names = self.games(games) if isinstance(games, str) else list(games)
+        parts = {}
+        for game in names:
+            path = self._path(table, f"{game}.npz")
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as shard:
+                wanted = shard.files if columns is None else columns
+                length = None
+                for column in wanted:
+                    array = shard[column]
+                    parts.setdefault(column, []).append(array)
+                    length = len(array)
+                if length is None:
+                    length = len(shard[shard.files[0]]) if shard.files else 0
+            parts.setdefault("game", []).append(np.full(length, game))
+        if not parts:
+            return {column: np.array([]) for column in [*(columns or []), "game"]}
+        return {column: np.concatenate(arrays) for column, arrays in parts.items()}
+
+    def transcript(self, game):
+        with gzip.open(self._path("transcripts", f"{game}.json.gz"), "rt", encoding="utf-8") as fin:
+            return json.load(fin)
@@ -1,5 +1,6 @@
 import argparse
 
+from llm_backend import call_summary, configure, format_call_summary, start_trace, write_chrome_trace
 from platform_game import GameConfig, PlatformGame, RegulationConfig
 
 # 基于论文内容的 Game Setting Prompt
@@ -44,7 +45,21 @@ def main():
     parser.add_argument('--ban-dual', action='store_true', help='Ban M from entering the dual mode (forces seller/marketplace choice).')
     parser.add_argument('--ban-imitation', action='store_true', help='Forbid product imitation in dual mode.')
     parser.add_argument('--ban-self-preferencing', action='store_true', help='Force the platform to show S whenever it lists on the marketplace.')
+    parser.add_argument('--backend', choices=['openai', 'mock'], default=None, help='Completion backend (default: $ALYMPICS_BACKEND or openai).')
+    parser.add_argument('--mock-latency', type=str, default=None, dest='mock_latency', help='Latency of the mock backend, e.g. 0, fixed:0.2, uniform:0.1,0.5.')
+    parser.add_argument('--trace', type=str, default=None, help='Write every completion (player, round, purpose, tokens, latency) to this Chrome trace JSON file.')
+    parser.add_argument('--sweep', type=str, action='append', default=[], help="Sweep a GameConfig field, 'sigma=0:20:5' (5 values from 0 to 20, a Latin-hypercube range: 'sigma=0:20') or 'sigma=0,5,10'. Repeatable.")
+    parser.add_argument('--bans', type=str, default=None, help="Regulations to sweep, e.g. 'none,dual,imitation+self_preferencing' or 'all' combinations.")
+    parser.add_argument('--design', choices=['grid', 'lhs'], default='grid', help='Cartesian product of the sweep values or a Latin-hypercube sample.')
+    parser.add_argument('--samples', type=int, default=0, help='Design points of a Latin-hypercube sweep.')
+    parser.add_argument('--design-seed', type=int, default=0, dest='design_seed', help='Seed of the Latin-hypercube sample.')
+    parser.add_argument('--seeds', type=int, default=1, help='Runs of every sweep point, with seeds 0..N-1.')
+    parser.add_argument('--workers', type=int, default=1, help='Sweep runs played in parallel processes.')
+    parser.add_argument('--sweep-output', type=str, default='../exp/sweep.csv', dest='sweep_output', help='CSV the sweep rows are appended to.')
     args = parser.parse_args()
+    configure(backend=args.backend, latency=args.mock_latency)
+    if args.trace:
+        start_trace()
 
     config = GameConfig(
         base_value=args.base_value,
@@ -62,8 +77,20 @@ def main():
         ban_self_preferencing=args.ban_self_preferencing,
     )
 
+    if args.sweep or args.bans:
+        from sweep import run_sweep  # sweep imports this module for GAME_SETTING
+        run_sweep(args, config, regulation)
+        return
+
     game = PlatformGame(GAME_SETTING, config=config, regulation=regulation)
     game.run_game(rounds=args.round)
+    print("Equilibrium:", game.equilibrium)
+    for record in game.round_records:
+        print(f"Round {record['round']} distance to equilibrium: {record['distance_to_equilibrium']:.3f}")
+    print(format_call_summary(call_summary(by=())))
+    print(format_call_summary(call_summary(("player", "purpose"))))
+    if args.trace:
+        write_chrome_trace(args.trace)
 
 if __name__ == '__main__':
     main()
@@ -1,11 +1,17 @@
 import argparse
 import json
 import os
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from statistics import mean
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 
 import matplotlib.pyplot as plt
 
+from Alympics import LLM
+from equilibrium import solve_batch
+from llm_backend import BatchExecutor, LocalBatchEndpoint, OpenAIBatchEndpoint, configure, set_batch_executor, start_run
 from platform_game import GameConfig, PlatformGame, RegulationConfig
+from result_store import ResultStore
 from run import GAME_SETTING
 
 
@@ -16,25 +22,92 @@ DEFAULT_SCENARIOS: Dict[str, RegulationConfig] = {
 }
 
 
-def run_scenario(label: str, regulation: RegulationConfig, rounds: int, config: GameConfig):
+def run_scenario(label: str, regulation: RegulationConfig, rounds: int, config: GameConfig, seed: int = 0):
+    start_run(seed)
     game = PlatformGame(GAME_SETTING, config=config, regulation=regulation)
     game.run_game(rounds=rounds)
-    return [{**record, "scenario": label} for record in game.round_records]
-
-
-def build_plot(data: List[Dict], output_path: str):
+    return [{**record, "scenario": label, "seed": seed} for record in game.round_records]
+
+
+def _init_worker(backend: str | None, mock_latency: str | None, requests_per_minute: float):
+    configure(backend=backend, latency=mock_latency)
+    LLM.configure(requests_per_minute=requests_per_minute)
+
+
+def run_parallel(
+    fn: Callable,
+    jobs: Iterable[Tuple],
+    workers: int,
+    backend: str | None = None,
+    mock_latency: str | None = None,
+    batch: BatchExecutor | None = None,
+) -> Iterator[Tuple[Tuple, object]]:
+    """Run fn(*job) for every job, yielding (job, result or exception) as the jobs complete.
+
+    workers <= 1 runs the jobs one after another in this process; otherwise every worker
+    process uses the completion backend of the parent and a 1/workers share of its request rate.
+    With a batch executor all jobs run at once as threads whose completions go out in waves.
+    """
+    jobs = list(jobs)
+    if batch is not None:
+        with ThreadPoolExecutor(len(jobs)) as pool:
+            futures = {}
+            for job in jobs:
+                batch.add_game()
+                futures[pool.submit(batch.run, fn, *job)] = job
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as exc:
+                    yield futures[future], exc
+        return
+    if workers <= 1:
+        for job in jobs:
+            try:
+                yield job, fn(*job)
+            except Exception as exc:
+                yield job, exc
+        return
+
+    requests_per_minute = LLM.rate_limiter.rate * 60 / workers
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(backend, mock_latency, requests_per_minute)
+    ) as pool:
+        futures = {pool.submit(fn, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as exc:
+                yield futures[future], exc
+
+
+def write_json(data, path: str):
+    """Atomically replace path, so a partially written file is never left behind."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_plot(data: List[Dict], output_path: str, equilibria: Dict[str, Dict] | None = None):
     plt.figure(figsize=(8, 6))
     ax1 = plt.subplot(2, 1, 1)
     ax2 = plt.subplot(2, 1, 2, sharex=ax1)
 
     scenarios = sorted({entry["scenario"] for entry in data})
     for scenario in scenarios:
+        # average over seeds
         subset = [entry for entry in data if entry["scenario"] == scenario]
-        rounds = [entry["round"] for entry in subset]
-        profits_M = [entry["profit_M"] for entry in subset]
-        profits_S = [entry["profit_S"] for entry in subset]
-        ax1.plot(rounds, profits_M, marker="o", label=scenario)
-        ax2.plot(rounds, profits_S, marker="o", label=scenario)
+        rounds = sorted({entry["round"] for entry in subset})
+        profits_M = [mean(entry["profit_M"] for entry in subset if entry["round"] == r) for r in rounds]
+        profits_S = [mean(entry["profit_S"] for entry in subset if entry["round"] == r) for r in rounds]
+        line_M, = ax1.plot(rounds, profits_M, marker="o", label=scenario)
+        line_S, = ax2.plot(rounds, profits_S, marker="o", label=scenario)
+        if equilibria and scenario in equilibria:
+            # dashed: equilibrium profits of the scenario
+            ax1.axhline(equilibria[scenario]["profit_M"], color=line_M.get_color(), linestyle="--", alpha=0.6)
+            ax2.axhline(equilibria[scenario]["profit_S"], color=line_S.get_color(), linestyle="--", alpha=0.6)
 
     ax1.set_ylabel("Π_M (platform profit)")
     ax2.set_ylabel("π_S (seller profit)")
@@ -61,24 +134,86 @@ def main():
     )
     parser.add_argument("--output-data", type=str, default="exp/platform_game_results.json", help="Path to save raw data.")
     parser.add_argument("--output-plot", type=str, default="exp/platform_game_results.png", help="Path to save the plot.")
+    parser.add_argument("--output-equilibrium", type=str, default=None, help="Path to save the equilibrium of every scenario (default: next to --output-data).")
+    parser.add_argument(
+        "--output-store",
+        type=str,
+        default=None,
+        help="Result store directory: every finished run is added as its own shard and the raw data file is written once at the end.",
+    )
+    parser.add_argument("--seeds", type=int, default=1, help="Independent repetitions of every scenario.")
+    parser.add_argument("--workers", type=int, default=1, help="Scenario runs executed in parallel processes.")
+    parser.add_argument("--backend", choices=["openai", "mock"], default=None, help="Completion backend (default: $ALYMPICS_BACKEND or openai).")
+    parser.add_argument("--mock-latency", type=str, default=None, dest="mock_latency", help="Latency of the mock backend, e.g. 0, fixed:0.2, uniform:0.1,0.5.")
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=None,
+        help="Run all scenario runs at once and send their completions in waves through a batch endpoint, with the wave files in this directory.",
+    )
+    parser.add_argument(
+        "--batch-endpoint",
+        choices=["local", "openai"],
+        default="local",
+        dest="batch_endpoint",
+        help="Batch endpoint of --batch: a local stand-in answering with the backend, or the OpenAI-compatible Batch API.",
+    )
     args = parser.parse_args()
+    configure(backend=args.backend, latency=args.mock_latency)
+    batch = None
+    if args.batch:
+        batch = BatchExecutor(args.batch, OpenAIBatchEndpoint() if args.batch_endpoint == "openai" else LocalBatchEndpoint())
+        set_batch_executor(batch)
+        # the waves are paced by the batch endpoint, not by the per-request limits
+        LLM.configure(max_concurrency=1 << 20, requests_per_minute=0)
 
     selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
     config = GameConfig()
 
-    all_records: List[Dict] = []
     for label in selected:
         if label not in DEFAULT_SCENARIOS:
             raise ValueError(f"Unknown scenario '{label}'. Available keys: {', '.join(DEFAULT_SCENARIOS)}")
-        scenario_records = run_scenario(label, DEFAULT_SCENARIOS[label], args.rounds, config)
-        all_records.extend(scenario_records)
+    equilibria = dict(zip(selected, solve_batch([config] * len(selected), [DEFAULT_SCENARIOS[label] for label in selected])))
+    output_equilibrium = args.output_equilibrium or os.path.splitext(args.output_data)[0] + "_equilibrium.json"
+    write_json(equilibria, output_equilibrium)
 
-    os.makedirs(os.path.dirname(args.output_data), exist_ok=True)
-    with open(args.output_data, "w", encoding="utf-8") as f:
-        json.dump(all_records, f, indent=2)
+    jobs = [(label, DEFAULT_SCENARIOS[label], args.rounds, config, seed) for label in selected for seed in range(args.seeds)]
+    order = {(job[0], job[4]): i for i, job in enumerate(jobs)}
 
-    build_plot(all_records, args.output_plot)
+    store = ResultStore(args.output_store) if args.output_store else None
+    all_records: List[Dict] = []
+    failed = 0
+    for done, (job, result) in enumerate(run_parallel(run_scenario, jobs, args.workers, args.backend, args.mock_latency, batch), 1):
+        label, seed = job[0], job[4]
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"[{done}/{len(jobs)}] {label} seed={seed} failed: {result!r}")
+            continue
+        all_records.extend(result)
+        all_records.sort(key=lambda entry: (order[entry["scenario"], entry["seed"]], entry["round"]))
+        if store:
+            columns = {name: [entry[name] for entry in result] for name in result[0]} if result else {}
+            store.write(f"{label}_{seed}", {"rounds": columns}, meta={"scenario": label, "seed": seed, "rounds": args.rounds})
+        else:
+            write_json(all_records, args.output_data)
+        print(f"[{done}/{len(jobs)}] {label} seed={seed} done")
+
+    if not all_records:
+        raise RuntimeError("All scenario runs failed.")
+    if store:
+        write_json(all_records, args.output_data)
+    if failed:
+        print(f"{failed} of {len(jobs)} runs failed, their records are missing.")
+
+    build_plot(all_records, args.output_plot, equilibria)
+    for label in selected:
+        distances = [entry["distance_to_equilibrium"] for entry in all_records if entry["scenario"] == label]
+        if distances:
+            print(f"{label}: mean distance to equilibrium {mean(distances):.3f}")
     print(f"Saved raw data to {args.output_data}")
+    print(f"Saved equilibria to {output_equilibrium}")
+    if store:
+        print(f"Saved run tables to {args.output_store}")
     print(f"Saved plot to {args.output_plot}")
 
 
@@ -0,0 +1,203 @@
+"""Parameter sweeps of the platform game over GameConfig fields and regulation bans.
+
+Every design point (a GameConfig and a RegulationConfig) is played once per seed in a shared
+worker pool (`run_experiments.run_parallel`). Each finished run is appended to one CSV with a
+column per GameConfig field, ban flag and round-record field, so an interrupted sweep resumes
+by re-running the same command: runs already in the file are skipped. A run is identified by a
+hash of its GameConfig, RegulationConfig, rounds and seed (the "run" column), not by its position
+in the design, so a resumed sweep never mistakes one design point for another. A file written by
+a different sweep (other columns, or runs that are not part of this design) is not appended to.
+
+    python run.py --sweep sigma=0:20:5 --sweep convenience=5,10,15 --bans none,self_preferencing,dual \\
+        --seeds 3 --workers 4 --sweep-output ../exp/sweep.csv
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import itertools
+import json
+import os
+from dataclasses import asdict, fields, replace
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from equilibrium import solve_batch
+from llm_backend import start_run
+from platform_game import GameConfig, PlatformGame, RegulationConfig
+from run import GAME_SETTING
+from run_experiments import run_parallel
+
+BANS = {
+    "dual": "ban_dual_mode",
+    "imitation": "ban_imitation",
+    "self_preferencing": "ban_self_preferencing",
+}
+
+
+def parse_values(spec: str) -> Tuple[str, object]:
+    """Parse 'field=a:b:n' (n values from a to b, n defaults to 5) or 'field=v1,v2,...' into
+    (field, values). A range is kept as (a, b, n) so the Latin-hypercube design can sample inside it.
+    """
+    name, _, values = spec.partition("=")
+    names = [f.name for f in fields(GameConfig)]
+    if name not in names:
+        raise ValueError(f"Unknown GameConfig field '{name}', choose from {', '.join(names)}")
+    kind = type(getattr(GameConfig(), name))
+    if ":" in values:
+        low, high, count = (values.split(":") + ["5"])[:3]
+        return name, (kind(low), kind(high), int(count))
+    return name, [kind(value) for value in values.split(",") if value]
+
+
+def parse_bans(spec: str) -> List[RegulationConfig]:
+    """Parse 'none,dual,imitation+self_preferencing' (or 'all' for every combination) into regulations."""
+    if spec == "all":
+        combos = [combo for r in range(len(BANS) + 1) for combo in itertools.combinations(BANS, r)]
+    else:
+        combos = [[] if item == "none" else item.split("+") for item in spec.split(",") if item]
+    regulations = []
+    for combo in combos:
+        for ban in combo:
+            if ban not in BANS:
+                raise ValueError(f"Unknown ban '{ban}', choose from none, {', '.join(BANS)}")
+        regulations.append(RegulationConfig(**{BANS[ban]: True for ban in combo}))
+    return regulations
+
+
+def _grid_values(values) -> List:
+    if isinstance(values, tuple):
+        low, high, count = values
+        return [type(low)(value) for value in np.linspace(low, high, count)]
+    return values
+
+
+def build_design(
+    base: GameConfig,
+    sweep: Dict[str, object],
+    regulations: Sequence[RegulationConfig],
+    design: str = "grid",
+    samples: int = 0,
+    seed: int = 0,
+) -> List[Tuple[GameConfig, RegulationConfig]]:
+    """Design points of a sweep: the Cartesian product of all values ("grid"), or `samples`
+    Latin-hypercube points ("lhs"), where every range and list (including the regulations)
+    is split into `samples` strata and each stratum is used exactly once."""
+    if design == "grid":
+        names = list(sweep)
+        points = []
+        for values in itertools.product(*(_grid_values(sweep[name]) for name in names)):
+            config = replace(base, **dict(zip(names, values)))
+            points.extend((config, regulation) for regulation in regulations)
+        return points
+    if design != "lhs":
+        raise ValueError(f"Unknown design '{design}', expected grid or lhs")
+    if samples <= 0:
+        raise ValueError("A Latin-hypercube design needs --samples > 0")
+    rng = np.random.default_rng(seed)
+
+    def strata():
+        return (rng.permutation(samples) + rng.random(samples)) / samples
+
+    columns = {}
+    for name, values in sweep.items():
+        if isinstance(values, tuple):
+            low, high, _ = values
+            columns[name] = [type(low)(value) for value in low + strata() * (high - low)]
+        else:
+            columns[name] = [values[int(u * len(values))] for u in strata()]
+    chosen = [regulations[int(u * len(regulations))] for u in strata()]
+    return [
+        (replace(base, **{name: column[i] for name, column in columns.items()}), chosen[i])
+        for i in range(samples)
+    ]
+
+
+def run_key(config: GameConfig, regulation: RegulationConfig, rounds: int, seed: int) -> str:
+    """Identifier of one run, the same for the same parameters whatever the design they are part of."""
+    params = {"config": asdict(config), "regulation": asdict(regulation), "rounds": rounds, "seed": seed}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+POINT_COLUMNS = ["run", "seed"] + [f.name for f in fields(GameConfig)] + [f.name for f in fields(RegulationConfig)]
+SUMMARY_COLUMNS = ["equilibrium_mode", "equilibrium_profit_M", "equilibrium_profit_S"]
+
+
+def run_point(run_id: str, config: GameConfig, regulation: RegulationConfig, rounds: int, seed: int, equilibrium: Dict):
+    """Play one design point with one replicate seed, return its rows. Every design point uses
+    the same seeds, so differences between points are not drowned in sampling noise."""
+    start_run(seed)
+    game = PlatformGame(GAME_SETTING, config=config, regulation=regulation, equilibrium=equilibrium)
+    game.run_game(rounds=rounds)
+    point = {"run": run_id, "seed": seed, **asdict(config), **asdict(regulation)}
+    summary = {
+        "equilibrium_mode": equilibrium["mode"],
+        "equilibrium_profit_M": equilibrium["profit_M"],
+        "equilibrium_profit_S": equilibrium["profit_S"],
+    }
+    return [{**point, **record, **summary} for record in game.round_records]
+
+
+def _read_done(path: str) -> Tuple[List[str] | None, set]:
+    """Header and run keys of an existing sweep file."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None, set()
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return reader.fieldnames, {row["run"] for row in reader}
+
+
+def _check_resume(path: str, header: List[str] | None, done: set, keys: set) -> None:
+    """Refuse to append to a sweep file that was written with other columns or other parameters."""
+    if header is None:
+        return
+    if header[:len(POINT_COLUMNS)] != POINT_COLUMNS or header[-len(SUMMARY_COLUMNS):] != SUMMARY_COLUMNS:
+        raise ValueError(f"{path} has other columns than this sweep writes, choose another --sweep-output")
+    foreign = done - keys
+    if foreign:
+        raise ValueError(
+            f"{path} holds {len(foreign)} runs that are not part of this sweep (other parameters, rounds "
+            f"or seeds), re-run the command that wrote it or choose another --sweep-output"
+        )
+
+
+def run_sweep(args, base: GameConfig, base_regulation: RegulationConfig):
+    """Entry point of `run.py --sweep ...`."""
+    sweep = dict(parse_values(spec) for spec in args.sweep)
+    regulations = parse_bans(args.bans) if args.bans else [base_regulation]
+    points = build_design(base, sweep, regulations, args.design, args.samples, args.design_seed)
+    equilibria = solve_batch([config for config, _ in points], [regulation for _, regulation in points])
+
+    jobs = [
+        (run_key(config, regulation, args.round, seed), config, regulation, args.round, seed, equilibrium)
+        for (config, regulation), equilibrium in zip(points, equilibria)
+        for seed in range(args.seeds)
+    ]
+    header, done = _read_done(args.sweep_output)
+    _check_resume(args.sweep_output, header, done, {job[0] for job in jobs})
+    todo = [job for job in jobs if job[0] not in done]
+    print(f"{len(points)} design points x {args.seeds} seeds: {len(jobs) - len(todo)} runs done, {len(todo)} to run")
+    if not todo:
+        return
+
+    os.makedirs(os.path.dirname(args.sweep_output) or ".", exist_ok=True)
+    with open(args.sweep_output, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=header) if header else None
+        failed = 0
+        for count, (job, result) in enumerate(run_parallel(run_point, todo, args.workers, args.backend, args.mock_latency), 1):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"[{count}/{len(todo)}] run {job[0]} failed: {result!r}")
+                continue
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(result[0]))
+                writer.writeheader()
+            elif list(result[0]) != writer.fieldnames:
+                raise ValueError(f"{args.sweep_output} has other columns than this sweep writes, choose another --sweep-output")
+            writer.writerows(result)
+            f.flush()
+            print(f"[{count}/{len(todo)}] run {job[0]} done")
+    if failed:
+        print(f"{failed} runs failed, re-run the same command to retry them.")
+    print(f"Saved sweep results to {args.sweep_output}")
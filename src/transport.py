@@ -0,0 +1,359 @@
+"""
+Sending chat completions to the API endpoints.
+
+All clients of an endpoint share one SDK client and its keep-alive connection pool (`api_client`).
+Failed requests are retried by `RetryPolicy` (exponential backoff with jitter, Retry-After, caps),
+and a per-endpoint `CircuitBreaker` makes all callers pause together while the endpoint is saturated.
+A `TokenBucket` paces the requests that are sent.
+"""
+import asyncio
+import email.utils
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+from accounting import record_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+
+# Optional semaphore bounding the requests in flight, shared across processes by a scheduler.
+_request_gate = None
+
+
+def set_request_gate(gate):
+    """
+    Make every backend call acquire `gate` first, e.g. a `multiprocessing.BoundedSemaphore`
+    handed to the workers of a batch scheduler so that they share one API concurrency cap.
+    """
+    global _request_gate
+    _request_gate = gate
+
+
+# Connection pool and timeouts of the shared SDK clients, from ALYMPICS_HTTP_* variables.
+HTTP_SETTINGS = {
+    "max_connections": int(os.getenv("ALYMPICS_HTTP_MAX_CONNECTIONS", "100")),
+    "max_keepalive_connections": int(os.getenv("ALYMPICS_HTTP_KEEPALIVE", "20")),
+    "keepalive_expiry": float(os.getenv("ALYMPICS_HTTP_KEEPALIVE_EXPIRY", "60")),
+    "http2": os.getenv("ALYMPICS_HTTP2", "0") == "1",
+    "connect_timeout": float(os.getenv("ALYMPICS_HTTP_CONNECT_TIMEOUT", "10")),
+    "read_timeout": float(os.getenv("ALYMPICS_HTTP_READ_TIMEOUT", "120")),
+}
+_api_clients = {} # (base_url, api_key) -> OpenAI
+_async_api_clients = weakref.WeakKeyDictionary() # event loop -> {(base_url, api_key): AsyncOpenAI}
+_api_clients_lock = threading.Lock()
+
+
+def _http_options(is_async):
+    """
+    `timeout` and `http_client` arguments of an SDK client with the pool of HTTP_SETTINGS.
+    Without httpx (the transport of openai>=1) the SDK keeps its own default pool.
+    """
+    try:
+        import httpx
+    except ImportError:
+        return {"timeout": HTTP_SETTINGS["read_timeout"]}
+    http2 = HTTP_SETTINGS["http2"] and importlib.util.find_spec("h2") is not None
+    limits = httpx.Limits(
+        max_connections=HTTP_SETTINGS["max_connections"],
+        max_keepalive_connections=HTTP_SETTINGS["max_keepalive_connections"],
+        keepalive_expiry=HTTP_SETTINGS["keepalive_expiry"],
+    )
+    timeout = httpx.Timeout(HTTP_SETTINGS["read_timeout"], connect=HTTP_SETTINGS["connect_timeout"])
+    http_client = (httpx.AsyncClient if is_async else httpx.Client)(limits=limits, timeout=timeout, http2=http2)
+    return {"timeout": timeout, "http_client": http_client}
+
+
+def api_client(base_url=DEFAULT_BASE_URL, api_key=None, is_async=False):
+    """
+    The process-wide `OpenAI` (or `AsyncOpenAI`, one per event loop) client of an endpoint and
+    key, created on first use, so every player and game reuses its warm connections. The model
+    is a field of each request and does not need a client of its own.
+    """
+    key = (base_url, api_key)
+    with _api_clients_lock:
+        if is_async:
+            clients = _async_api_clients.setdefault(asyncio.get_running_loop(), {})
+        else:
+            clients = _api_clients
+        client = clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI, OpenAI
+            # retries are left to RetryPolicy, which also sees the errors of the other callers
+            client = clients[key] = (AsyncOpenAI if is_async else OpenAI)(api_key=api_key, base_url=base_url, max_retries=0, **_http_options(is_async))
+    return client
+
+
+RETRYABLE_STATUS = {408, 409, 425, 500, 502, 504}
+SATURATED_STATUS = {429, 503, 529}
+CONNECTION_ERRORS = {"APIConnectionError", "APITimeoutError"} # openai exceptions without a status code
+
+
+def retry_after(error):
+    """
+    Seconds the server asked to wait (Retry-After / retry-after-ms headers of the error's response), None if it did not.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by blocking and asyncio callers.
+
+    Tokens refill at `rate` per second up to `capacity`; each request takes one token and
+    waits (without holding any lock) until its reservation becomes valid.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate, capacity=None):
+        """
+        Change the limits in place, so clients holding the bucket follow them.
+        """
+        with self.lock:
+            self.rate = rate
+            if capacity is not None:
+                self.capacity = capacity
+                self.tokens = min(self.tokens, capacity)
+
+    def _reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    """
+    Which failed completions to repeat and how long to wait before each attempt.
+    """
+    def __init__(self, max_attempts=8, max_seconds=600.0, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.max_seconds = max_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.getenv("ALYMPICS_RETRY_ATTEMPTS", "8")),
+            max_seconds=float(os.getenv("ALYMPICS_RETRY_SECONDS", "600")),
+            base_delay=float(os.getenv("ALYMPICS_RETRY_BASE_DELAY", "1")),
+            max_delay=float(os.getenv("ALYMPICS_RETRY_MAX_DELAY", "60")),
+        )
+
+    @staticmethod
+    def classify(error):
+        """
+        "saturated" (rate limited or overloaded), "retry" (transient) or "fatal" (bad key,
+        context too long and other bad requests, bugs), which is raised at once.
+        """
+        status = getattr(error, "status_code", None)
+        if status in SATURATED_STATUS:
+            return "saturated"
+        if status in RETRYABLE_STATUS or (status is not None and status >= 500):
+            return "retry"
+        if status is not None:
+            return "fatal"
+        if any(cls.__name__ in CONNECTION_ERRORS for cls in type(error).__mro__):
+            return "retry"
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return "retry"
+        return "fatal"
+
+    def delay(self, attempt, wait=None):
+        """
+        Full-jitter exponential backoff before retry `attempt` (0-based), on top of `wait` (Retry-After)
+        so that callers told the same Retry-After do not all come back at once.
+        """
+        return (wait or 0.0) + random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, error, attempt, elapsed, breaker=None):
+        """
+        Seconds to wait before repeating the request that failed with `error`, None to give up.
+        """
+        kind = self.classify(error)
+        if kind == "fatal":
+            return None
+        wait = retry_after(error)
+        if kind == "saturated" and breaker is not None:
+            breaker.record_saturation(wait)
+        delay = self.delay(attempt, wait)
+        if attempt + 1 >= self.max_attempts or elapsed + delay > self.max_seconds:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Shared by all requests to one endpoint. After `threshold` saturation errors in a row, or a
+    Retry-After of any request, it opens: every caller waits until the cooldown is over instead
+    of adding to the load. Each time it opens again before a success the cooldown doubles.
+    """
+    def __init__(self, threshold=5, cooldown=5.0, max_cooldown=120.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened = 0 # times opened since the last success
+        self.open_until = 0.0
+        self.pause = 0.0 # length of the last open period
+        self._lock = threading.Lock()
+
+    def wait_time(self):
+        """
+        Seconds to wait before sending a request: the rest of the open period plus a random share
+        of its length, which spreads the waiting callers out instead of releasing them together.
+        """
+        remaining = self.open_until - time.monotonic()
+        if remaining <= 0:
+            return 0.0
+        return remaining + random.uniform(0, self.pause)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = 0
+
+    def record_saturation(self, wait=None):
+        with self._lock:
+            self.failures += 1
+            if wait is None and self.failures < self.threshold:
+                return
+            pause = wait if wait is not None else min(self.max_cooldown, self.cooldown * 2 ** self.opened)
+            self.open_until = max(self.open_until, time.monotonic() + pause)
+            self.pause = pause
+            self.opened += 1
+            self.failures = 0
+
+
+retry_policy = RetryPolicy.from_env()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(endpoint):
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(
+                threshold=int(os.getenv("ALYMPICS_BREAKER_THRESHOLD", "5")),
+                cooldown=float(os.getenv("ALYMPICS_BREAKER_COOLDOWN", "5")),
+            )
+    return breaker
+
+
+def send(backend, request, base_url, started, rate_limiter=None):
+    """
+    Response of `backend` to `request` and the start of the attempt that got it. Failed attempts
+    are recorded and retried by `retry_policy`, after the pause of the endpoint's circuit breaker;
+    with a `rate_limiter` every attempt takes a token first. `started` is when the caller began.
+    """
+    breaker = circuit_breaker(base_url)
+    attempt = 0
+    while True:
+        time.sleep(breaker.wait_time())
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        attempt_started = time.perf_counter()
+        try:
+            if _request_gate is None:
+                response = backend.chat.completions.create(**request)
+            else:
+                with _request_gate:
+                    response = backend.chat.completions.create(**request)
+            break
+        except Exception as e:
+            record_call(request, attempt_started, error=e)
+            delay = retry_policy.next_delay(e, attempt, time.perf_counter() - started, breaker)
+            if delay is None:
+                raise
+            logger.warning("%s: %s; retry %d in %.1fs", type(e).__name__, e, attempt + 1, delay)
+            time.sleep(delay)
+            attempt += 1
+    breaker.record_success()
+    return response, attempt_started
+
+
+async def _acquire_gate(gate):
+    """
+    Take `gate` in a worker thread, it may be a process-shared semaphore that must not block the
+    event loop. The thread cannot be interrupted: when the caller is cancelled while it waits,
+    the slot the thread still gets is given back as soon as it has it.
+    """
+    acquiring = asyncio.ensure_future(asyncio.to_thread(gate.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        acquiring.add_done_callback(lambda task: task.cancelled() or task.exception() or gate.release())
+        raise
+
+
+async def asend(backend, request, base_url, started, rate_limiter=None):
+    """
+    `send` for an async backend.
+    """
+    breaker = circuit_breaker(base_url)
+    attempt = 0
+    while True:
+        await asyncio.sleep(breaker.wait_time())
+        if rate_limiter is not None:
+            await rate_limiter.aacquire()
+        attempt_started = time.perf_counter()
+        try:
+            if _request_gate is None:
+                response = await backend.chat.completions.create(**request)
+            else:
+                await _acquire_gate(_request_gate)
+                try:
+                    response = await backend.chat.completions.create(**request)
+                finally:
+                    _request_gate.release()
+            break
+        except Exception as e:
+            record_call(request, attempt_started, error=e)
+            delay = retry_policy.next_delay(e, attempt, time.perf_counter() - started, breaker)
+            if delay is None:
+                raise
+            logger.warning("%s: %s; retry %d in %.1fs", type(e).__name__, e, attempt + 1, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+    breaker.record_success()
+    return response, attempt_started
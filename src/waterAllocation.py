@@ -1,13 +1,41 @@
+import asyncio
 import json
 import logging
+import os
+import re
+import sys
+from collections import Counter
 from random import randint
-from Alympics import PlayGround, Player, LLM
+from Alympics import PlayGround, Player, LLM, run_sync
+from llm_backend import call_tags, set_event_sink, tagged
+
+# the event log of the k-reasoning games, see run_multi_round
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "k-reasoning", "common"))
+from game_log import GameLog
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# "bid" field of a structured answer that is not valid JSON as a whole (code fences, trailing text)
+BID_FIELD = re.compile(r'"bid"\s*:\s*"?\$?\s*(-?\d+(?:\.\d+)?)')
+
+# How each bid of this process was read: "structured" (the player's own JSON answer), "llm" (the
+# aggregate parse call) or "fallback" (unreadable, counted as not bidding).
+PARSE_STATS = Counter()
+
+
+def bid_value(value):
+    """
+    A parsed bid as a non-negative integer, None if it is not one
+    """
+    try:
+        bid = int(float(value))
+    except (ValueError, TypeError):
+        return None
+    return bid if bid >= 0 else None
+
 class myPlayer(Player):
-    def __init__(self, game_setting, name, water_requirement, daily_salary, if_persona, persona):
+    def __init__(self, game_setting, name, water_requirement, daily_salary, if_persona, persona, structured_output=False):
         super().__init__(name, if_persona, persona)
         
         # Personal Information, Player Status
@@ -22,9 +50,12 @@ class myPlayer(Player):
             self.append_message("system", self.persona + game_setting)
         else:
             self.append_message("system", game_setting)
+        self.history.pin()
         
         # Prompts
         self.inquiry_prompt = "Hello, {}! Today is the Day {} of the Water Allocation Challenge, with a quantity of {} units. Your status:\n{}\nPlease carefully analyze your situation to decide on this round of bidding. Remember, the most important thing is to SURVIVE!! Now, if you want to participate in today's water resource auction, please provide your bid and explain your bidding logic."
+        self.structured_prompt = " Answer with a JSON object of the form {\"bid\": your bidding price as an integer, \"reason\": \"your bidding logic\"}."
+        self.structured_output = structured_output # ask for JSON answers that are parsed locally
 
         # Initial a no-memory LLM
         self.llm = LLM()
@@ -47,14 +78,50 @@ class myPlayer(Player):
         if self.hp <= 0:
             print(self.name + "is out of game!")
     
+    def _inquiry(self, round_id, supply):
+        prompt = self.inquiry_prompt.format(self.name, round_id, str(supply), self.get_status())
+        if self.structured_output:
+            prompt += self.structured_prompt
+        return prompt
+
+    def _llm_params(self):
+        return {"response_format": {"type": "json_object"}} if self.structured_output else {}
+
+    def parse_bidding(self, response):
+        """
+        Validate a structured answer locally, None if it carries no usable bid
+        """
+        try:
+            bid = json.loads(response)["bid"]
+        except (ValueError, TypeError, KeyError):
+            match = BID_FIELD.search(response)
+            if not match:
+                return None
+            bid = match.group(1)
+        return bid_value(bid)
+
+    @tagged("bid")
     def execute_bidding(self, round_id, supply) -> str:
         """
         player bids based on daily supply, round number and status
         """
-        prompt = self.inquiry_prompt.format(self.name, round_id, str(supply), self.get_status())
+        prompt = self._inquiry(round_id, supply)
+        self.append_message("system", prompt)
+        logger.info(prompt)
+        response = self.llm.call(self.history.render(), **self._llm_params())
+        self.append_message("assistant", response)
+        logger.info(response)
+        return response
+
+    @tagged("bid")
+    async def aexecute_bidding(self, round_id, supply) -> str:
+        """
+        Asynchronous `execute_bidding`, the prompt only depends on this player's own history
+        """
+        prompt = self._inquiry(round_id, supply)
         self.append_message("system", prompt)
         logger.info(prompt)
-        response = self.llm.call(self.history)
+        response = await self.llm.acall(self.history.render(), **self._llm_params())
         self.append_message("assistant", response)
         logger.info(response)
         return response
@@ -69,9 +136,11 @@ class myPlayer(Player):
 
 
 class waterAllocation(PlayGround):
-    def __init__(self, game_setting) -> None:
+    def __init__(self, game_setting, concurrent_bidding=False, structured_output=False) -> None:
         super().__init__()
         self.game_setting = game_setting
+        self.concurrent_bidding = concurrent_bidding # dispatch all players' bids at once
+        self.structured_output = structured_output # per-player JSON bids instead of the aggregate parse call
         # Personas of all players
         PERSONA_A = "You are Alex and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 20 days by acquiring the water resources. "#Your Profession: Unemployed\nYour Personality: You have low intelligence and find it difficult to understand complex concepts. You also lack emotional intelligence, making it hard to understand others' feelings. You tend to be irritable and often exhibit negative and antisocial tendencies.\nYour Background: You grew up in an impoverished community and faced many challenges in your early years. Due to your family's poverty, you dropped out of school at a very young age. You have been unable to find stable employment, which further exacerbates your difficulty in interacting with others.\n\n"
         PERSONA_B = "You are Bob and a resident living in W-Town. W Town is experiencing a rare drought. Every residents in Town W is ensuring their survival over a period of 20 days by acquiring the water resources. "#Your Profession: High School Teacher\nYour Personality: Understanding, high EQ, average IQ. You are very adept at understanding and communicating with people, making you a natural teacher.\nYour Background: You come from a close-knit family. you chose to become a high school teacher to make a positive impact on young people. While you may not have the highest IQ, your emotional intelligence and ability to relate to your students set you apart.\n\n"
@@ -81,11 +150,11 @@ class waterAllocation(PlayGround):
 
         # Initial players: A, B, C, D and E
         if_persona = False
-        self.add_player(myPlayer(self.game_setting, "Alex", 8, 70, if_persona, PERSONA_A))
-        self.add_player(myPlayer(self.game_setting, "Bob", 9, 75, if_persona, PERSONA_B))
-        self.add_player(myPlayer(self.game_setting, "Cindy", 10, 100, if_persona, PERSONA_C))
-        self.add_player(myPlayer(self.game_setting, "David", 11, 120, if_persona, PERSONA_D))
-        self.add_player(myPlayer(self.game_setting, "Eric", 12, 120, if_persona, PERSONA_E))
+        self.add_player(myPlayer(self.game_setting, "Alex", 8, 70, if_persona, PERSONA_A, structured_output))
+        self.add_player(myPlayer(self.game_setting, "Bob", 9, 75, if_persona, PERSONA_B, structured_output))
+        self.add_player(myPlayer(self.game_setting, "Cindy", 10, 100, if_persona, PERSONA_C, structured_output))
+        self.add_player(myPlayer(self.game_setting, "David", 11, 120, if_persona, PERSONA_D, structured_output))
+        self.add_player(myPlayer(self.game_setting, "Eric", 12, 120, if_persona, PERSONA_E, structured_output))
         logger.info("Initial players done.")
         
         self.survival_players = self.players
@@ -94,6 +163,8 @@ class waterAllocation(PlayGround):
         self.round_results_prompt = "Thank you all for participating in Round {}. In this round, {}.\nTotal water resource supply is {}. According to the principle of the highest bidder and the rule of prioritizing low-demand individuals when the game is tied, {} won this auction and obtain water resource. After allocation, all survival residents' information is as follows: {}"
         
         self.experiment_unique_id = str(randint(10000000, 99999999))
+        self.parse_stats = Counter() # how the bids of this game were read, see PARSE_STATS
+        self.log = None # GameLog of the game, see run_multi_round
         # Initial a no-memory LLM
         self.llm = LLM()
 
@@ -130,18 +201,69 @@ class waterAllocation(PlayGround):
         return winners
 
     
+    @tagged("parse")
     def _parse_result(self, round_info):
+        """
+        {name: bid} as extracted by the model, {} after three answers that are not a JSON object
+        """
         messages = [{"role": "system", "content": self.parse_result_prompt}, {"role": "user", "content": round_info}]
         attempts = 0
         while attempts < 3:
             try:
                 res = self.llm.call(messages)
                 res = json.loads(res)
-                return res
+                if isinstance(res, dict):
+                    return res
+                logger.error(f"Parse call did not answer a JSON object: {res!r}")
             except Exception as e:
                 logger.error(e)
             attempts += 1
-        return res
+        logger.error("Parse call failed three times, no bids extracted.")
+        return {}
+
+    def _parse_biddings(self, responses, bidding_info):
+        """
+        Bids of all survivors. Structured answers are validated locally and only the
+        unreadable ones go through the aggregate LLM parse. A player whose bid cannot be read
+        either way (left out of the parse, not a number) does not bid: the bid is 0, a warning is
+        logged and the case is counted as "fallback" in `parse_stats` and PARSE_STATS.
+        """
+        biddings = {player.name: None for player in self.survival_players}
+        if self.structured_output:
+            for player, response in zip(self.survival_players, responses):
+                biddings[player.name] = player.parse_bidding(response)
+        missing = [name for name in biddings if biddings[name] is None]
+        if missing:
+            if self.structured_output:
+                logger.warning(f"Unstructured bids from {', '.join(missing)}, falling back to the parse call.")
+                bidding_info = ""
+                for player, response in zip(self.survival_players, responses):
+                    if player.name in missing:
+                        bidding_info += player.name + ":" + response + "\n\n"
+            parsed = self._parse_result(bidding_info)
+            for name in missing:
+                biddings[name] = bid_value(parsed.get(name))
+
+        for name, bid in biddings.items():
+            tier = "llm" if name in missing else "structured"
+            if bid is None:
+                logger.warning(f"No readable bid from {name}, counted as not bidding (0).")
+                tier, biddings[name] = "fallback", 0
+            self.parse_stats[tier] += 1
+            PARSE_STATS[tier] += 1
+        return biddings
+
+    async def _gather_biddings(self, round_id, supply):
+        return await asyncio.gather(*[player.aexecute_bidding(round_id, supply) for player in self.survival_players])
+
+    def _collect_biddings(self, round_id, supply):
+        """
+        Ask every survivor for a bid, concurrently when `concurrent_bidding` is set.
+        Responses always come back in player order.
+        """
+        if self.concurrent_bidding:
+            return run_sync(self._gather_biddings(round_id, supply))
+        return [player.execute_bidding(round_id, supply) for player in self.survival_players]
 
     def run_single_round(self, round_id, supply):
         """
@@ -159,13 +281,16 @@ class waterAllocation(PlayGround):
 
         # 2. bid
         bidding_info = ""
-        for player in self.survival_players:
-            bidding_info += player.name + ":" + player.execute_bidding(round_id, supply) + "\n\n"
+        responses = self._collect_biddings(round_id, supply)
+        for player, response in zip(self.survival_players, responses):
+            bidding_info += player.name + ":" + response + "\n\n"
         
         # 3. check winners
-        formatted_bidding_info = self._parse_result(bidding_info)
-        for player in self.survival_players:
+        formatted_bidding_info = self._parse_biddings(responses, bidding_info)
+        for player, response in zip(self.survival_players, responses):
             player.bidding = formatted_bidding_info[player.name]
+            if self.log:
+                self.log.write({"event": "bid", "round": round_id, "player": player.name, "response": response, "bid": player.bidding})
         winners = self._check_winner(supply)
         logger.info("Winner(s):\n")
         logger.info(winners)
@@ -176,7 +301,7 @@ class waterAllocation(PlayGround):
         # 5. get bidding results (str)
         bidding_details = []
         for player in self.survival_players:
-            bidding_details += [f"{player.name} bid {formatted_bidding_info[player.name]}"]
+            bidding_details += [f"{player.name} bid {player.bidding}"]
         bidding_details = ", ".join(bidding_details)
 
         winners_str = []
@@ -204,9 +329,11 @@ class waterAllocation(PlayGround):
                     other_player.append_message("system", f"{player.name}'s hp is below 0, so {player.name} has been eliminated from the challenge!")
             else:
                 survival_players.append(player)
+        # 8. close the round in every memory, a digest replaces it once it gets compacted
+        for player in self.survival_players:
+            player.history.close_round(f"Day {round_id}: supply {supply}; {bidding_details}; winners: {winners_str or 'none'}; {player.get_status()}")
+
         self.survival_players = survival_players
-        if len(self.survival_players) == 0:
-            exit()
 
     def _save_history(self, path):
         history = []
@@ -215,11 +342,32 @@ class waterAllocation(PlayGround):
         with open(path, 'w') as f:
             json.dump(history, f)
 
-    def run_multi_round(self, n_round, supply_list):
+    def run_multi_round(self, n_round, supply_list, log=None):
+        """
+        Play rounds 1..n_round, or until nobody survives. Every completion, bid and round is
+        appended to `log` (a GameLog, by default ./<experiment id>.events.jsonl) as it happens; a
+        game interrupted in an earlier run with the same log resumes after its last completed round.
+        """
         assert isinstance(supply_list, list)
         assert n_round == len(supply_list)
 
-        for i in range(1, n_round+1):
-            self.run_single_round(i, supply_list[i-1])
-        
-        self._save_history(f'./{self.experiment_unique_id}.json') # change the log dirction here
\ No newline at end of file
+        self.log = log or GameLog(f'./{self.experiment_unique_id}.events.jsonl')
+        first_round = self.log.open(self, self.players, n_round) + 1
+        set_event_sink(self.log.write)
+        try:
+            for i in range(first_round, n_round+1):
+                if len(self.survival_players) == 0:
+                    break
+                with call_tags(round=i):
+                    self.run_single_round(i, supply_list[i-1])
+                self.log.end_round(i, self, self.players)
+        except BaseException:
+            # keep the log open for a resume: no "end" event
+            self.log.close(finished=False)
+            raise
+        finally:
+            set_event_sink(None)
+        logger.info(f"Bid parsing: {dict(self.parse_stats)}")
+
+        self._save_history(f'./{self.experiment_unique_id}.json') # change the log dirction here
+        self.log.close()
@@ -0,0 +1,120 @@
+import json
+from glob import glob
+
+import numpy as np
+import pytest
+
+import evaluate
+import main
+
+NAMES = ["Alex", "Bob", "Cindy", "David", "Eric"]
+GAMES = {"kr_VS_agent": 4, "cot_VS_agent": 3, "kr_VS_fix-40-5": 2, "cot_VS_fix-40-5": 5}
+
+
+def baseline_win_rate(result_dir, agent, computer, exp_rnd=10):
+    """Win rate of the evaluator before the catalogue and the NumPy kernels."""
+    cots = glob(f"{result_dir}/{agent}_VS_{computer}*.json")
+    wins, total_round = 0, 0
+    for path in cots:
+        with open(path) as fin:
+            result = json.load(fin)["winners"]
+        total_round = len(cots) * len(result)
+        wins += sum("Alex" in result[rnd] for rnd in result if int(rnd) <= exp_rnd)
+    return wins / total_round
+
+
+def baseline_adaption_index(result_dir, agent, computer):
+    """Mean adaption index of the evaluator before the catalogue and the NumPy kernels."""
+    ratios = []
+    for path in glob(f"{result_dir}/{agent}_VS_{computer}*.json"):
+        with open(path) as fin:
+            exp_ground = json.load(fin)["biddings"]
+        target_div = []
+        for r in range(10):
+            bids = [exp_ground[p][r] for p in exp_ground]
+            target = sum(bids) / len(bids) * 0.8
+            target_div.append(abs(exp_ground["Alex"][r] - target))
+        ratios.append(sum(target_div[5:]) / sum(target_div[:5]))
+    return sum(ratios) / len(ratios)
+
+
+@pytest.fixture
+def result_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for prefix, count in GAMES.items():
+        for exp_no in range(count):
+            record = {
+                "winners": {str(r): [name for name in NAMES if rng.random() < 0.3] for r in range(1, 11)},
+                "biddings": {name: rng.integers(1, 101, 10).tolist() for name in NAMES},
+                "message": {}, "logs": {}, "parse_stats": {},
+            }
+            with open(tmp_path / f"{prefix}_{exp_no}.json", "w") as fout:
+                json.dump(record, fout)
+    return tmp_path
+
+
+def evaluator(result_dir, output_dir, players="kr,cot", opponents="agent,fix"):
+    return evaluate.G08AEvaluator(players, opponents, 10, 10, str(result_dir), str(output_dir), index_workers=1)
+
+
+@pytest.mark.parametrize("exp_rnd", [10, 7])
+def test_win_rates_match_the_baseline(result_dir, tmp_path, exp_rnd):
+    tables = evaluator(result_dir, tmp_path / "out")
+    tables.exp_rnd = exp_rnd
+    for agent in ["kr", "cot"]:
+        for computer in ["agent", "fix"]:
+            assert tables.game_win_rates(agent, computer).mean() == pytest.approx(baseline_win_rate(result_dir, agent, computer, exp_rnd))
+
+
+def test_adaption_indices_match_the_baseline(result_dir, tmp_path):
+    tables = evaluator(result_dir, tmp_path / "out")
+    for agent in ["kr", "cot"]:
+        for computer in ["agent", "fix"]:
+            assert tables.game_adaption_indices(agent, computer).mean() == pytest.approx(baseline_adaption_index(result_dir, agent, computer))
+
+
+def test_printed_tables(result_dir, tmp_path, capsys):
+    tables = evaluator(result_dir, tmp_path / "out")
+    tables.win_rate()
+    tables.adaption_index()
+    lines = capsys.readouterr().out.splitlines()
+    win_rows = {line.split("\t")[0].strip(): line.split("\t")[1:] for line in lines[2:5]}
+    for column, agent in enumerate(["kr", "cot"]):
+        for computer in ["agent", "fix"]:
+            assert win_rows[computer][column].strip() == f"{baseline_win_rate(result_dir, agent, computer):.2f}"
+    average = (baseline_win_rate(result_dir, "kr", "agent") + baseline_win_rate(result_dir, "kr", "fix")) / 2
+    assert win_rows["Average"][0].strip() == f"{average:.2f}"
+    adaption_rows = {line.split("\t")[0].strip(): line.split("\t")[1:] for line in lines[8:11]}
+    assert adaption_rows["agent"][1].strip() == f"{baseline_adaption_index(result_dir, 'cot', 'agent'):.2f}"
+
+
+def test_missing_pairs_are_left_out_of_the_average(result_dir, tmp_path, capsys):
+    tables = evaluator(result_dir, tmp_path / "out", players="kr,spp", opponents="agent,fix,persona")
+    tables.win_rate()
+    lines = capsys.readouterr().out.splitlines()
+    win_rows = {line.split("\t")[0].strip(): line.split("\t")[1:] for line in lines[2:6]}
+    assert win_rows["persona"][0].strip() == ""
+    average = (baseline_win_rate(result_dir, "kr", "agent") + baseline_win_rate(result_dir, "kr", "fix")) / 2
+    assert win_rows["Average"][0].strip() == f"{average:.2f}"
+    assert win_rows["Average"][1].strip() == ""
+
+
+
+def test_result_store_games_give_the_same_tables(mock_backend, tmp_path, capsys):
+    for output_format in ["json", "store"]:
+        for player_strategy in ["kr", "cot"]:
+            args = main.get_parser().parse_args(["--player_strategy", player_strategy, "--computer_strategy", "agent",
+                                                 "--output_dir", str(tmp_path / output_format), "--output_format", output_format])
+            for exp_no in range(2):
+                main.run_experiment(args, exp_no)
+    assert not glob(str(tmp_path / "store" / "*_VS_*.json"))
+    printed = {}
+    for output_format in ["json", "store"]:
+        tables = evaluator(tmp_path / output_format, tmp_path / "out", opponents="agent")
+        capsys.readouterr()
+        tables.win_rate()
+        tables.adaption_index()
+        tables.confidence_intervals(200)
+        printed[output_format] = capsys.readouterr().out
+    assert printed["json"] == printed["store"]
+    assert "kr          \tagent" in printed["json"]
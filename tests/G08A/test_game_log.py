@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+import main
+from game import G08A
+
+
+def game_args(output_dir, *options):
+    return main.get_parser().parse_args(["--player_strategy", "kr", "--computer_strategy", "agent", "--max_round", "4",
+                                         "--output_dir", str(output_dir), *options])
+
+
+def events(args, exp_no=0):
+    with open(main.get_output_file(args, exp_no)[:-len(".json")] + ".events.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+
+def result(output_file):
+    with open(output_file) as f:
+        return json.load(f)
+
+
+def interrupt_at(monkeypatch, stop_round):
+    run_single_round = G08A.run_single_round
+
+    def crash(self, round_id):
+        if round_id == stop_round:
+            raise RuntimeError("interrupted")
+        return run_single_round(self, round_id)
+
+    monkeypatch.setattr(G08A, "run_single_round", crash)
+
+
+def test_interrupted_game_resumes_after_its_last_round(mock_backend, tmp_path, monkeypatch):
+    reference = result(main.run_experiment(game_args(tmp_path / "a"), 0))
+
+    args = game_args(tmp_path / "b")
+    with monkeypatch.context() as patch:
+        interrupt_at(patch, 3)
+        with pytest.raises(RuntimeError):
+            main.run_experiment(args, 0)
+    assert [event["round"] for event in events(args) if event["event"] == "round"] == [1, 2]
+
+    played = []
+    run_single_round = G08A.run_single_round
+    monkeypatch.setattr(G08A, "run_single_round", lambda self, round_id: played.append(round_id) or run_single_round(self, round_id))
+    assert result(main.run_experiment(args, 0)) == reference
+    assert played == [3, 4]
+    log = events(args)
+    assert [event["event"] for event in log].count("start") == 1
+    assert [event["round"] for event in log if event["event"] == "round"] == [1, 2, 3, 4]
+    assert log[-1] == {"event": "end"}
+
+
+def test_torn_last_line_is_dropped(mock_backend, tmp_path, monkeypatch):
+    reference = result(main.run_experiment(game_args(tmp_path / "a"), 0))
+
+    args = game_args(tmp_path / "b")
+    with monkeypatch.context() as patch:
+        interrupt_at(patch, 4)
+        with pytest.raises(RuntimeError):
+            main.run_experiment(args, 0)
+    path = main.get_output_file(args, 0)[:-len(".json")] + ".events.jsonl"
+    with open(path, "a") as f:
+        f.write('{"event": "round", "round": 4, "ga')
+    assert result(main.run_experiment(args, 0)) == reference
+    assert all(line.endswith("\n") for line in open(path))
+
+
+def test_finished_or_other_games_start_over(mock_backend, tmp_path, monkeypatch):
+    args = game_args(tmp_path)
+    main.run_experiment(args, 0)
+    first = [event for event in events(args) if event["event"] != "completion"]
+    main.run_experiment(args, 0)
+    assert [event for event in events(args) if event["event"] != "completion"] == first
+
+    # same file, other roster: the old log is replaced
+    with monkeypatch.context() as patch:
+        interrupt_at(patch, 2)
+        with pytest.raises(RuntimeError):
+            main.run_experiment(args, 0)
+    other = game_args(tmp_path, "--player_strategy", "cot")
+    os.replace(main.get_output_file(args, 0)[:-len(".json")] + ".events.jsonl",
+               main.get_output_file(other, 0)[:-len(".json")] + ".events.jsonl")
+    main.run_experiment(other, 0)
+    log = events(other)
+    assert log[0]["roster"][0] == ["Alex", "CoTAgentPlayer"]
+    assert [event["round"] for event in log if event["event"] == "round"] == [1, 2, 3, 4]
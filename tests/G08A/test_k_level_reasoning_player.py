@@ -0,0 +1,56 @@
+import json
+
+import main
+
+
+def play(output_dir, *options, exp_no=0):
+    args = main.get_parser().parse_args(["--player_strategy", "kr", "--computer_strategy", "agent", "--max_round", "5",
+                                         "--output_dir", str(output_dir), *options])
+    with open(main.run_experiment(args, exp_no)) as f:
+        return json.load(f)
+
+
+def full_transcript(player, name):
+    """The simulated history of `name` rebuilt from round 1, as predict did before transcripts were kept."""
+    hp = 10
+    message = [{"role": "system", "content": player.PREDICTION_GAME_SETTING.format(name=name)}]
+    for r, bidding in enumerate(player.history_biddings[name], 1):
+        message.append({"role": "system", "content": player.PREDICTION_INQUIRY.format(name=name, round=r, hp=hp)})
+        message.append({"role": "assistant", "content": player.PREDICTION_RESPONSE.format(bidding=bidding)})
+        message.append({"role": "system", "content": player.round_result[r]})
+        message.append({"role": "system", "content": player.add_warning(hp, name in player.ROUND_WINNER[r])})
+        if name not in player.ROUND_WINNER[r]:
+            hp -= 1
+    return message, hp
+
+
+def test_transcripts_grow_like_a_full_rebuild(mock_backend):
+    args = main.get_parser().parse_args(["--player_strategy", "kr", "--computer_strategy", "agent", "--max_round", "6"])
+    Game = main.build_game(args, 0)
+    kr = Game.all_players[0]
+    for player in Game.all_players:
+        player.ROUND_WINNER = Game.round_winner
+    for r in range(1, 7):
+        Game.run_single_round(r)
+        for name in kr.history_biddings:
+            if name == kr.name:
+                continue
+            transcript = kr.update_transcript(name)
+            message, hp = full_transcript(kr, name)
+            assert list(transcript["message"]) == message
+            assert (transcript["rounds"], transcript["hp"]) == (r, hp)
+
+
+def test_deeper_lookahead_leaves_the_real_history_alone(mock_backend, tmp_path):
+    result = play(tmp_path, "--player_k", "3")
+    predictions = result["logs"]["Alex"]
+    assert sorted(predictions) == [f"round{r}" for r in range(1, 6)]
+    # the level-2 simulated round is not part of the real history of the game
+    assert all(len(bids) == 5 for bids in result["biddings"].values())
+    assert list(result["winners"]) == ["1", "2", "3", "4", "5"]
+
+
+
+def test_concurrent_prediction_plays_the_same_game(mock_backend, tmp_path):
+    assert play(tmp_path / "a", "--concurrent_prediction") == play(tmp_path / "b")
+    assert play(tmp_path / "c", "--concurrent_prediction", "--player_k", "3") == play(tmp_path / "d", "--player_k", "3")
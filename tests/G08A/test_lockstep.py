@@ -0,0 +1,52 @@
+import json
+
+import main
+from game import G08A
+
+
+def cells(output_dir, exp_num=3):
+    # LLM opponents only: program players draw from the unseeded global generator, in lock-step
+    # in another order than game by game
+    return [(main.get_parser().parse_args(["--player_strategy", strategy, "--computer_strategy", "agent", "--max_round", "3",
+                                           "--output_dir", str(output_dir)]), exp_no)
+            for strategy in ["kr", "cot"] for exp_no in range(exp_num)]
+
+
+def results(played):
+    files = {}
+    for args, exp_no in played:
+        with open(main.get_output_file(args, exp_no)) as f:
+            files[main.get_output_file(args, exp_no).rsplit("/", 1)[1]] = json.load(f)
+    return files
+
+
+def test_lockstep_games_play_like_sequential_ones(mock_backend, tmp_path):
+    sequential = cells(tmp_path / "sequential")
+    for args, exp_no in sequential:
+        main.run_experiment(args, exp_no)
+    lockstep = cells(tmp_path / "lockstep")
+    assert main.run_lockstep(lockstep) == {}
+    assert results(lockstep) == results(sequential)
+
+
+def test_failed_game_does_not_stop_the_others_and_resumes(mock_backend, tmp_path, monkeypatch):
+    reference = cells(tmp_path / "sequential", exp_num=1)
+    for args, exp_no in reference:
+        main.run_experiment(args, exp_no)
+
+    played = cells(tmp_path / "lockstep", exp_num=1)
+    settle_round = G08A.settle_round
+
+    def crash(self, round_id, *target):
+        if round_id == 2 and self.all_players[0].__class__.__name__ == "KLevelReasoningPlayer":
+            raise RuntimeError("interrupted")
+        return settle_round(self, round_id, *target)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(G08A, "settle_round", crash)
+        failed = main.run_lockstep(played)
+    assert list(failed) == [main.get_output_file(*played[0])]
+    assert isinstance(failed[main.get_output_file(*played[0])], RuntimeError)
+
+    assert main.run_lockstep(played[:1]) == {}
+    assert results(played) == results(reference)
@@ -0,0 +1,23 @@
+import json
+
+import main
+
+
+def play(output_dir, exp_no, *options):
+    args = main.get_parser().parse_args(["--player_strategy", "cot", "--computer_strategy", "agent", "--max_round", "3",
+                                         "--output_dir", str(output_dir), *options])
+    with open(main.run_experiment(args, exp_no)) as f:
+        return json.load(f)
+
+
+def test_replicates_get_different_mock_games(mock_backend, tmp_path):
+    first = play(tmp_path / "a", 0)
+    second = play(tmp_path / "b", 1)
+    assert first["biddings"] != second["biddings"]
+
+
+def test_replicate_does_not_depend_on_earlier_games(mock_backend, tmp_path):
+    alone = play(tmp_path / "a", 2)
+    play(tmp_path / "b", 0)
+    after_others = play(tmp_path / "c", 2)
+    assert alone == after_others
@@ -0,0 +1,31 @@
+import pytest
+
+from bid_parsing import extract_number
+
+PCOT = ("If I choose 30, the average drops to 40. If I choose 25, the target is about 24.\n"
+        "Predict:\nBob: 40, Cindy: 35, David: 30, Eric: 28\n"
+        "Answer:\n22")
+
+
+@pytest.mark.parametrize("text, expected", [
+    (PCOT, ("answer", 22)),
+    ("Final answer: 33", ("answer", 33)),
+    ("So my final answer is **41**.", ("answer", 41)),
+    ("Final answer: 45 * 0.8 = 36", ("answer", 36)),
+    ("Final answer: 6 * (1 + 1) + 12 = 24", ("answer", 24)),
+    ("Final answer: 45 * 0.8, rounded down", (None, None)),
+    ("Answer: 38.5", (None, None)),
+    ("I choose 38.5.", (None, None)),
+    ("Predict: Bob 40\n**22.4**", (None, None)),
+    ("Considering the previous rounds, I choose 17.", ("choose", 17)),
+    ("I would choose 25 if they stayed high, but they will not. I'll go with 20.", ("choose", 20)),
+    ("The target was 32.5 last round.\n**28**", ("last_number", 28)),
+    ("If I choose 30, the target would be 26 and I would lose.", (None, None)),
+    ("Somewhere between 20 and 30 seems safe.", (None, None)),
+])
+def test_extract_number(text, expected):
+    assert extract_number(text, 1, 100) == expected
+
+
+def test_numbers_out_of_range_are_not_bids():
+    assert extract_number("I choose 150.", 1, 100) == (None, None)
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+import batching
+import main
+import schedule
+import transport
+
+
+@pytest.fixture(autouse=True)
+def process_settings(monkeypatch):
+    """Undo the request gate and batch executor schedule.main installs for the process."""
+    monkeypatch.setattr(transport, "_request_gate", transport._request_gate)
+    monkeypatch.setattr(batching, "_batch_executor", batching._batch_executor)
+
+
+def schedule_args(output_dir, **options):
+    args = main.get_parser().parse_args(["--max_round", "3", "--exp_num", "2", "--backend", "mock", "--mock_latency", "0",
+                                         "--output_dir", str(output_dir)])
+    args.player_strategies = ["cot", "kr"]
+    args.computer_strategies = ["agent"]
+    args.player_engines = [None]
+    args.player_ks = [None]
+    args.workers = 2
+    args.max_inflight = 4
+    args.batch = None
+    args.batch_endpoint = "local"
+    for name, value in options.items():
+        setattr(args, name, value)
+    return args
+
+
+def results(args):
+    files = {}
+    for cell, exp_no in schedule.build_cells(args):
+        with open(main.get_output_file(cell, exp_no)) as f:
+            files[os.path.basename(main.get_output_file(cell, exp_no))] = json.load(f)
+    return files
+
+
+def sequential(output_dir):
+    args = schedule_args(output_dir)
+    for cell, exp_no in schedule.build_cells(args):
+        main.run_experiment(cell, exp_no)
+    return results(args)
+
+
+def test_pool_plays_every_cell_like_main(mock_backend, tmp_path):
+    args = schedule_args(tmp_path / "pool")
+    schedule.main(args)
+    assert results(args) == sequential(tmp_path / "main")
+
+
+def test_exported_cells_are_skipped(mock_backend, tmp_path, capsys, monkeypatch):
+    args = schedule_args(tmp_path, lockstep=True)
+    first, _ = schedule.build_cells(args)[0]
+    main.run_experiment(first, 0)
+    stamp = os.stat(main.get_output_file(first, 0)).st_mtime_ns
+
+    schedule.main(args)
+    assert "4 cells, 1 already done, 3 to run" in capsys.readouterr().out
+    assert os.stat(main.get_output_file(first, 0)).st_mtime_ns == stamp
+
+    monkeypatch.setattr(schedule, "run_lockstep", lambda *a, **k: (_ for _ in ()).throw(AssertionError("nothing to run")))
+    schedule.main(args)
+    assert "4 cells, 4 already done, 0 to run" in capsys.readouterr().out
+
+
+def test_batched_cells_play_like_direct_ones(mock_backend, tmp_path, capsys):
+    args = schedule_args(tmp_path / "batch", batch=str(tmp_path / "waves"))
+    schedule.main(args)
+    assert results(args) == sequential(tmp_path / "main")
+    assert " completions in " in capsys.readouterr().out
+    waves = os.listdir(tmp_path / "waves")
+    assert waves and any(name.endswith(".jsonl") for name in waves)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import simulate
+
+# means far enough apart that the winners change as "last" follows the target and "mono" walks down
+STRATEGIES = ["fix", "fix", "last", "mono", "mono", "monorand"]
+MEANS = [20, 60, 45, 80, 35, 50]
+STDS = [0, 0, 0, 7, 2, 0]
+
+
+def test_simulate_plays_the_engine_rules_without_noise():
+    simulated = simulate.simulate(STRATEGIES, MEANS, STDS, n_games=3, max_round=20)
+    played = simulate.engine_games(STRATEGIES, MEANS, STDS, n_games=3, max_round=20)
+    np.testing.assert_array_equal(simulated["biddings"], played["biddings"])
+    np.testing.assert_array_equal(simulated["won"], played["won"])
+    np.testing.assert_array_equal(simulated["hp"], played["hp"])
+    # the population is not trivial: players win, lose and drop out
+    assert simulated["won"].any() and (simulated["hp"] == 0).any() and (simulated["hp"] > 0).any()
+
+
+def test_simulated_targets_are_the_round_targets():
+    result = simulate.simulate(STRATEGIES, MEANS, STDS, n_games=1, max_round=20)
+    for r in range(20):
+        bids = result["biddings"][0, :, r]
+        if np.isnan(bids).all():
+            assert np.isnan(result["targets"][0, r])
+        else:
+            assert result["targets"][0, r] == round(np.nanmean(bids) * 0.8, 2)
+
+
+def test_noisy_populations_match_the_engine_in_distribution():
+    np.random.seed(0)
+    strategies = ["fix", "fix", "last", "mono", "monorand"]
+    simulated = simulate.summary(simulate.simulate(strategies, 40, 5, n_games=20000), strategies)
+    played = simulate.summary(simulate.engine_games(strategies, 40, 5, n_games=1000), strategies)
+    for strategy in simulated:
+        assert simulated[strategy]["first_bid"] == pytest.approx(played[strategy]["first_bid"], abs=0.5)
+        assert simulated[strategy]["win_rate"] == pytest.approx(played[strategy]["win_rate"], abs=0.05)
+        assert simulated[strategy]["survival"] == pytest.approx(played[strategy]["survival"], abs=0.08)
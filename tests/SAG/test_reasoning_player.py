@@ -0,0 +1,59 @@
+import pytest
+
+from llm_backend import set_event_sink
+from player import AgentPlayer
+from bid_parsing import extract_number
+from player.reasoning_player import PERSONA
+
+
+@pytest.fixture
+def player():
+    player = AgentPlayer("Alex", "deepseek-chat", 10, 100, PERSONA.format(name="Alex"))
+    player.balance = 120
+    return player
+
+
+def test_extract_number_prefers_the_answer_line():
+    text = "If I bid 80 I cannot win. If I bid 60 Bob wins.\nPredict:\nBob: 70\nAnswer:\n$65"
+    assert extract_number(text, 0, 120) == ("answer", 65)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Final answer: 50 + 15 = $65", ("answer", 65)),
+    ("Final answer: 50 + 15", (None, None)),
+    ("Answer: $62.5", (None, None)),
+])
+def test_answer_line_holds_a_lone_number_or_a_result(text, expected):
+    assert extract_number(text, 0, 120) == expected
+
+
+def test_bids_within_the_balance_are_read_by_regex(mock_backend, player):
+    assert player.parse_result("To survive today I will bid $45 for the water.") == 45
+    assert dict(player.parse_stats) == {"bid": 1}
+
+
+@pytest.mark.parametrize("text", [
+    "It is Day 3 and I have 120. I will bid $300 for the water.",  # more than the balance
+    "My balance is low, I keep my money.\n**40**",                   # only a lone number
+])
+def test_other_numbers_are_read_by_the_model(mock_backend, player, text):
+    player.parse_result(text)
+    assert dict(player.parse_stats) == {"llm": 1}
+
+
+def test_opponent_bids_are_bounded_by_the_opponent_balance(mock_backend, player):
+    status = "NAME:Bob\tBALANCE:300\tHEALTH POINT:8\tNO_DRINK:1"
+    assert player.parse_result("I will bid $250 today.", status) == 250
+    assert dict(player.parse_stats) == {"bid": 1}
+
+
+def test_unreadable_answers_are_logged_as_no_bid(mock_backend, player, monkeypatch):
+    events = []
+    monkeypatch.setattr(player, "llm_parse_result", lambda message: None)
+    set_event_sink(events.append)
+    try:
+        assert player.parse_result("I am not sure yet.") == 0
+    finally:
+        set_event_sink(None)
+    assert dict(player.parse_stats) == {"fallback": 1}
+    assert events == [{"event": "parse_fallback", "player": "Alex", "response": "I am not sure yet.", "bid": 0}]
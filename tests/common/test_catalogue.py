@@ -0,0 +1,56 @@
+import json
+import os
+
+import catalogue
+from catalogue import Catalogue
+
+
+def write_game(result_dir, game, bid):
+    with open(os.path.join(result_dir, f"{game}.json"), "w") as fout:
+        json.dump({"winners": {"1": ["Alex"]}, "biddings": {"Alex": [bid]}, "message": {"Alex": ["long transcript"]}}, fout)
+
+
+def test_parse_name():
+    assert catalogue.parse_name("kr_VS_fix-40-5_3") == ("kr", "fix-40-5", 3)
+    assert catalogue.parse_name("pcot_prediction") is None
+
+
+def test_games_are_parsed_once_across_runs(tmp_path, monkeypatch):
+    for exp_no in range(3):
+        write_game(tmp_path, f"kr_VS_agent_{exp_no}", exp_no)
+    write_game(tmp_path, "cot_VS_agent_0", 9)
+
+    parsed = []
+    load_record = catalogue.load_record
+    monkeypatch.setattr(catalogue, "load_record", lambda result_dir, source, game, fields: parsed.append(game) or load_record(result_dir, source, game, fields))
+
+    first = Catalogue(str(tmp_path), ["winners", "biddings"], workers=1)
+    assert sorted(parsed) == ["cot_VS_agent_0", "kr_VS_agent_0", "kr_VS_agent_1", "kr_VS_agent_2"]
+    assert first.match("kr_VS_agent*") == ["kr_VS_agent_0", "kr_VS_agent_1", "kr_VS_agent_2"]
+    assert first.select(player="cot") == ["cot_VS_agent_0"]
+
+    parsed.clear()
+    again = Catalogue(str(tmp_path), ["biddings"], workers=1)
+    assert parsed == []
+    assert again.get("kr_VS_agent_1", "biddings") == {"biddings": {"Alex": [1]}}
+
+    # changed, added and deleted games
+    write_game(tmp_path, "kr_VS_agent_1", 100)
+    write_game(tmp_path, "kr_VS_agent_3", 3)
+    os.remove(tmp_path / "kr_VS_agent_0.json")
+    assert again.refresh() == 2
+    assert sorted(parsed) == ["kr_VS_agent_1", "kr_VS_agent_3"]
+    assert again.match("kr_VS_agent*") == ["kr_VS_agent_1", "kr_VS_agent_2", "kr_VS_agent_3"]
+    assert again.get("kr_VS_agent_1", "biddings")["biddings"] == {"Alex": [100]}
+
+
+def test_unindexed_fields_are_read_on_demand(tmp_path):
+    write_game(tmp_path, "kr_VS_agent_0", 1)
+    games = Catalogue(str(tmp_path), ["biddings"], workers=1)
+    with open(games.index_file) as fin:
+        assert "message" not in json.load(fin)["entries"]["kr_VS_agent_0"]["record"]
+    assert games.get("kr_VS_agent_0", "message", "biddings") == {"message": {"Alex": ["long transcript"]}, "biddings": {"Alex": [1]}}
+
+    # an index without a field that is now needed is rebuilt
+    wider = Catalogue(str(tmp_path), ["biddings", "winners"], workers=1)
+    assert wider.entries["kr_VS_agent_0"]["record"]["winners"] == {"1": ["Alex"]}
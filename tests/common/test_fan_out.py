@@ -0,0 +1,22 @@
+import threading
+
+from fan_out import fan_out
+from llm_backend import emit_event, set_event_sink
+
+
+def test_fan_out_keeps_the_order_and_the_callers_context():
+    events = []
+    barrier = threading.Barrier(4, timeout=5)
+
+    def answer(item):
+        barrier.wait() # every item runs at the same time
+        emit_event({"event": "item", "item": item})
+        return item * 2
+
+    set_event_sink(events.append)
+    try:
+        assert fan_out(answer, [3, 1, 4, 2]) == [6, 2, 8, 4]
+    finally:
+        set_event_sink(None)
+    assert sorted(event["item"] for event in events) == [1, 2, 3, 4]
+    assert fan_out(answer, []) == []
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import metrics
+
+
+def records():
+    # a 3-round game where Cindy is out after round 1 and a 2-round game
+    return [
+        {"biddings": {"Alex": [10, 20, 30], "Bob": [40, 50, 60], "Cindy": [5]},
+         "winners": {"1": ["Cindy"], "2": ["Alex"], "3": ["Alex", "Bob"]}},
+        {"biddings": {"Alex": [7, 8], "Bob": [9, 10]}, "winners": {"1": [], "2": ["Bob"]}},
+    ]
+
+
+def test_stack_pads_missing_values():
+    bids = metrics.stack(records())
+    assert bids.shape == (2, 5, 3)
+    np.testing.assert_array_equal(bids[0, 2], [5, np.nan, np.nan])
+    assert np.isnan(bids[1, :, 2]).all() and np.isnan(bids[1, 3]).all()
+
+    won, n_rounds = metrics.stack_winners(records())
+    np.testing.assert_array_equal(n_rounds, [3, 2])
+    np.testing.assert_array_equal(won[0, 0], [False, True, True])
+    np.testing.assert_array_equal(metrics.win_rate(won, n_rounds), [2 / 3, 0])
+    np.testing.assert_array_equal(metrics.win_rate(won, n_rounds, player=1, max_round=2), [0, 1 / 2])
+
+
+def test_target_deviation_ratio_matches_a_loop():
+    rng = np.random.default_rng(1)
+    bids = rng.integers(1, 101, (50, 5, 10)).astype(float)
+    expected = []
+    for game in bids:
+        deviation = [abs(game[0, r] - game[:, r].mean() * 0.8) for r in range(10)]
+        expected.append(sum(deviation[5:]) / sum(deviation[:5]))
+    np.testing.assert_allclose(metrics.target_deviation_ratio(bids), expected)
+
+
+def test_second_bid_deviation_ratio_skips_rounds_without_a_bid():
+    bids = np.full((1, 5, 10), np.nan)
+    bids[0, 0, :8] = np.arange(8) * 10.0      # Alex bids in rounds 1-8
+    bids[0, 1, :] = 25.0                      # the highest bid of the others
+    deviation = np.abs(np.arange(8) * 10.0 - 25.0)
+    assert metrics.second_bid_deviation_ratio(bids)[0] == pytest.approx(deviation[5:].mean() / deviation[:5].mean())
+    bids[0, 0, 5:] = np.nan
+    assert np.isnan(metrics.second_bid_deviation_ratio(bids)[0])
+
+
+def test_bootstrap_ci():
+    values = np.random.default_rng(2).normal(3.0, 1.0, 400)
+    mean, low, high = metrics.bootstrap_ci(np.append(values, [np.nan, np.inf]), n_boot=2000)
+    assert mean == pytest.approx(values.mean())
+    assert low < mean < high
+    assert high - low == pytest.approx(2 * 1.96 * values.std() / np.sqrt(len(values)), rel=0.15)
+    # resamples drawn in several chunks, the same seed gives the same interval
+    assert metrics.bootstrap_ci(values, 500, chunk=1000) == metrics.bootstrap_ci(values, 500, chunk=1000)
+    assert np.isnan(metrics.bootstrap_ci([np.nan])).all()
+
+
+def test_nanmean_skips_missing_values():
+    assert metrics.nanmean([0.5, np.nan, 0.25]) == pytest.approx(0.375)
+    assert np.isnan(metrics.nanmean([np.nan, np.nan]))
+    assert np.isnan(metrics.nanmean([]))
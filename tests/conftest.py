@@ -0,0 +1,65 @@
+"""
+The tests import the modules the way the entry points do: src/ and k-reasoning/common/ are on
+`sys.path`, and the tests of a game (tests/G08A/, tests/SAG/) run with the game's folder first on
+`sys.path`. Both games have modules of the same names (player, game, main, ...), so the modules of
+the other game are swapped out of `sys.modules` whenever a test of a game is collected or run.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAMES = {name: os.path.join(ROOT, "k-reasoning", name) for name in ("G08A", "SAG")}
+GAME_MODULES = ("paths", "player", "game", "main", "schedule", "lockstep", "simulate", "evaluate")
+
+for path in (os.path.join(ROOT, "src"), os.path.join(ROOT, "k-reasoning", "common")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+_parked = {game: {} for game in GAMES} # game -> its modules while the other game is active
+_active = [None]
+
+
+def _game_of(path):
+    folder = os.path.relpath(str(path), os.path.join(ROOT, "tests")).split(os.sep)[0]
+    return folder if folder in GAMES else None
+
+
+def _is_game_module(name):
+    return name.split(".")[0] in GAME_MODULES
+
+
+def activate(game):
+    if game is None or game == _active[0]:
+        return
+    if _active[0] is not None:
+        _parked[_active[0]] = {name: module for name, module in sys.modules.items() if _is_game_module(name)}
+        sys.path.remove(GAMES[_active[0]])
+    for name in [name for name in sys.modules if _is_game_module(name)]:
+        del sys.modules[name]
+    sys.modules.update(_parked[game])
+    sys.path.insert(0, GAMES[game])
+    _active[0] = game
+
+
+def pytest_collectstart(collector):
+    if isinstance(collector, pytest.Module):
+        activate(_game_of(collector.path))
+
+
+def pytest_runtest_setup(item):
+    activate(_game_of(item.path))
+
+
+@pytest.fixture
+def mock_backend(monkeypatch):
+    """
+    Answer every completion with the offline mock backend.
+    """
+    import llm_backend
+    monkeypatch.setitem(llm_backend._settings, "backend", "mock")
+    monkeypatch.setitem(llm_backend._settings, "latency", "0")
+    llm_backend.start_run()
+    yield
+    llm_backend.start_run()
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+from llm_backend import TokenBucket, to_namespace
+
+
+class CountingBucket(TokenBucket):
+    """
+    TokenBucket that counts the tokens taken.
+    """
+    def __init__(self, rate, capacity=1):
+        super().__init__(rate, capacity)
+        self.acquired = 0
+
+    def _reserve(self):
+        self.acquired += 1
+        return super()._reserve()
+
+
+class FakeEndpoint:
+    """
+    Stands in for the SDK client of a real endpoint, answers every request with its call number.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        self.calls += 1
+        return to_namespace({
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": f"answer {self.calls}"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+
+
+class AsyncFakeEndpoint(FakeEndpoint):
+    def __init__(self):
+        super().__init__()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, **request):
+        return self.create(**request)
+
+
+@pytest.fixture
+def limiter():
+    # rate 0 never waits, the test only counts the tokens
+    return CountingBucket(0)
+
+
+@pytest.fixture
+def endpoint():
+    return FakeEndpoint()
+
+
+@pytest.fixture
+def async_endpoint():
+    return AsyncFakeEndpoint()
@@ -0,0 +1,72 @@
+import pytest
+
+import accounting
+from accounting import call_summary, call_tags
+from llm_backend import ChatClient, ResponseCache, start_run
+from response_cache import to_namespace
+
+REQUEST = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Pick a number."}]}
+
+
+@pytest.fixture(autouse=True)
+def fresh_counters(monkeypatch):
+    monkeypatch.setattr(accounting, "_calls", {})
+
+
+def test_calls_are_summed_by_tag(endpoint):
+    client = ChatClient(cache=None)
+    client._client = endpoint
+    with call_tags(player="Alex", purpose="bid"):
+        client.chat.completions.create(**REQUEST)
+        with call_tags(purpose="predict"):
+            client.chat.completions.create(**REQUEST)
+            client.chat.completions.create(**REQUEST)
+    rows = {row["purpose"]: row for row in call_summary()}
+    assert rows["predict"]["calls"] == 2 and rows["bid"]["calls"] == 1
+    assert rows["predict"]["prompt_tokens"] == 20 and rows["predict"]["completion_tokens"] == 4
+    price = accounting.PRICES["deepseek-chat"]
+    assert rows["predict"]["cost_usd"] == pytest.approx(2 * (10 * price[0] + 2 * price[2]) / 1e6)
+    assert [row["player"] for row in call_summary(by=("player",))] == ["Alex"]
+    assert "purpose" in accounting.format_call_summary(call_summary())
+
+
+def test_cache_hits_are_free_and_errors_count_as_retries(tmp_path, endpoint):
+    client = ChatClient(cache=ResponseCache(str(tmp_path / "cache.db")))
+    client._client = endpoint
+    start_run()
+    client.chat.completions.create(**REQUEST)
+    start_run()
+    client.chat.completions.create(**REQUEST)
+    accounting.record_call(REQUEST, 0.0, error=TimeoutError())
+    [row] = call_summary(by=("model",))
+    assert (row["calls"], row["cached"], row["retries"]) == (3, 1, 1)
+    assert row["prompt_tokens"] == 10
+
+
+def test_prefix_cache_hits_are_cheaper(monkeypatch):
+    usage = to_namespace({"prompt_tokens": 1000, "completion_tokens": 0, "prompt_tokens_details": {"cached_tokens": 800}})
+    assert accounting.cached_prompt_tokens(usage) == 800
+    accounting.record_call(REQUEST, 0.0, to_namespace({"usage": {"prompt_tokens": 1000, "prompt_cache_hit_tokens": 800, "completion_tokens": 5}}))
+    [row] = call_summary(by=())
+    assert row["cached_prompt_tokens"] == 800 and row["prefix_hit_rate"] == 0.8
+    price = accounting.PRICES["deepseek-chat"]
+    assert accounting.call_cost("deepseek-chat", 1000, 800, 0) == pytest.approx((200 * price[0] + 800 * price[1]) / 1e6)
+    assert accounting.call_cost("unknown-model", 1000, 0, 10) == 0.0
+
+
+def test_batched_completions_get_the_batch_discount():
+    response = to_namespace({"usage": {"prompt_tokens": 100, "completion_tokens": 10}})
+    accounting.record_call(REQUEST, 0.0, response)
+    with call_tags(purpose="batched"):
+        accounting.record_call(REQUEST, 0.0, response, batched=True)
+    rows = {row["purpose"]: row for row in call_summary()}
+    assert rows["batched"]["cost_usd"] == pytest.approx(rows[None]["cost_usd"] * accounting.BATCH_DISCOUNT)
+
+
+def test_mock_completions_cost_nothing(mock_backend, monkeypatch):
+    monkeypatch.setattr(accounting, "_spans", [])
+    ChatClient(cache=None).chat.completions.create(**REQUEST)
+    [row] = call_summary(by=())
+    assert row["calls"] == 1 and row["prompt_tokens"] > 0
+    assert row["cost_usd"] == 0.0
+    assert [span["cost_usd"] for span in accounting._spans] == [0.0]
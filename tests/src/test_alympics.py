@@ -0,0 +1,60 @@
+from Alympics import LLM, run_sync
+
+PROMPT = [{"role": "user", "content": "Round 1. Imitate: yes/no"}]
+
+
+def test_mock_answers_are_not_rate_limited(mock_backend, limiter, monkeypatch):
+    monkeypatch.setattr(LLM, "rate_limiter", limiter)
+    llm = LLM()
+    for _ in range(5):
+        assert llm.call(PROMPT).startswith("Imitate:")
+        assert run_sync(llm.acall(PROMPT)).startswith("Imitate:")
+    assert limiter.acquired == 0
+
+
+def test_configure_changes_the_limits_of_existing_clients(limiter, monkeypatch):
+    monkeypatch.setattr(LLM, "rate_limiter", limiter)
+    llm = LLM()
+    LLM.configure(requests_per_minute=120)
+    assert llm.client.rate_limiter is limiter
+    assert limiter.rate == 2
+
+
+def test_configure_max_concurrency_alone_sets_the_burst_capacity(limiter, monkeypatch):
+    monkeypatch.setattr(LLM, "rate_limiter", limiter)
+    monkeypatch.setattr(LLM, "max_concurrency", LLM.max_concurrency)
+    monkeypatch.setattr(LLM, "_semaphores", LLM._semaphores)
+    LLM.configure(requests_per_minute=120)
+    LLM.configure(max_concurrency=3)
+    assert (limiter.rate, limiter.capacity) == (2, 3)
+
+
+def test_acall_caps_the_requests_in_flight(async_endpoint, limiter, monkeypatch):
+    import asyncio
+    import weakref
+
+    monkeypatch.setattr(LLM, "rate_limiter", limiter)
+    monkeypatch.setattr(LLM, "max_concurrency", LLM.max_concurrency)
+    monkeypatch.setattr(LLM, "_semaphores", weakref.WeakKeyDictionary())
+    LLM.configure(max_concurrency=3)
+    in_flight, peak = [0], [0]
+
+    async def slow(**request):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return async_endpoint.create(**request)
+
+    async def play():
+        llms = [LLM() for _ in range(4)]
+        for llm in llms:
+            llm.aclient._cache = None
+            llm.aclient._backend = lambda: async_endpoint
+        monkeypatch.setattr(async_endpoint.chat.completions, "create", slow)
+        return await asyncio.gather(*(llm.acall(PROMPT) for llm in llms for _ in range(3)))
+
+    answers = asyncio.run(play())
+    assert sorted(answers) == sorted(f"answer {n}" for n in range(1, 13))
+    assert peak[0] == 3
+    assert limiter.acquired == 12
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+import llm_backend
+import transport
+from llm_backend import AsyncChatClient, ChatClient
+from transport import api_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(transport, "_api_clients", {})
+
+
+def test_one_client_per_endpoint_and_key():
+    first = api_client("https://api.deepseek.com/v1", "key-a")
+    assert api_client("https://api.deepseek.com/v1", "key-a") is first
+    assert api_client("https://api.deepseek.com/v1", "key-b") is not first
+    assert api_client("https://api.openai.com/v1", "key-a") is not first
+    assert first.max_retries == 0
+
+
+def test_players_share_the_pooled_client(monkeypatch):
+    monkeypatch.setitem(llm_backend._settings, "backend", "openai")
+    clients = [ChatClient(api_key="key-a", base_url="https://api.deepseek.com/v1", cache=None) for _ in range(3)]
+    assert len({id(client._backend()) for client in clients}) == 1
+
+
+def test_async_clients_belong_to_their_event_loop(monkeypatch):
+    monkeypatch.setitem(llm_backend._settings, "backend", "openai")
+    client = AsyncChatClient(api_key="key-a", base_url="https://api.deepseek.com/v1", cache=None)
+
+    async def backends():
+        return client._backend(), client._backend()
+
+    first, same_loop = asyncio.run(backends())
+    other_loop, _ = asyncio.run(backends())
+    assert first is same_loop
+    assert other_loop is not first
@@ -0,0 +1,77 @@
+import pytest
+
+import conversation as conversation_module
+from conversation import Conversation
+
+
+@pytest.fixture(autouse=True)
+def character_token_estimate(monkeypatch):
+    # the same token counts with and without tiktoken installed
+    monkeypatch.setattr(conversation_module, "tiktoken", None)
+
+
+def conversation(**options):
+    history = Conversation([{"role": "system", "content": "You play G08A."}], **options)
+    history.add("user", "Round 1?").add("assistant", "I choose 30.")
+    return history
+
+
+def test_history_can_only_grow():
+    history = conversation(budget=0)
+    for edit in [lambda: history.__setitem__(0, {}), lambda: history.__delitem__(1), lambda: history.insert(0, {}),
+                 history.pop, lambda: history.remove(history[0]), history.clear, history.reverse]:
+        with pytest.raises(TypeError, match="append-only"):
+            edit()
+    history += [{"role": "user", "content": "Round 2?"}]
+    assert len(history) == 4 and history[0]["content"] == "You play G08A."
+
+
+def test_one_off_requests_leave_the_history_alone():
+    history = conversation(budget=0)
+    inquiry = {"role": "system", "content": "Predict Bob."}
+    request = history.request(inquiry)
+    assert request[:-1] == list(history) and request[-1] == inquiry
+    assert len(history) == 3
+
+    lookahead = history + [inquiry]
+    assert isinstance(lookahead, Conversation) and len(lookahead) == 4 and len(history) == 3
+    fork = history.fork()
+    fork.add("user", "Round 2?")
+    assert len(history) == 3 and fork[:3] == list(history)
+
+
+def play_rounds(history, rounds, first=1):
+    for r in range(first, first + rounds):
+        history.add("user", f"Ok, Alex! Now is the ROUND {r}. " + "Think about the other players. " * 10)
+        history.add("assistant", f"After careful thought I choose {r * 3}. " + "Because the target moves down. " * 10)
+        history.close_round(f"Round {r}: you chose {r * 3}.")
+
+
+def test_unbounded_history_is_sent_whole():
+    history = conversation(budget=0)
+    play_rounds(history, 20)
+    assert history.render() is history
+
+
+def test_budget_keeps_the_system_prompt_and_the_latest_rounds():
+    history = conversation(budget=1200, keep_rounds=2)
+    play_rounds(history, 10)
+    rendered = history.render()
+    assert history.tokens() > 1200
+    assert rendered[0] == history[0]
+    assert rendered[1]["content"].startswith("Summary of the earlier rounds:\nRound 1: you chose 3.")
+    assert rendered[-4:] == history[-4:]
+    assert sum(len(message["content"]) for message in rendered) < sum(len(message["content"]) for message in history)
+    # the rendered prefix stays the same for a few rounds, so it keeps hitting the prompt cache
+    compacted = history.compacted
+    play_rounds(history, 1, first=11)
+    assert history.compacted == compacted
+    assert history.render()[:len(rendered) - 1] == rendered[:-1]
+
+
+def test_budget_never_drops_the_kept_rounds():
+    history = conversation(budget=1, keep_rounds=3)
+    play_rounds(history, 6)
+    rendered = history.render()
+    assert history.compacted == 3
+    assert rendered[2:] == history[history.rounds[2][0]:]
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import equilibrium
+from platform_game import GameConfig, RegulationConfig, settle_batch
+
+CONFIGS = [GameConfig(), GameConfig(sigma=15.0), GameConfig(convenience=2.0, innovation_cost_scale=0.2), GameConfig(sigma=0.0)]
+REGULATIONS = [RegulationConfig(), RegulationConfig(ban_dual_mode=True), RegulationConfig(ban_imitation=True),
+               RegulationConfig(ban_self_preferencing=True)]
+PROFILE = ("mode", "commission", "innovation", "imitation", "price_M", "price_S_platform", "price_S_direct", "display_share")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(equilibrium, "_cache", {})
+
+
+def test_solve_batch_matches_solving_one_configuration_at_a_time(monkeypatch):
+    batch = equilibrium.solve_batch(CONFIGS, REGULATIONS)
+    for config, regulation, record in zip(CONFIGS, REGULATIONS, batch):
+        monkeypatch.setattr(equilibrium, "_cache", {})
+        alone = equilibrium.solve(config, regulation)
+        assert alone.keys() == record.keys()
+        for name, value in alone.items():
+            assert record[name] == (pytest.approx(value) if isinstance(value, (float, dict)) else value), name
+
+
+def test_equilibria_respect_the_regulation():
+    for regulation, record in zip(REGULATIONS, equilibrium.solve_batch([GameConfig()] * 4, REGULATIONS)):
+        assert record["converged"]
+        assert record["mode_profit_M"][record["mode"]] == max(record["mode_profit_M"].values())
+        if regulation.ban_dual_mode:
+            assert "dual" not in record["mode_profit_M"] and record["mode"] != "dual"
+        if regulation.ban_imitation:
+            assert not record["imitation"]
+        if regulation.ban_self_preferencing and record["mode"] == "dual":
+            assert record["display_share"] == 1.0
+
+
+def test_equilibrium_outcome_is_the_settlement_of_its_profile():
+    for config, record in zip(CONFIGS, equilibrium.solve_batch(CONFIGS, REGULATIONS)):
+        outcome = settle_batch(config, *(record[name] for name in PROFILE))
+        for name, value in outcome.items():
+            assert record[name] == pytest.approx(float(value)), name
+
+
+def test_seller_mode_profit_matches_the_closed_form():
+    # M alone sells at its price cap convenience + sigma, below the monopoly price (base_value + sigma + convenience) / 2,
+    # to a (base_value / outside_option_scale) share of the market
+    for config, record in zip(CONFIGS, equilibrium.solve_batch(CONFIGS, REGULATIONS)):
+        cap = config.convenience + config.sigma
+        assert record["mode_profit_M"]["seller"] == pytest.approx(cap * config.base_value / config.outside_option_scale * config.market_size)
+
+
+def test_no_player_gains_by_deviating_in_the_price_subgame():
+    prices = np.linspace(0.0, 1.0, 2001)
+    for config, regulation, record in zip(CONFIGS, REGULATIONS, equilibrium.solve_batch(CONFIGS, REGULATIONS)):
+        mode = record["mode"]
+        shares = [0.0, 1.0] if mode == "dual" and not regulation.ban_self_preferencing else [record["display_share"]]
+        cap_M = 0.0 if mode == "marketplace" else config.convenience + (record["innovation"] if record["imitation"] else config.sigma)
+        cap_S = 0.0 if mode == "seller" else record["commission"] + record["innovation"]
+
+        def settle(price_M, price_S_platform, price_S_direct):
+            # M sets the display share after the prices, ties show S
+            outcome = settle_batch(config, mode, record["commission"], record["innovation"], record["imitation"],
+                                   *(np.asarray(price)[..., None] for price in (price_M, price_S_platform, price_S_direct)), shares)
+            best = outcome["profit_M"][..., ::-1].argmax(axis=-1)[..., None]
+            return {name: np.take_along_axis(value[..., ::-1], best, axis=-1)[..., 0] for name, value in outcome.items()}
+
+        equilibrium_outcome = settle(record["price_M"], record["price_S_platform"], record["price_S_direct"])
+        assert equilibrium_outcome["profit_M"] == pytest.approx(record["profit_M"])
+        deviations = [
+            ("profit_M", settle(prices * cap_M, record["price_S_platform"], record["price_S_direct"])),
+            ("profit_S", settle(record["price_M"], prices * cap_S, prices * cap_S)),  # S sells on the platform
+            ("profit_S", settle(record["price_M"], cap_S, prices * cap_S)),           # S sells direct
+        ]
+        for profit, outcome in deviations:
+            # the solver's price grids are coarser than this one, allow for their resolution
+            assert outcome[profit].max() <= equilibrium_outcome[profit] + 1e-3 * abs(equilibrium_outcome[profit]) + 1e-6, (config, profit)
+
+
+def test_solved_configurations_are_not_solved_again(monkeypatch):
+    first = equilibrium.solve_batch(CONFIGS[:2], REGULATIONS[:2])
+    solved = []
+    solver = equilibrium._Solver
+    monkeypatch.setattr(equilibrium, "_Solver", lambda configs, *args, **kwargs: solved.append(len(configs)) or solver(configs, *args, **kwargs))
+    again = equilibrium.solve_batch(CONFIGS, REGULATIONS)
+    assert solved == [2]
+    assert again[:2] == first
+    assert [record["config_hash"] for record in again] == [
+        equilibrium.config_hash(config, regulation, points=7, levels=3, price_points=9, price_levels=2, iterations=12)
+        for config, regulation in zip(CONFIGS, REGULATIONS)
+    ]
@@ -0,0 +1,51 @@
+import asyncio
+
+import response_cache
+from Alympics import LLM, run_sync
+from llm_backend import AsyncChatClient, ChatClient, ResponseCache, start_run
+
+REQUEST = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Pick a number."}], "temperature": 0.7}
+
+
+def test_requests_sent_to_the_endpoint_are_paced(limiter, endpoint):
+    client = ChatClient(cache=None, rate_limiter=limiter)
+    client._client = endpoint
+    client.chat.completions.create(**REQUEST)
+    assert (endpoint.calls, limiter.acquired) == (1, 1)
+
+
+def test_async_requests_sent_to_the_endpoint_are_paced(limiter, async_endpoint, monkeypatch):
+    client = AsyncChatClient(cache=None, rate_limiter=limiter)
+    monkeypatch.setattr(client, "_backend", lambda: async_endpoint)
+    asyncio.run(client.chat.completions.create(**REQUEST))
+    assert (async_endpoint.calls, limiter.acquired) == (1, 1)
+
+
+def test_repeated_requests_replay_their_own_samples(tmp_path, endpoint):
+    client = ChatClient(cache=ResponseCache(str(tmp_path / "cache.sqlite")))
+    client._client = endpoint
+    start_run()
+    cold = [client.chat.completions.create(**REQUEST).choices[0].message.content for _ in range(3)]
+    start_run()
+    warm = [client.chat.completions.create(**REQUEST).choices[0].message.content for _ in range(3)]
+    assert cold == warm == ["answer 1", "answer 2", "answer 3"]
+    assert endpoint.calls == 3
+
+
+def test_warm_cache_rerun_makes_no_throttled_acquisitions(tmp_path, limiter, endpoint, async_endpoint, monkeypatch):
+    monkeypatch.setattr(response_cache, "_default_cache", ResponseCache(str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(LLM, "rate_limiter", limiter)
+    prompts = [[{"role": "user", "content": f"Round {r}. Price: value"}] for r in range(5)]
+    llm = LLM()
+    llm.client._client = endpoint
+    monkeypatch.setattr(llm.aclient, "_backend", lambda: async_endpoint)
+
+    start_run()
+    cold = [llm.call(prompt) for prompt in prompts]
+    assert (endpoint.calls, limiter.acquired) == (5, 5)
+
+    start_run()
+    assert [llm.call(prompt) for prompt in prompts] == cold
+    start_run()
+    assert [run_sync(llm.acall(prompt)) for prompt in prompts] == cold
+    assert (endpoint.calls, async_endpoint.calls, limiter.acquired) == (5, 0, 5)
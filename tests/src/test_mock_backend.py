@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from mock_backend import MockClient, MockPrefixCache, parse_latency
+from response_cache import start_run
+
+
+def mock_answers(client, prompts, repeat=1):
+    return [(prompt, client.create(model="mock", messages=[{"role": "user", "content": prompt}]).choices[0].message.content)
+            for prompt in prompts for _ in range(repeat)]
+
+
+PROMPTS = [f"Ok, Alex! Now is the ROUND {r}, and your HP is at 10. Please choose an integer between 1 and 100 for this round."
+           for r in range(1, 6)]
+
+
+def test_mock_answers_do_not_depend_on_the_call_order():
+    start_run()
+    forward = mock_answers(MockClient(), PROMPTS, repeat=2)
+    start_run()
+    backward = mock_answers(MockClient(), PROMPTS[::-1], repeat=2)
+    assert sorted(forward) == sorted(backward)
+    # repeats of a request are further samples, not the same answer again
+    assert len(set(forward)) > len(PROMPTS)
+
+
+def test_mock_answers_of_concurrent_runs_match_sequential_ones():
+    from concurrent.futures import ThreadPoolExecutor
+    import contextvars
+
+    def run(replicate):
+        start_run(replicate)
+        return mock_answers(MockClient(), PROMPTS, repeat=2)
+
+    sequential = [run(replicate) for replicate in range(4)]
+    with ThreadPoolExecutor(4) as pool:
+        concurrent = list(pool.map(lambda replicate: contextvars.copy_context().run(run, replicate), range(4)))
+    assert concurrent == sequential
+    assert sequential[0] != sequential[1]
+    start_run()
+
+
+def test_mock_prefix_cache_is_bounded_and_kept_per_run():
+    messages = [{"role": "system", "content": "x" * 400}, {"role": "user", "content": "Pick a number."}]
+    cache = MockPrefixCache(block=1, capacity=2)
+    assert cache.lookup(messages) == 0
+    assert cache.lookup(messages) == 103
+    cache.lookup([{"role": "user", "content": "Something else."}])
+    assert len(cache.seen) == 2 and cache.lookup(messages[:1]) == 0
+
+    client = MockClient()
+    request = {"model": "mock", "messages": messages}
+    start_run()
+    client._complete(request)
+    assert client._complete(request)[0].usage.prompt_cache_hit_tokens > 0
+    start_run()
+    assert client._complete(request)[0].usage.prompt_cache_hit_tokens == 0
+
+
+def test_mock_json_answers_and_latency():
+    start_run()
+    client = MockClient(latency="uniform:0.1,0.5")
+    request = {"model": "mock", "messages": [{"role": "user", "content": PROMPTS[0]}], "response_format": {"type": "json_object"}}
+    response, delay = client._complete(request)
+    assert isinstance(json.loads(response.choices[0].message.content), dict)
+    assert 0.1 <= delay <= 0.5
+    replayed, replayed_delay = client._complete(request, sample=0)
+    assert (replayed.choices[0].message.content, replayed_delay) == (response.choices[0].message.content, delay)
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1,2")
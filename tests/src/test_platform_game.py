@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from platform_game import MODES, GameConfig, PlatformGame, settle_batch
+
+
+def settle(config, mode, commission, innovation, imitation, price_M, price_S_platform, price_S_direct, display_share):
+    """One profile settled with scalar arithmetic, the way PlatformGame settled rounds before settle_batch."""
+    def allocate(options, share):
+        result = {label: 0.0 for label in options}
+        if share <= 0.0:
+            return result
+        best = max(options, key=options.get)
+        if options[best] > 0:
+            result[best] = max(0.0, min(1.0, options[best] / config.outside_option_scale)) * share * config.market_size
+        return result
+
+    value_M = config.base_value + (innovation if imitation else config.sigma) + config.convenience
+    net_M = value_M - price_M if mode in {"dual", "seller"} else float("-inf")
+    net_S_platform = config.base_value + innovation + config.convenience - price_S_platform if mode in {"dual", "marketplace"} else float("-inf")
+    net_S_direct = config.base_value + innovation - price_S_direct if mode in {"dual", "marketplace"} else float("-inf")
+    aware_share = {"marketplace": 1.0, "seller": 0.0}.get(mode, display_share)
+    aware = allocate({"M": net_M, "S_platform": net_S_platform, "S_direct": net_S_direct, "fringe": 0.0}, aware_share)
+    unaware = allocate({"M": net_M, "fringe": 0.0}, 1.0 - aware_share)
+    sales_M = aware["M"] + unaware["M"]
+    innovation_cost = config.innovation_cost_scale * max(0.0, innovation - config.min_innovation) ** 2
+    return {
+        "sales_M": sales_M,
+        "sales_S_platform": aware["S_platform"],
+        "sales_S_direct": aware["S_direct"],
+        "profit_M": price_M * sales_M + commission * price_S_platform * aware["S_platform"],
+        "profit_S": price_S_platform * (1 - commission) * aware["S_platform"] + price_S_direct * aware["S_direct"] - innovation_cost,
+        "innovation_cost": innovation_cost,
+    }
+
+
+def random_profiles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # whole-number prices and innovations so that ties between the options are common
+    return {
+        "mode": rng.choice(MODES, n),
+        "commission": rng.uniform(0, 10, n),
+        "innovation": rng.integers(0, 61, n).astype(float),
+        "imitation": rng.random(n) < 0.5,
+        "price_M": rng.integers(60, 190, n).astype(float),
+        "price_S_platform": rng.integers(60, 190, n).astype(float),
+        "price_S_direct": rng.integers(60, 190, n).astype(float),
+        "display_share": rng.choice([0.0, 0.3, 0.5, 1.0], n),
+    }
+
+
+@pytest.mark.parametrize("config", [GameConfig(), GameConfig(sigma=0.0, convenience=0.0, outside_option_scale=60.0)])
+def test_settle_batch_matches_the_scalar_settlement(config):
+    profiles = random_profiles(20000)
+    batch = settle_batch(config, *profiles.values())
+    for i in range(20000):
+        expected = settle(config, *(values[i].item() for values in profiles.values()))
+        for name, value in expected.items():
+            assert batch[name][i] == pytest.approx(value, abs=1e-9), (i, name)
+
+
+def test_settle_batch_broadcasts_scalars_against_arrays():
+    prices = np.linspace(50, 150, 11)
+    batch = settle_batch(GameConfig(), "dual", 5.0, 20.0, False, prices, 100.0, 95.0, 0.5)
+    assert batch["profit_M"].shape == prices.shape
+    for i, price in enumerate(prices):
+        assert batch["profit_M"][i] == pytest.approx(settle(GameConfig(), "dual", 5.0, 20.0, False, price, 100.0, 95.0, 0.5)["profit_M"])
+
+
+def test_round_settlement_uses_settle_batch():
+    game = PlatformGame("Platform game.", config=GameConfig(sigma=8.0))
+    outcome = game._settle_round(3, "marketplace", 4.0, 30.0, True, 120.0, 110.0, 105.0, 0.4)
+    expected = settle(game.config, "marketplace", 4.0, 30.0, True, 120.0, 110.0, 105.0, 0.4)
+    assert outcome.pop("round") == 3
+    assert outcome == pytest.approx(expected)
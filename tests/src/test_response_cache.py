@@ -0,0 +1,40 @@
+import response_cache
+from response_cache import ResponseCache, next_sample, start_run
+
+REQUEST = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Pick a number."}], "temperature": 0.7}
+
+
+def test_cache_key_covers_the_whole_request_and_the_sample():
+    key = ResponseCache.make_key(REQUEST)
+    assert key == ResponseCache.make_key(dict(reversed(list(REQUEST.items()))))
+    assert key != ResponseCache.make_key({**REQUEST, "temperature": 0.0})
+    assert key != ResponseCache.make_key({**REQUEST, "messages": REQUEST["messages"] * 2})
+    assert key != ResponseCache.make_key(REQUEST, sample=1)
+
+
+def test_cache_evicts_the_least_recently_used_entries(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(response_cache.time, "time", lambda: next(clock))
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=350)
+    for key in "abc":
+        cache.put(key, {"content": key * 100})
+    assert cache.get("a") is not None
+    cache.put("d", {"content": "d" * 100})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("d") is not None
+    assert cache.evictions >= 1 and cache.total_bytes <= 350
+
+
+def test_threads_without_a_run_count_their_samples_apart():
+    import threading
+
+    def fresh_thread():
+        samples = []
+        thread = threading.Thread(target=lambda: samples.extend(next_sample("mock", "key") for _ in range(2)))
+        thread.start()
+        thread.join()
+        return samples
+
+    start_run()
+    assert fresh_thread() == fresh_thread() == [0, 1]
+    assert next_sample("mock", "key") == 0
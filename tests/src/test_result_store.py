@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from result_store import ResultStore
+
+
+def test_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path))
+    assert not ResultStore.exists(str(tmp_path))
+    for exp_no in range(3):
+        rounds = {"player": ["Alex", "Bob"] * 2, "round": [1, 1, 2, 2], "bid": [exp_no, 50, 40, 60], "won": [True, False, False, True]}
+        store.write(f"kr_VS_agent_{exp_no}", {"rounds": rounds}, {"message": {"Alex": ["hi"]}}, {"exp_no": exp_no})
+    store.write("cot_VS_agent_0", {"rounds": {"player": ["Alex"], "round": [1], "bid": [7], "won": [False]}})
+
+    assert ResultStore.exists(str(tmp_path))
+    assert store.games("kr_*") == ["kr_VS_agent_0", "kr_VS_agent_1", "kr_VS_agent_2"]
+    assert store.has("cot_VS_agent_0") and not store.has("cot_VS_agent_1")
+    assert store.meta("kr_VS_agent_1") == {"exp_no": 1, "tables": ["rounds"], "transcript": True}
+    assert store.transcript("kr_VS_agent_2") == {"message": {"Alex": ["hi"]}}
+
+    rows = store.read("rounds", ["bid"], games="kr_*")
+    assert set(rows) == {"bid", "game"}
+    np.testing.assert_array_equal(rows["bid"], [0, 50, 40, 60, 1, 50, 40, 60, 2, 50, 40, 60])
+    assert rows["game"].tolist() == ["kr_VS_agent_0"] * 4 + ["kr_VS_agent_1"] * 4 + ["kr_VS_agent_2"] * 4
+    assert store.read("rounds", games=["cot_VS_agent_0"])["won"].tolist() == [False]
+    assert store.read("rounds", ["bid"], games="none_*")["bid"].size == 0
+
+
+def test_rejects_tables_it_cannot_store(tmp_path):
+    store = ResultStore(str(tmp_path))
+    with pytest.raises(ValueError, match="different lengths"):
+        store.write("kr_VS_agent_0", {"rounds": {"bid": [1, 2], "won": [True]}})
+    with pytest.raises(ValueError, match="mixes types"):
+        store.write("kr_VS_agent_0", {"rounds": {"bid": [1, None]}})
+    # a game is only listed once its meta data is written
+    assert store.games() == []
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import transport
+from llm_backend import ChatClient
+from transport import CircuitBreaker, RetryPolicy, retry_after
+
+REQUEST = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Pick a number."}]}
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the sleeps of the client instead of waiting, with fresh circuit breakers."""
+    slept = []
+    monkeypatch.setattr(transport.time, "sleep", slept.append)
+    monkeypatch.setattr(transport, "_breakers", {})
+    return slept
+
+
+@pytest.mark.parametrize("error, kind", [
+    (StatusError(429), "saturated"), (StatusError(503), "saturated"), (StatusError(500), "retry"),
+    (StatusError(408), "retry"), (StatusError(400), "fatal"), (StatusError(401), "fatal"),
+    (APIConnectionError(), "retry"), (TimeoutError(), "retry"), (KeyError("bug"), "fatal"),
+])
+def test_classify(error, kind):
+    assert RetryPolicy.classify(error) == kind
+
+
+def test_retry_after_headers():
+    assert retry_after(StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(StatusError(429, {"retry-after": "7"})) == 7.0
+    assert retry_after(StatusError(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after(StatusError(429)) is None
+    assert retry_after(KeyError("no response")) is None
+
+
+def test_next_delay_gives_up():
+    policy = RetryPolicy(max_attempts=3, max_seconds=100, base_delay=1, max_delay=4)
+    assert policy.next_delay(StatusError(400), 0, 0) is None
+    assert 0 <= policy.next_delay(StatusError(500), 0, 0) <= 1
+    assert 10 <= policy.next_delay(StatusError(429, {"retry-after": "10"}), 1, 0) <= 12
+    assert policy.next_delay(StatusError(500), 2, 0) is None     # attempts used up
+    assert policy.next_delay(StatusError(500), 0, 100) is None   # out of time
+    assert policy.next_delay(StatusError(429, {"retry-after": "10"}), 0, 95) is None
+
+
+def test_breaker_opens_after_saturation_and_backs_off(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(transport.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=5, max_cooldown=12)
+    breaker.record_saturation()
+    assert breaker.wait_time() == 0.0
+    breaker.record_saturation()
+    assert 5 <= breaker.wait_time() <= 10
+    for pause in [10, 12]:  # doubles up to max_cooldown while it keeps failing
+        now[0] += 100
+        breaker.record_saturation()
+        breaker.record_saturation()
+        assert breaker.pause == pause
+    breaker.record_success()
+    now[0] += 100
+    breaker.record_saturation(wait=3)  # a Retry-After opens it at once
+    assert breaker.pause == 3 and 3 <= breaker.wait_time() <= 6
+
+
+def test_client_retries_transient_errors(sleeps, endpoint, monkeypatch):
+    errors = [StatusError(500), APIConnectionError()]
+    create = endpoint.create
+    monkeypatch.setattr(endpoint.chat.completions, "create", lambda **request: (_ for _ in ()).throw(errors.pop(0)) if errors else create(**request))
+    client = ChatClient(cache=None)
+    client._client = endpoint
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "answer 1"
+    assert len([delay for delay in sleeps if delay]) == 2
+
+
+def test_client_raises_fatal_errors_at_once(sleeps, endpoint, monkeypatch):
+    monkeypatch.setattr(endpoint.chat.completions, "create", lambda **request: (_ for _ in ()).throw(StatusError(401)))
+    client = ChatClient(cache=None)
+    client._client = endpoint
+    with pytest.raises(StatusError):
+        client.chat.completions.create(**REQUEST)
+    assert not any(sleeps)
+
+
+def test_saturation_pauses_every_caller_of_the_endpoint(sleeps, endpoint, monkeypatch):
+    errors = [StatusError(429, {"retry-after": "30"})]
+    create = endpoint.create
+    monkeypatch.setattr(endpoint.chat.completions, "create", lambda **request: (_ for _ in ()).throw(errors.pop(0)) if errors else create(**request))
+    client = ChatClient(cache=None, base_url="https://saturated.example/v1")
+    client._client = endpoint
+    client.chat.completions.create(**REQUEST)
+    other = ChatClient(cache=None, base_url="https://saturated.example/v1")
+    other._client = endpoint
+    sleeps.clear()
+    other.chat.completions.create(**REQUEST)
+    assert sleeps[0] >= 25  # the rest of the Retry-After, before the first attempt
+
+
+def test_cancelled_wait_for_the_gate_gives_the_slot_back():
+    gate = threading.BoundedSemaphore(1)
+    gate.acquire() # the only slot is taken
+
+    async def cancel_waiter():
+        waiter = asyncio.ensure_future(transport._acquire_gate(gate))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.release() # the pending acquire in the worker thread now gets the slot ...
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if gate.acquire(blocking=False): # ... and gives it back
+                return True
+        return False
+
+    assert asyncio.run(cancel_waiter())
+    gate.release()
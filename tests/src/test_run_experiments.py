@@ -0,0 +1,42 @@
+import json
+import sys
+
+import run_experiments
+from platform_game import GameConfig
+from run_experiments import DEFAULT_SCENARIOS, run_parallel, run_scenario
+
+
+def jobs(seeds=2):
+    return [(label, DEFAULT_SCENARIOS[label], 2, GameConfig(), seed) for label in ["baseline", "ban_dual_mode"] for seed in range(seeds)]
+
+
+def failing(label, regulation, rounds, config, seed):
+    if seed == 1:
+        raise RuntimeError(f"{label} failed")
+    return label
+
+
+def test_workers_play_like_one_process(mock_backend):
+    serial = {job[0::4]: result for job, result in run_parallel(run_scenario, jobs(), 1, "mock", "0")}
+    parallel = {job[0::4]: result for job, result in run_parallel(run_scenario, jobs(), 2, "mock", "0")}
+    assert parallel == serial
+    assert serial[("baseline", 0)] != serial[("baseline", 1)]
+    assert all(record["mode"] != "dual" for record in serial[("ban_dual_mode", 0)])
+
+
+def test_failed_runs_are_reported_not_raised():
+    results = {job[0::4]: result for job, result in run_parallel(failing, jobs(), 1)}
+    assert results[("baseline", 0)] == "baseline"
+    assert isinstance(results[("ban_dual_mode", 1)], RuntimeError)
+
+
+def test_main_writes_the_records_of_every_scenario_and_seed(mock_backend, tmp_path, monkeypatch):
+    output = tmp_path / "results.json"
+    monkeypatch.setattr(sys, "argv", ["run_experiments.py", "--rounds", "2", "--seeds", "2", "--workers", "2", "--backend", "mock",
+                                      "--mock-latency", "0", "--scenarios", "baseline,ban_self_pref",
+                                      "--output-data", str(output), "--output-plot", str(tmp_path / "plot.png")])
+    run_experiments.main()
+    records = json.loads(output.read_text())
+    assert [(record["scenario"], record["seed"], record["round"]) for record in records] == [
+        (label, seed, r) for label in ["baseline", "ban_self_pref"] for seed in range(2) for r in (1, 2)]
+    assert set(json.loads((tmp_path / "results_equilibrium.json").read_text())) == {"baseline", "ban_self_pref"}
@@ -0,0 +1,65 @@
+import csv
+from argparse import Namespace
+
+import pytest
+
+import sweep
+from platform_game import GameConfig, RegulationConfig
+
+
+def sweep_args(path, values="sigma=0,10", seeds=1, rounds=1):
+    return Namespace(sweep=[values], bans="none,dual", design="grid", samples=0, design_seed=0, seeds=seeds,
+                     round=rounds, workers=1, backend="mock", mock_latency="0", sweep_output=str(path))
+
+
+def read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_run_key_depends_on_every_parameter():
+    config, regulation = GameConfig(), RegulationConfig()
+    key = sweep.run_key(config, regulation, 3, 0)
+    assert key == sweep.run_key(GameConfig(), RegulationConfig(), 3, 0)
+    assert len({
+        key,
+        sweep.run_key(config, regulation, 3, 1),
+        sweep.run_key(config, regulation, 4, 0),
+        sweep.run_key(config, RegulationConfig(ban_dual_mode=True), 3, 0),
+        sweep.run_key(GameConfig(sigma=config.sigma + 1), regulation, 3, 0),
+    }) == 5
+
+
+def test_resume_skips_the_runs_in_the_file(mock_backend, tmp_path):
+    path = tmp_path / "sweep.csv"
+    sweep.run_sweep(sweep_args(path), GameConfig(), RegulationConfig())
+    first = read(path)
+    assert len({row["run"] for row in first}) == 4
+
+    # more seeds: only the new runs are played, whatever their position in the design
+    sweep.run_sweep(sweep_args(path, seeds=2), GameConfig(), RegulationConfig())
+    rows = read(path)
+    assert rows[:len(first)] == first
+    assert len({row["run"] for row in rows}) == len(rows) == 8
+    assert {row["seed"] for row in rows[len(first):]} == {"1"}
+
+    # a reordered design is the same set of runs
+    sweep.run_sweep(sweep_args(path, values="sigma=10,0", seeds=2), GameConfig(), RegulationConfig())
+    assert read(path) == rows
+
+
+def test_resume_refuses_a_file_of_another_sweep(mock_backend, tmp_path):
+    path = tmp_path / "sweep.csv"
+    sweep.run_sweep(sweep_args(path), GameConfig(), RegulationConfig())
+    content = path.read_text(encoding="utf-8")
+
+    with pytest.raises(ValueError, match="not part of this sweep"):
+        sweep.run_sweep(sweep_args(path, rounds=2), GameConfig(), RegulationConfig())
+    with pytest.raises(ValueError, match="not part of this sweep"):
+        sweep.run_sweep(sweep_args(path), GameConfig(convenience=GameConfig().convenience + 1), RegulationConfig())
+    assert path.read_text(encoding="utf-8") == content
+
+    header, _, rest = content.partition("\n")
+    path.write_text(header.replace("seed,", "replicate,", 1) + "\n" + rest, encoding="utf-8")
+    with pytest.raises(ValueError, match="other columns"):
+        sweep.run_sweep(sweep_args(path, seeds=2), GameConfig(), RegulationConfig())
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+
+import pytest
+
+import waterAllocation as wa
+from game_log import GameLog
+from llm_backend import start_run
+
+NAMES = ["Alex", "Bob", "Cindy", "David", "Eric"]
+
+
+def test_round_with_the_mock_backend_reads_every_bid(mock_backend):
+    game = wa.waterAllocation("Water auction.")
+    game.run_single_round(1, 10)
+    assert all(isinstance(player.bidding, int) for player in game.players)
+    assert dict(game.parse_stats) == {"llm": 5}
+
+
+def test_unreadable_bids_are_counted_as_no_bid(mock_backend, monkeypatch, caplog):
+    game = wa.waterAllocation("Water auction.")
+    monkeypatch.setattr(game, "_parse_result", lambda info: {"Alex": 30, "Bob": "a lot", "Cindy": -5})
+    before = wa.PARSE_STATS["fallback"]
+    with caplog.at_level(logging.WARNING, logger=wa.logger.name):
+        biddings = game._parse_biddings(["..."] * 5, "...")
+    assert biddings == {"Alex": 30, "Bob": 0, "Cindy": 0, "David": 0, "Eric": 0}
+    assert dict(game.parse_stats) == {"llm": 1, "fallback": 4}
+    assert wa.PARSE_STATS["fallback"] == before + 4
+    assert sum("No readable bid" in record.message for record in caplog.records) == 4
+
+
+def test_structured_answers_skip_the_parse_call(mock_backend, monkeypatch):
+    game = wa.waterAllocation("Water auction.", structured_output=True)
+    asked = []
+    monkeypatch.setattr(game, "_parse_result", lambda info: asked.append(info) or {"Eric": 12})
+    responses = ['{"bid": 40, "reason": "thirsty"}'] * 4 + ["I will bid twelve dollars."]
+    assert game._parse_biddings(responses, None) == dict(zip(NAMES, [40, 40, 40, 40, 12]))
+    assert asked == ["Eric:I will bid twelve dollars.\n\n"]
+    assert dict(game.parse_stats) == {"structured": 4, "llm": 1}
+
+
+def test_parse_call_gives_up_after_three_answers_that_are_not_objects(monkeypatch):
+    game = wa.waterAllocation("Water auction.")
+    answers = iter(["not json", "[1, 2]", "{broken"])
+    monkeypatch.setattr(game.llm, "call", lambda messages: next(answers))
+    assert game._parse_result("...") == {}
+
+
+def play(concurrent_bidding, rounds=3):
+    game = wa.waterAllocation("Water auction.", concurrent_bidding=concurrent_bidding)
+    for round_id in range(1, rounds + 1):
+        game.run_single_round(round_id, 10)
+    return [(player.name, player.balance, player.hp, player.bidding, list(player.history)) for player in game.players]
+
+
+def test_concurrent_bidding_plays_the_same_game(mock_backend):
+    sequential = play(False)
+    start_run()
+    assert play(True) == sequential
+
+
+def play_logged(path, rounds=4):
+    start_run()
+    game = wa.waterAllocation("Water auction.")
+    game.run_multi_round(rounds, [10] * rounds, GameLog(str(path)))
+    return game
+
+
+def final_state(game):
+    return ([(player.name, player.balance, player.hp, player.no_drink, player.bidding, list(player.history), player.history.rounds)
+             for player in game.players], [player.name for player in game.survival_players], dict(game.parse_stats))
+
+
+def test_interrupted_game_resumes_after_its_last_round(mock_backend, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reference = final_state(play_logged(tmp_path / "a.events.jsonl"))
+
+    path = tmp_path / "b.events.jsonl"
+    execute_bidding = wa.myPlayer.execute_bidding
+    def crash(self, round_id, supply):
+        if round_id == 3 and self.name == "Cindy":
+            raise RuntimeError("killed")
+        return execute_bidding(self, round_id, supply)
+    with monkeypatch.context() as patch:
+        patch.setattr(wa.myPlayer, "execute_bidding", crash)
+        with pytest.raises(RuntimeError):
+            play_logged(path)
+    with open(path) as f:
+        events = [json.loads(line) for line in f]
+    assert [event["round"] for event in events if event["event"] == "round"] == [1, 2]
+    assert sum(event["event"] == "bid" for event in events) == 10
+
+    played = []
+    run_single_round = wa.waterAllocation.run_single_round
+    monkeypatch.setattr(wa.waterAllocation, "run_single_round", lambda self, i, supply: played.append(i) or run_single_round(self, i, supply))
+    resumed = play_logged(path)
+    assert played == [3, 4]
+    assert final_state(resumed) == reference
+    with open(path) as f:
+        assert json.loads(f.readlines()[-1]) == {"event": "end"}
+    assert os.path.exists(tmp_path / f"{resumed.experiment_unique_id}.json")
+
+
+def test_game_without_survivors_still_saves_its_history(mock_backend, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(wa.waterAllocation, "_check_winner", lambda self, supply: [])
+    game = play_logged(tmp_path / "game.events.jsonl", rounds=10)
+    assert game.survival_players == []
+    assert os.path.exists(tmp_path / f"{game.experiment_unique_id}.json")